@@ -0,0 +1,148 @@
+"""
+Benchmark for archiving the status rows of finished jobs.
+
+Registers several jobs on one dataset and completes all but one of them,
+then archives the finished ones while concurrent claimers drain the
+remaining job. Reports the archiving time, the claim rate while archiving,
+and the space the status tables take (tables and indexes) before, after a
+plain VACUUM, after seeding one more job into the freed space, and after
+VACUUM FULL.
+
+Usage:
+    python benchmarks/bench_archive.py --rows 200000 --finished 5
+
+Requires the DB_* environment variables to point at a scratch database; the
+schema from db_setup is created if it is missing.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_claim_contention import DATASET_ID, MODEL_ID, PROMPT_ID, ensure_schema, report, reset, run
+from bench_work_units import TRACKING_SIZE_SQL
+
+
+def cleanup(cursor):
+    cursor.execute("DELETE FROM modelpromptstatus WHERE dataset_id = %s", (DATASET_ID,))
+    cursor.execute("DELETE FROM predictions WHERE dataset_id = %s", (DATASET_ID,))
+    cursor.execute("DELETE FROM rows WHERE dataset_id = %s", (DATASET_ID,))
+
+
+def register(cursor, model_id, n_rows):
+    cursor.execute(
+        "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status) VALUES (%s, %s, %s, 'available')",
+        (model_id, PROMPT_ID, DATASET_ID),
+    )
+    cursor.execute("SELECT seed_prediction_status(%s, %s, %s, %s)", (model_id, PROMPT_ID, DATASET_ID, n_rows))
+
+
+def setup(connection, n_rows, n_finished):
+    """One pending job (MODEL_ID) and n_finished completed ones on an n_rows dataset."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cleanup(cursor)
+        cursor.execute(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT %s + g, %s, 'benchmark review ' || g, 'positive' FROM generate_series(1, %s) g",
+            (DATASET_ID * 10, DATASET_ID, n_rows),
+        )
+        register(cursor, MODEL_ID, n_rows)
+        for model_id in range(MODEL_ID + 1, MODEL_ID + 1 + n_finished):
+            register(cursor, model_id, n_rows)
+            cursor.execute(
+                "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status)"
+                " SELECT row_id, %s, %s, %s, 'positive', 0.1, 'done' FROM rows WHERE dataset_id = %s",
+                (model_id, PROMPT_ID, DATASET_ID, DATASET_ID),
+            )
+            cursor.execute(
+                "UPDATE predictionstatus SET status = 'done' WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s",
+                (model_id, PROMPT_ID, DATASET_ID),
+            )
+        conn.commit()
+        cursor.close()
+
+
+def vacuum(connection, full=False):
+    """VACUUM the status tables and return their size."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        conn.autocommit = True
+        try:
+            cursor.execute(f"VACUUM ({'FULL, ' if full else ''}ANALYZE) predictionstatus, workunits")
+            cursor.execute(TRACKING_SIZE_SQL)
+            size = cursor.fetchone()[0]
+        finally:
+            conn.autocommit = False
+        cursor.close()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark archiving finished jobs")
+    parser.add_argument('--rows', type=int, default=200000, help='Rows in the benchmark dataset')
+    parser.add_argument('--finished', type=int, default=5, help='Finished jobs to archive')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent claimers on the running job')
+    parser.add_argument('--batch', type=int, default=100, help='Rows per claim')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Status rows archived per transaction')
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_MIN_SIZE'] = str(args.workers + 1)
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.workers + 1)
+    from sentiment_core.archiving import archive_jobs
+    from sentiment_core.db_helpers import claim_batch
+    from sentiment_core.pool import connection
+
+    ensure_schema(connection)
+    mb = 2**20
+    claim = lambda: claim_batch(MODEL_ID, PROMPT_ID, DATASET_ID, limit=args.batch)
+    try:
+        print(f"{args.rows} rows, {args.finished} finished jobs + 1 running, {args.workers} claimers")
+        setup(connection, args.rows, args.finished)
+        before = vacuum(connection, full=True)
+        print(f"status tables before archiving        {before / mb:8.1f} MB")
+        elapsed, claimed, calls = run(claim, args.workers, 0.0)
+        report('claims, idle', elapsed, claimed, calls, args.rows)
+        reset(connection)
+
+        archiving = {}
+
+        def archiver():
+            start = time.perf_counter()
+            archiving['rows'] = archive_jobs(args.chunk_size)
+            archiving['elapsed'] = time.perf_counter() - start
+        thread = threading.Thread(target=archiver)
+        thread.start()
+        elapsed, claimed, calls = run(claim, args.workers, 0.0)
+        report('claims, archiving', elapsed, claimed, calls, args.rows)
+        thread.join()
+        print(f"archived {archiving['rows']} rows in {archiving['elapsed']:.2f}s")
+
+        after = vacuum(connection)
+        print(f"status tables after VACUUM            {after / mb:8.1f} MB")
+        with connection() as conn:
+            cursor = conn.cursor()
+            register(cursor, MODEL_ID + args.finished + 1, args.rows)
+            conn.commit()
+            cursor.close()
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(TRACKING_SIZE_SQL)
+            reused = cursor.fetchone()[0]
+            conn.commit()
+            cursor.close()
+        print(f"after seeding one more job into it    {reused / mb:8.1f} MB")
+        print(f"after VACUUM FULL                     {vacuum(connection, full=True) / mb:8.1f} MB")
+    finally:
+        with connection() as conn:
+            cursor = conn.cursor()
+            cleanup(cursor)
+            conn.commit()
+            cursor.close()
+
+
+if __name__ == '__main__':
+    main()
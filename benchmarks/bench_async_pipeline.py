@@ -0,0 +1,203 @@
+"""
+Benchmark for the asyncio data layer against network latency.
+
+Puts a proxy that delays every packet between the workers and PostgreSQL,
+so each round trip costs --rtt-ms, then drains one seeded job with the
+worker's per-batch step (write the previous batch, check the job status,
+claim the next batch) three ways:
+
+- sync:      db_helpers on psycopg2, a commit per call
+- async:     the same calls from sentiment_core.async_db
+- pipelined: async_db.write_and_claim, all three in one round trip
+
+and reports rows per second and the time spent per batch.
+
+Usage:
+    python benchmarks/bench_async_pipeline.py --rows 5000 --batch 50 --rtt-ms 2 --workers 1
+
+Requires psycopg 3 and the DB_* environment variables pointing at a scratch
+database; the schema from db_setup is created if it is missing.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_claim_contention import DATASET_ID, MODEL_ID, PROMPT_ID, cleanup, seed
+
+JOB = (MODEL_ID, PROMPT_ID, DATASET_ID)
+
+
+class LatencyProxy(threading.Thread):
+    """TCP proxy in front of PostgreSQL that delays data by half the round trip each way."""
+
+    def __init__(self, host, port, rtt):
+        super().__init__(daemon=True)
+        self.upstream = (host, port)
+        self.delay = rtt / 2
+        self.port = None
+        self.ready = threading.Event()
+
+    def run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        self.port = server.sockets[0].getsockname()[1]
+        self.ready.set()
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader, writer):
+        host, port = self.upstream
+        if host.startswith('/'):
+            upstream = await asyncio.open_unix_connection(f'{host}/.s.PGSQL.{port}')
+        else:
+            upstream = await asyncio.open_connection(host, port)
+        await asyncio.gather(self._pipe(reader, upstream[1]), self._pipe(upstream[0], writer))
+
+    async def _pipe(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                if data is None:
+                    writer.close()
+                    return
+                await asyncio.sleep(max(0.0, due - loop.time()))
+                writer.write(data)
+                await writer.drain()
+        delivery = asyncio.create_task(deliver())
+        while data := await reader.read(65536):
+            queue.put_nowait((loop.time() + self.delay, data))
+        queue.put_nowait((0.0, None))
+        await delivery
+
+
+def reset(connection):
+    """Return the benchmark job to its freshly seeded state."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM predictions WHERE dataset_id = %s", (DATASET_ID,))
+        cursor.execute("DELETE FROM jobsummary WHERE dataset_id = %s", (DATASET_ID,))
+        cursor.execute(
+            "UPDATE predictionstatus SET status = 'pending', lease_expires_at = NULL"
+            " WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s",
+            JOB,
+        )
+        cursor.execute(
+            "UPDATE jobprogress SET done = 0, failed = 0 WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s",
+            JOB,
+        )
+        cursor.execute(
+            "UPDATE modelpromptstatus SET status = 'available' WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s",
+            JOB,
+        )
+        conn.commit()
+        cursor.close()
+
+
+def predictions(rows):
+    return [(row_id, *JOB, 'positive', 0.01, f'prompt: {content}') for row_id, content in rows]
+
+
+def drain_sync(workers, limit):
+    from sentiment_core import db_helpers as dbh
+
+    batches = [0]
+    lock = threading.Lock()
+
+    def worker():
+        rows = dbh.claim_batch(*JOB, limit=limit)
+        while rows:
+            dbh.write_predictions(predictions(rows))
+            if dbh.get_job_status(*JOB) == 'stop':
+                return
+            rows = dbh.claim_batch(*JOB, limit=limit)
+            with lock:
+                batches[0] += 1
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return batches[0]
+
+
+async def drain_async(workers, limit, pipelined):
+    from sentiment_core import async_db
+
+    batches = 0
+
+    async def worker():
+        nonlocal batches
+        rows = await async_db.claim_batch(*JOB, limit=limit)
+        while rows:
+            if pipelined:
+                status, rows = await async_db.write_and_claim(predictions(rows), *JOB, limit=limit)
+            else:
+                await async_db.write_predictions(predictions(rows))
+                if await async_db.get_job_status(*JOB) == 'stop':
+                    return
+                rows = await async_db.claim_batch(*JOB, limit=limit)
+            batches += 1
+    try:
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        await async_db.close_async_pool()
+    return batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the asyncio data layer against network latency")
+    parser.add_argument('--rows', type=int, default=5000, help='Rows in the benchmark job')
+    parser.add_argument('--batch', type=int, default=50, help='Rows per claim')
+    parser.add_argument('--workers', type=int, default=1, help='Concurrent workers (threads or coroutines)')
+    parser.add_argument('--rtt-ms', type=float, default=2.0, help='Round trip time the proxy adds')
+    args = parser.parse_args()
+
+    proxy = LatencyProxy(os.environ['DB_HOST'], os.environ.get('DB_PORT', '5432'), args.rtt_ms / 1000)
+    proxy.start()
+    proxy.ready.wait()
+    os.environ['DB_HOST'] = '127.0.0.1'
+    os.environ['DB_PORT'] = str(proxy.port)
+    os.environ['DB_POOL_MIN_SIZE'] = str(args.workers)
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.workers)
+    from sentiment_core.pool import connection
+
+    print(f"{args.rows} rows, batch {args.batch}, {args.workers} workers, {args.rtt_ms:g} ms round trip")
+    seed(connection, args.rows)
+    try:
+        for name in ('sync', 'async', 'pipelined'):
+            reset(connection)
+            start = time.perf_counter()
+            if name == 'sync':
+                batches = drain_sync(args.workers, args.batch)
+            else:
+                batches = asyncio.run(drain_async(args.workers, args.batch, name == 'pipelined'))
+            elapsed = time.perf_counter() - start
+            with connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT done FROM jobprogress WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s", JOB)
+                done = cursor.fetchone()[0]
+                conn.commit()
+                cursor.close()
+            print(f"{name:<10} {elapsed:8.3f}s {done / elapsed:10.1f} rows/s "
+                  f"{1000 * elapsed * args.workers / max(batches, 1):8.2f} ms/batch  written={done}")
+    finally:
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM predictions WHERE dataset_id = %s", (DATASET_ID,))
+            cleanup(cursor)
+            conn.commit()
+            cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark for the storage backends.
+
+Seeds one job on each backend and drains it with concurrent workers that
+claim a batch and write its predictions straight back, so the rate measures
+the queue's overhead per row without any inference. Reports rows per second
+for the PostgreSQL backend and the SQLite backend in WAL mode.
+
+Usage:
+    python benchmarks/bench_backends.py --rows 20000 --workers 4 --batch 50
+    python benchmarks/bench_backends.py --backends sqlite
+
+The PostgreSQL run requires the DB_* environment variables to point at a
+scratch database; the schema from db_setup is created if it is missing. The
+SQLite run uses a fresh file in a temporary directory.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_claim_contention import DATASET_ID, MODEL_ID, PROMPT_ID, report, run
+
+JOB = (MODEL_ID, PROMPT_ID, DATASET_ID)
+
+
+def postgres_backend(n_rows):
+    from bench_claim_contention import cleanup, ensure_schema
+    from sentiment_core.backends import PostgresBackend
+    from sentiment_core.pool import connection
+
+    ensure_schema(connection)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cleanup(cursor)
+        cursor.execute("DELETE FROM predictions WHERE dataset_id = %s", (DATASET_ID,))
+        cursor.execute(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT %s + g, %s, 'benchmark review ' || g, 'positive' FROM generate_series(1, %s) g",
+            (DATASET_ID * 10, DATASET_ID, n_rows),
+        )
+        conn.commit()
+        cursor.close()
+
+    def teardown():
+        with connection() as conn:
+            cursor = conn.cursor()
+            cleanup(cursor)
+            cursor.execute("DELETE FROM predictions WHERE dataset_id = %s", (DATASET_ID,))
+            conn.commit()
+            cursor.close()
+    return PostgresBackend(), teardown
+
+
+def sqlite_backend(n_rows):
+    from sentiment_core.backends import SQLiteBackend
+
+    directory = tempfile.TemporaryDirectory()
+    backend = SQLiteBackend(os.path.join(directory.name, 'bench.sqlite3'))
+    conn = backend.connect()
+    conn.executemany(
+        "INSERT INTO rows (row_id, dataset_id, content, expected_prediction) VALUES (?, ?, ?, 'positive')",
+        ((DATASET_ID * 10 + g, DATASET_ID, f'benchmark review {g}') for g in range(1, n_rows + 1)),
+    )
+
+    def teardown():
+        backend.close()
+        directory.cleanup()
+    return backend, teardown
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the work queue on each storage backend")
+    parser.add_argument('--rows', type=int, default=20000, help='Rows in the benchmark job')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent workers')
+    parser.add_argument('--batch', type=int, default=50, help='Rows per claim')
+    parser.add_argument('--backends', nargs='+', default=['postgres', 'sqlite'], choices=['postgres', 'sqlite'])
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_MIN_SIZE'] = str(args.workers)
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.workers)
+    if args.backends == ['sqlite']:
+        os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+    setups = {'postgres': postgres_backend, 'sqlite': sqlite_backend}
+
+    print(f"{args.rows} rows, {args.workers} workers, batch {args.batch}")
+    for name in args.backends:
+        backend, teardown = setups[name](args.rows)
+        try:
+            backend.register_job(*JOB)
+            while backend.seed_job_chunk(*JOB, chunk_size=10000):
+                pass
+
+            def claim_and_write():
+                rows = backend.claim_batch(*JOB, limit=args.batch)
+                backend.write_predictions([
+                    (row_id, *JOB, 'positive', 0.01, f'prompt: {content}') for row_id, content in rows
+                ])
+                return rows
+            elapsed, claimed, calls = run(claim_and_write, args.workers, 0.0)
+            report(name, elapsed, claimed, calls, args.rows)
+            assert backend.get_job_progress(*JOB) == (args.rows, args.rows, 0)
+        finally:
+            teardown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark for the zero-shot inference backends of the BERT runners.
+
+Classifies the same synthetic reviews with each BERT_BACKEND (torch, int8,
+onnx, onnx-int8), each in its own process so memory is measured per backend,
+and reports load time, rows per second, resident memory after loading and
+at peak, and how many labels match the PyTorch pipeline.
+
+Usage:
+    python benchmarks/bench_bert_backends.py --model /path/to/nli-model --rows 48 --threads 1
+
+Needs transformers and torch, plus onnx and onnxruntime for the ONNX
+backends; --model takes a hub name or a local path. Exports go to
+ONNX_CACHE_DIR (default .onnx_cache); the first run of an ONNX backend
+includes the export in its load time. No database is used.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_bert_batching import LABELS, reviews
+
+
+def memory_mb():
+    """Return this process's (resident, peak resident) memory in MB from /proc."""
+    values = {}
+    with open('/proc/self/status') as status:
+        for line in status:
+            key, _, value = line.partition(':')
+            if key in ('VmRSS', 'VmHWM'):
+                values[key] = int(value.split()[0]) / 1024
+    return values.get('VmRSS', 0.0), values.get('VmHWM', 0.0)
+
+
+def run_backend(args):
+    """Classify the reviews with one backend and print the measurements as JSON."""
+    os.environ['BERT_MIN_AGREEMENT'] = '0'
+    os.environ['BERT_INTRA_OP_THREADS'] = str(args.threads)
+    os.environ['BERT_INTER_OP_THREADS'] = '1'
+    os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+    from sentiment_core.zero_shot import load_zero_shot
+
+    prompts = reviews(args.rows, args.min_words, args.max_words)
+    start = time.perf_counter()
+    classifier = load_zero_shot(args.model, args.backend)
+    load_seconds = time.perf_counter() - start
+    loaded_rss, _ = memory_mb()
+    classifier(prompts[:2], LABELS, batch_size=args.batch_size)
+    labels = []
+    start = time.perf_counter()
+    for offset in range(0, len(prompts), args.claim):
+        responses = classifier(prompts[offset:offset + args.claim], LABELS, batch_size=args.batch_size)
+        labels += [response['labels'][0] for response in responses]
+    elapsed = time.perf_counter() - start
+    rss, peak = memory_mb()
+    print(json.dumps({
+        'load_seconds': load_seconds, 'seconds': elapsed, 'loaded_rss': loaded_rss,
+        'rss': rss, 'peak': peak, 'labels': labels,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the zero-shot inference backends")
+    parser.add_argument('--model', default='facebook/bart-large-mnli', help='Hub name or path of the NLI model')
+    parser.add_argument('--backends', nargs='+', default=['torch', 'int8', 'onnx', 'onnx-int8'])
+    parser.add_argument('--rows', type=int, default=48, help='Reviews to classify per backend')
+    parser.add_argument('--claim', type=int, default=16, help='Rows per classifier call')
+    parser.add_argument('--batch-size', type=int, default=16, help='Sequence-label pairs per forward pass')
+    parser.add_argument('--min-words', type=int, default=20, help='Shortest review in words')
+    parser.add_argument('--max-words', type=int, default=80, help='Longest review in words')
+    parser.add_argument('--threads', type=int, default=1, help='Intra-op threads (BERT_INTRA_OP_THREADS)')
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.backend:
+        return run_backend(args)
+
+    print(f"{args.model}: {args.rows} reviews of {args.min_words}-{args.max_words} words, "
+          f"{len(LABELS)} labels, batch size {args.batch_size}, {args.threads} intra-op threads")
+    print(f"{'backend':<10} {'load':>7} {'rows/s':>8} {'x torch':>8} {'RSS MB':>8} {'peak MB':>8} {'agree':>6}")
+    reference = None
+    baseline = None
+    for backend in args.backends:
+        output = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], '--backend', backend],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        reference = reference or result['labels']
+        rate = args.rows / result['seconds']
+        baseline = baseline or rate
+        agree = sum(a == b for a, b in zip(result['labels'], reference)) / len(reference)
+        print(f"{backend:<10} {result['load_seconds']:6.1f}s {rate:8.2f} {rate / baseline:8.2f} "
+              f"{result['rss']:8.0f} {result['peak']:8.0f} {agree:6.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark for batched zero-shot inference in the BERT runner.
+
+Classifies the same synthetic reviews with the zero-shot pipeline one row
+per call, as the runner used to, and with one call per claimed batch at
+several inference batch sizes (BERT_BATCH_SIZE), as
+temp/bert_classifier.classify does. Reports rows per second and time per row.
+
+Usage:
+    python benchmarks/bench_bert_batching.py --rows 64 --claim 32 --batch-sizes 4 16 32
+
+Needs transformers and torch; --model takes a hub name or a local path.
+No database is used.
+"""
+import argparse
+import random
+import time
+
+WORDS = (
+    "the product arrived quickly and works as described but the battery life is shorter than "
+    "expected and customer service never answered my emails so I would not buy it again although "
+    "the price was fair and the design looks great on my desk"
+).split()
+LABELS = ['positive', 'negative', 'neutral']
+PROMPT = 'Review: {content}'
+
+
+def reviews(n_rows, min_words, max_words, seed=0):
+    """Synthetic reviews with lengths spread between min_words and max_words."""
+    rng = random.Random(seed)
+    return [
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+        for _ in range(n_rows)
+    ]
+
+
+def row_at_a_time(classifier, prompts, claim, batch_size):
+    return [classifier(prompt, LABELS)['labels'][0] for prompt in prompts]
+
+
+def batched(classifier, prompts, claim, batch_size):
+    labels = []
+    for start in range(0, len(prompts), claim):
+        responses = classifier(prompts[start:start + claim], LABELS, batch_size=batch_size)
+        if isinstance(responses, dict):
+            responses = [responses]
+        labels.extend(response['labels'][0] for response in responses)
+    return labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batched zero-shot inference")
+    parser.add_argument('--model', default='facebook/bart-large-mnli', help='Hub name or path of the NLI model')
+    parser.add_argument('--rows', type=int, default=64, help='Reviews to classify per run')
+    parser.add_argument('--claim', type=int, default=32, help='Rows per claimed batch, i.e. per pipeline call')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[4, 16, 32],
+                        help='Inference batch sizes (sequence-label pairs per forward pass)')
+    parser.add_argument('--min-words', type=int, default=20, help='Shortest review in words')
+    parser.add_argument('--max-words', type=int, default=150, help='Longest review in words')
+    parser.add_argument('--threads', type=int, default=0, help='torch threads (0 keeps the default)')
+    args = parser.parse_args()
+
+    import torch
+    from transformers import pipeline
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    classifier = pipeline('zero-shot-classification', model=args.model, device=-1)
+    prompts = [PROMPT.format(content=content) for content in reviews(args.rows, args.min_words, args.max_words)]
+    # Warm up allocator and kernels outside the timed runs
+    batched(classifier, prompts[:4], 4, 4)
+
+    print(f"{args.model}: {args.rows} reviews of {args.min_words}-{args.max_words} words, "
+          f"{len(LABELS)} labels, {args.claim} rows per claim, {torch.get_num_threads()} threads")
+    runs = [('row-at-a-time', row_at_a_time, 1)]
+    runs += [(f'batched, batch_size={size}', batched, size) for size in args.batch_sizes]
+    baseline = None
+    reference = None
+    with torch.inference_mode():
+        for name, run, batch_size in runs:
+            start = time.perf_counter()
+            labels = run(classifier, prompts, args.claim, batch_size)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            reference = reference or labels
+            agree = sum(a == b for a, b in zip(labels, reference)) / len(reference)
+            print(f"{name:<26} {elapsed:8.2f}s {args.rows / elapsed:8.2f} rows/s "
+                  f"{1000 * elapsed / args.rows:8.1f} ms/row  x{baseline / elapsed:4.2f}  same labels {agree:.0%}")
+
+
+if __name__ == '__main__':
+    main()
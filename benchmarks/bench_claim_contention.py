@@ -0,0 +1,195 @@
+"""
+Contention benchmark for batch claiming.
+
+Runs N concurrent claimers against one seeded job, first with the legacy
+two-step fetch (lock Rows, then UPDATE PredictionStatus) and then with the
+single-statement claim_batch, and reports claim rate and double-claims.
+
+Usage:
+    python benchmarks/bench_claim_contention.py --workers 8 --rows 5000
+
+Requires the DB_* environment variables to point at a scratch database; the
+schema from db_setup is created if it is missing.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Benchmark job identifiers, chosen well clear of real experiment ids
+MODEL_ID, PROMPT_ID, DATASET_ID = 900001, 900001, 900001
+
+LEGACY_FETCH_SQL = """
+    SELECT row_id, content
+    FROM Rows
+    WHERE dataset_id = %s AND row_id IN (
+        SELECT row_id
+        FROM PredictionStatus
+        WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s AND status = 'pending'
+        LIMIT %s
+    )
+    FOR UPDATE SKIP LOCKED
+"""
+
+LEGACY_MARK_SQL = """
+    UPDATE PredictionStatus
+    SET status = 'in_progress'
+    WHERE row_id = ANY(%s) AND model_id = %s AND prompt_id = %s AND dataset_id = %s
+"""
+
+
+def legacy_fetch(connection, batch):
+    """The pre-claim_batch fetch_batch implementation."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(LEGACY_FETCH_SQL, (DATASET_ID, MODEL_ID, PROMPT_ID, DATASET_ID, batch))
+            rows = cursor.fetchall()
+            if rows:
+                cursor.execute(LEGACY_MARK_SQL, ([r[0] for r in rows], MODEL_ID, PROMPT_ID, DATASET_ID))
+            conn.commit()
+            return rows
+        finally:
+            cursor.close()
+
+
+def ensure_schema(connection):
+    """Create the schema from db_setup if the database is empty."""
+    from db_setup import DDL
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT to_regclass('public.predictionstatus')")
+        if cursor.fetchone()[0] is None:
+            for stmt in DDL:
+                cursor.execute(stmt)
+        conn.commit()
+        cursor.close()
+
+
+def seed(connection, n_rows):
+    """Create the schema if needed and seed one job with n_rows pending rows."""
+    ensure_schema(connection)
+    with connection() as conn:
+        cursor = conn.cursor()
+        cleanup(cursor)
+        cursor.execute(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT %s + g, %s, 'benchmark review ' || g, 'positive'"
+            " FROM generate_series(1, %s) g",
+            (DATASET_ID * 10, DATASET_ID, n_rows),
+        )
+        cursor.execute(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status)"
+            " VALUES (%s, %s, %s, 'available')",
+            (MODEL_ID, PROMPT_ID, DATASET_ID),
+        )
+        # Registration seeds only the first chunk; seed the rest up front
+        cursor.execute("SELECT seed_prediction_status(%s, %s, %s, %s)", (MODEL_ID, PROMPT_ID, DATASET_ID, n_rows))
+        conn.commit()
+        cursor.close()
+
+
+def reset(connection):
+    """Return every row of the benchmark job to pending."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE predictionstatus SET status = 'pending'"
+            " WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s",
+            (MODEL_ID, PROMPT_ID, DATASET_ID),
+        )
+        conn.commit()
+        cursor.close()
+
+
+def cleanup(cursor):
+    cursor.execute(
+        "DELETE FROM modelpromptstatus WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s",
+        (MODEL_ID, PROMPT_ID, DATASET_ID),
+    )
+    cursor.execute("DELETE FROM rows WHERE dataset_id = %s", (DATASET_ID,))
+
+
+def run(claim, workers, infer_ms):
+    """
+    Drain the job with concurrent claimers.
+
+    Like the runners, a claimer leaves the job as soon as a claim comes back
+    empty. Returns (elapsed, claimed row ids, claim round trips).
+    """
+    claimed = []
+    calls = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(workers)
+
+    def claimer():
+        barrier.wait()
+        while True:
+            rows = claim()
+            with lock:
+                calls[0] += 1
+            if not rows:
+                return
+            with lock:
+                claimed.extend(row_id for row_id, _ in rows)
+            # Simulated inference keeps claims interleaved as in production
+            time.sleep(infer_ms * len(rows) / 1000)
+
+    threads = [threading.Thread(target=claimer) for _ in range(workers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, claimed, calls[0]
+
+
+def report(name, elapsed, claimed, calls, n_rows):
+    counts = Counter(claimed)
+    doubles = sum(c - 1 for c in counts.values() if c > 1)
+    missing = n_rows - len(counts)
+    print(f"{name:<12} {elapsed:8.3f}s {len(counts) / elapsed:10.1f} rows/s "
+          f"{calls:6d} claims  double-claims={doubles} unclaimed={missing}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark concurrent batch claiming")
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent claimers')
+    parser.add_argument('--rows', type=int, default=5000, help='Rows in the benchmark job')
+    parser.add_argument('--batch', type=int, default=5, help='Rows per claim')
+    parser.add_argument('--infer-ms', type=float, default=1.0, help='Simulated inference time per row')
+    args = parser.parse_args()
+
+    # Give every claimer its own pooled connection
+    os.environ['DB_POOL_MIN_SIZE'] = str(args.workers)
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.workers)
+    from sentiment_core.db_helpers import claim_batch
+    from sentiment_core.pool import connection
+
+    seed(connection, args.rows)
+    try:
+        print(f"{args.workers} workers, {args.rows} rows, batch {args.batch}")
+        elapsed, claimed, calls = run(
+            lambda: legacy_fetch(connection, args.batch), args.workers, args.infer_ms,
+        )
+        report('legacy', elapsed, claimed, calls, args.rows)
+        reset(connection)
+        elapsed, claimed, calls = run(
+            lambda: claim_batch(MODEL_ID, PROMPT_ID, DATASET_ID, limit=args.batch),
+            args.workers, args.infer_ms,
+        )
+        report('claim_batch', elapsed, claimed, calls, args.rows)
+    finally:
+        with connection() as conn:
+            cursor = conn.cursor()
+            cleanup(cursor)
+            conn.commit()
+            cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Benchmark for compact prediction storage.
+
+Fills predictions the way the runners write them (several models answering
+the same prompts over the same reviews, so each formatted prompt is stored
+once per model), then converts the table with
+db_setup.compact_predictions() and reports the space predictions take
+before and after (tables, TOAST and indexes) and how long the conversion ran.
+
+Usage:
+    python benchmarks/bench_compact_predictions.py --rows 20000 --models 4 --prompts 3
+
+Requires the DB_* environment variables to point at a scratch database that
+has not been converted yet; the schema from db_setup is created if it is
+missing. The conversion cannot be undone, so use a database of its own.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_claim_contention import DATASET_ID, MODEL_ID, PROMPT_ID, ensure_schema
+
+# A review of about 650 characters of poorly compressible words
+ROWS_SQL = """
+    INSERT INTO rows (row_id, dataset_id, content, expected_prediction)
+    SELECT %s + g, %s,
+           (SELECT string_agg(md5(g || '-' || w), ' ') FROM generate_series(1, 20) w),
+           (ARRAY['positive', 'negative', 'neutral'])[1 + g %% 3]
+    FROM generate_series(1, %s) g
+"""
+
+# Formatted prompts are stored lower-cased, as update_prediction does
+PREDICTIONS_SQL = """
+    INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status, formatted_prompt)
+    SELECT r.row_id, %s + m, %s + p, r.dataset_id,
+           (ARRAY['positive', 'negative', 'neutral', 'unknown'])[1 + (r.row_id + m) %% 4],
+           random(), 'done',
+           lower('prompt ' || p || ': read the following product review carefully and answer with'
+                 || ' exactly one word, positive, negative or neutral, describing its overall'
+                 || ' sentiment. do not explain your answer. review: ' || r.content)
+    FROM rows r, generate_series(1, %s) m, generate_series(1, %s) p
+    WHERE r.dataset_id = %s
+"""
+
+
+def fill(connection, n_rows, n_models, n_prompts):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM predictions WHERE dataset_id = %s", (DATASET_ID,))
+        cursor.execute("DELETE FROM rows WHERE dataset_id = %s", (DATASET_ID,))
+        cursor.execute(ROWS_SQL, (DATASET_ID * 10, DATASET_ID, n_rows))
+        cursor.execute("SELECT create_dataset_partitions(%s)", (DATASET_ID,))
+        cursor.execute(PREDICTIONS_SQL, (MODEL_ID, PROMPT_ID, n_models, n_prompts, DATASET_ID))
+        conn.commit()
+        conn.autocommit = True
+        try:
+            # Start from a freshly written table, as the conversion leaves one
+            cursor.execute("VACUUM (FULL, ANALYZE) predictions")
+        finally:
+            conn.autocommit = False
+        cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark compact prediction storage")
+    parser.add_argument('--rows', type=int, default=20000, help='Reviews in the benchmark dataset')
+    parser.add_argument('--models', type=int, default=4, help='Models predicting every prompt')
+    parser.add_argument('--prompts', type=int, default=3, help='Prompts per model')
+    args = parser.parse_args()
+
+    from sqlalchemy import create_engine, text
+    from db_setup import compact_predictions
+    from sentiment_core.config import db_params
+    from sentiment_core.pool import connection
+
+    ensure_schema(connection)
+    engine = create_engine('postgresql+psycopg2://', connect_args=db_params)
+    with engine.connect() as conn:
+        if conn.execute(text("SELECT to_regtype('prediction_label') IS NOT NULL")).scalar_one():
+            sys.exit("predictions are already compact; point DB_NAME at a fresh scratch database")
+
+    n_predictions = args.rows * args.models * args.prompts
+    print(f"{args.rows} reviews x {args.models} models x {args.prompts} prompts = {n_predictions} predictions")
+    fill(connection, args.rows, args.models, args.prompts)
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        before, after = compact_predictions(conn)
+    elapsed = time.perf_counter() - start
+    print(f"{'plain':<10} {before / 2**20:8.1f} MB  {before / n_predictions:6.0f} B/prediction")
+    print(f"{'compact':<10} {after / 2**20:8.1f} MB  {after / n_predictions:6.0f} B/prediction")
+    print(f"saved {1 - after / before:.0%}, conversion took {elapsed:.2f}s")
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    main()
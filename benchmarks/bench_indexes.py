@@ -0,0 +1,182 @@
+"""
+Benchmark for the worker indexes in db_setup.INDEXES.
+
+Seeds one job over a large dataset with half of its rows predicted, after
+other prompts already finished the same dataset, then times the
+worker access paths (claiming a batch, listing rows in flight, counting a
+job's predictions, reading one row's predictions across jobs) without the
+indexes and again after creating them.
+
+Usage:
+    python benchmarks/bench_indexes.py --rows 1000000
+
+Requires the DB_* environment variables to point at a scratch database; the
+schema from db_setup is created if it is missing.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_claim_contention import DATASET_ID, MODEL_ID, PROMPT_ID, cleanup, ensure_schema, seed
+
+JOB = (MODEL_ID, PROMPT_ID, DATASET_ID)
+
+QUERIES = {
+    'in_progress': (
+        "SELECT row_id FROM predictionstatus"
+        " WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s AND status = 'in_progress'",
+        JOB,
+    ),
+    'job_count': (
+        "SELECT COUNT(*) FILTER (WHERE prediction <> 'unknown'), COUNT(*) FILTER (WHERE prediction = 'unknown')"
+        " FROM predictions WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s",
+        JOB,
+    ),
+    'row_lookup': (
+        "SELECT model_id, prompt_id, prediction FROM predictions WHERE dataset_id = %s AND row_id = %s",
+        (DATASET_ID, DATASET_ID * 10 + 1),
+    ),
+}
+
+
+def index_names():
+    from db_setup import INDEXES
+    return [re.search(r'EXISTS (\w+)', stmt).group(1) for stmt in INDEXES]
+
+
+def add_finished_jobs(connection, n_rows, other_prompts):
+    """
+    Write the status rows and predictions of jobs that already finished the dataset.
+
+    They are written directly as done, without modelpromptstatus entries, so
+    the benchmark job's rows sit behind them in both tables.
+    """
+    first = DATASET_ID * 10 + 1
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO predictionstatus (row_id, model_id, prompt_id, dataset_id, status)"
+            " SELECT g, %s, %s + p, %s, 'done'"
+            " FROM generate_series(1, %s) p, generate_series(%s, %s) g",
+            (MODEL_ID, PROMPT_ID, DATASET_ID, other_prompts, first, first + n_rows - 1),
+        )
+        cursor.execute("ALTER TABLE predictions DISABLE TRIGGER USER")
+        cursor.execute(
+            "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status)"
+            " SELECT g, %s, %s + p, %s, 'negative', 0.1, 'done'"
+            " FROM generate_series(1, %s) p, generate_series(%s, %s) g",
+            (MODEL_ID, PROMPT_ID, DATASET_ID, other_prompts, first, first + n_rows - 1),
+        )
+        cursor.execute("ALTER TABLE predictions ENABLE TRIGGER USER")
+        conn.commit()
+        cursor.close()
+
+
+def predict_half(connection, n_rows):
+    """Mark the first half of the benchmark job done and write its predictions."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        half = n_rows // 2
+        first = DATASET_ID * 10 + 1
+        cursor.execute(
+            "UPDATE predictionstatus SET status = 'done'"
+            " WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s AND row_id < %s",
+            (*JOB, first + half),
+        )
+        cursor.execute(
+            "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status)"
+            " SELECT g, %s, %s, %s, 'positive', 0.1, 'done' FROM generate_series(%s, %s) g",
+            (*JOB, first, first + half - 1),
+        )
+        conn.commit()
+        cursor.close()
+
+
+def set_indexes(connection, enabled):
+    from db_setup import INDEXES
+    with connection() as conn:
+        cursor = conn.cursor()
+        for name, stmt in zip(index_names(), INDEXES):
+            cursor.execute(stmt if enabled else f"DROP INDEX IF EXISTS {name}")
+        conn.commit()
+        # As autovacuum would: fresh statistics and visibility map
+        conn.autocommit = True
+        try:
+            cursor.execute("VACUUM (ANALYZE) predictionstatus, predictions, rows")
+        finally:
+            conn.autocommit = False
+        cursor.close()
+
+
+def time_queries(connection, repeat):
+    results = {}
+    with connection() as conn:
+        cursor = conn.cursor()
+        for name, (sql, params) in QUERIES.items():
+            start = time.perf_counter()
+            for _ in range(repeat):
+                cursor.execute(sql, params)
+                cursor.fetchall()
+            results[name] = (time.perf_counter() - start) / repeat
+            conn.rollback()
+        cursor.close()
+    return results
+
+
+def time_claims(dbh, repeat, batch):
+    elapsed = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = dbh.claim_batch(*JOB, limit=batch)
+        elapsed += time.perf_counter() - start
+        dbh.revert_batch_status(rows, *JOB)
+    return elapsed / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark worker access paths with and without indexes")
+    parser.add_argument('--rows', type=int, default=1000000, help='Rows in the benchmark dataset')
+    parser.add_argument('--repeat', type=int, default=20, help='Executions per access path')
+    parser.add_argument('--batch', type=int, default=20, help='Rows per claim')
+    parser.add_argument('--other-prompts', type=int, default=2, help='Other prompts with predictions on the dataset')
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_MIN_SIZE'] = '1'
+    os.environ['DB_POOL_MAX_SIZE'] = '1'
+    from sentiment_core import db_helpers as dbh
+    from sentiment_core.pool import connection
+
+    print(f"Seeding {args.rows} rows, {args.other_prompts} finished prompts...")
+    try:
+        ensure_schema(connection)
+        add_finished_jobs(connection, args.rows, args.other_prompts)
+        seed(connection, args.rows)
+        predict_half(connection, args.rows)
+        print(f"{'':<10} {'claim':>10} " + ' '.join(f"{name:>13}" for name in QUERIES))
+        for label, enabled in (('no index', False), ('indexed', True)):
+            set_indexes(connection, enabled)
+            claim = time_claims(dbh, args.repeat, args.batch)
+            queries = time_queries(connection, args.repeat)
+            print(f"{label:<10} {claim * 1000:8.2f}ms "
+                  + ' '.join(f"{queries[name] * 1000:11.2f}ms" for name in QUERIES))
+    finally:
+        set_indexes(connection, True)
+        with connection() as conn:
+            cursor = conn.cursor()
+            cleanup(cursor)
+            cursor.execute(
+                "DELETE FROM predictionstatus WHERE model_id = %s AND dataset_id = %s", (MODEL_ID, DATASET_ID),
+            )
+            cursor.execute(
+                "DELETE FROM predictions WHERE model_id = %s AND dataset_id = %s", (MODEL_ID, DATASET_ID),
+            )
+            conn.commit()
+            cursor.close()
+
+
+if __name__ == '__main__':
+    main()
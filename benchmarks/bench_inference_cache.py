@@ -0,0 +1,94 @@
+"""
+Benchmark for the inference cache.
+
+Classifies the same synthetic reviews for several jobs, as happens when a
+dataset is rerun, datasets overlap, or the root BERT runner (which ignores
+the prompt) works through every prompt of a model. The reviews are drawn
+from a smaller pool, so a dataset also repeats reviews. Each job is run
+with the zero-shot pipeline directly and through
+sentiment_core.inference_cache.InferenceCache, and the script reports wall
+time, model calls and the cache hit rate.
+
+Usage:
+    python benchmarks/bench_inference_cache.py --model /path/to/nli-model --rows 64 --jobs 3 --distinct 48
+
+The cache lives in a scratch SQLite backend by default; --backend postgres
+uses the database from the DB_* variables (the inference_cache table is
+created there if needed, and cleared first).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_bert_batching import LABELS, reviews
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the inference cache")
+    parser.add_argument('--model', default='facebook/bart-large-mnli', help='Hub name or path of the NLI model')
+    parser.add_argument('--rows', type=int, default=64, help='Reviews per job')
+    parser.add_argument('--jobs', type=int, default=3, help='Jobs sending the model the same reviews')
+    parser.add_argument('--distinct', type=int, default=48, help='Distinct reviews the rows are drawn from')
+    parser.add_argument('--claim', type=int, default=16, help='Rows per claimed batch')
+    parser.add_argument('--backend', choices=['sqlite', 'postgres'], default='sqlite', help='Where the cache lives')
+    args = parser.parse_args()
+
+    if args.backend == 'sqlite':
+        os.environ['STORAGE_BACKEND'] = 'sqlite'
+        os.environ['SQLITE_PATH'] = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+    from transformers import pipeline
+    from sentiment_core import backends
+    from sentiment_core.inference_cache import InferenceCache
+
+    if args.backend == 'postgres':
+        from db_setup import INFERENCE_CACHE_TABLE
+        from sentiment_core.pool import connection
+        with connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(INFERENCE_CACHE_TABLE)
+            cursor.execute("TRUNCATE inference_cache")
+            conn.commit()
+            cursor.close()
+    classifier = pipeline('zero-shot-classification', model=args.model, device=-1)
+    pool = reviews(args.distinct, 20, 80)
+    rows = [pool[i % args.distinct] for i in range(args.rows)]
+    model_calls = [0]
+
+    def compute(texts):
+        model_calls[0] += len(texts)
+        start = time.perf_counter()
+        responses = classifier(texts, LABELS, batch_size=16)
+        if isinstance(responses, dict):
+            responses = [responses]
+        duration = (time.perf_counter() - start) / len(texts)
+        return [(response['labels'][0], duration) for response in responses]
+
+    compute(rows[:2])
+    print(f"{args.model}: {args.jobs} jobs of {args.rows} rows from {args.distinct} distinct reviews, "
+          f"cache on {args.backend}")
+    results = {}
+    for name in ('no cache', 'cache'):
+        cache = InferenceCache(enabled=name == 'cache')
+        model_calls[0] = 0
+        labels = []
+        start = time.perf_counter()
+        for _ in range(args.jobs):
+            for offset in range(0, args.rows, args.claim):
+                batch = rows[offset:offset + args.claim]
+                labels += [prediction for prediction, _ in cache.classify(args.model, LABELS, batch, compute)]
+        elapsed = time.perf_counter() - start
+        results[name] = labels
+        stats = cache.stats()
+        print(f"{name:<9} {elapsed:8.2f}s {args.jobs * args.rows / elapsed:8.2f} rows/s "
+              f"model inputs {model_calls[0]:5d}  hit rate {stats['hit_rate']:.0%}")
+    same = sum(a == b for a, b in zip(results['no cache'], results['cache'])) / len(results['cache'])
+    print(f"same labels {same:.0%}")
+    backends.get_backend().close()
+
+
+if __name__ == '__main__':
+    main()
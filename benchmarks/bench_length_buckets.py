@@ -0,0 +1,104 @@
+"""
+Benchmark for length-bucketed batching in the BERT runners.
+
+Review lengths in real datasets are long-tailed: most reviews are a
+sentence or two, a few run to several paragraphs. This draws review
+lengths from a log-normal distribution (--median-words, --sigma) and
+classifies claimed batches of them two ways:
+
+- claim order: one classifier call per claim, rows as claimed, so each
+  forward pass pads every review to the longest one in it
+- bucketed:    the same calls through zero_shot.classify_by_length, which
+  sorts the claim by token length first (BERT_LENGTH_BUCKETS=1)
+
+and reports rows per second, the share of padding tokens in the forward
+passes, and whether the labels match.
+
+Usage:
+    python benchmarks/bench_length_buckets.py --model /path/to/nli-model --rows 64 --claim 32 --batch-size 16
+
+Needs transformers and torch; --backend takes any BERT_BACKEND. No database is used.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_bert_batching import LABELS, PROMPT, WORDS
+
+
+def long_tailed_reviews(n_rows, median_words, sigma, max_words, seed=0):
+    """Synthetic reviews with log-normally distributed word counts."""
+    rng = random.Random(seed)
+    lengths = [min(max(int(rng.lognormvariate(0, sigma) * median_words), 3), max_words) for _ in range(n_rows)]
+    return [' '.join(rng.choice(WORDS) for _ in range(length)) for length in lengths]
+
+
+def padding_share(tokenizer, claims, batch_size, by_length):
+    """Share of padding in the forward passes' tokens when each claim is classified in one call."""
+    hypotheses = [f'This example is {label}.' for label in LABELS]
+    real = padded = 0
+    for claim in claims:
+        lengths = [len(ids) for ids in tokenizer(claim)['input_ids']]
+        if by_length:
+            lengths.sort()
+        pairs = [length + len(tokenizer(hypothesis)['input_ids']) for length in lengths for hypothesis in hypotheses]
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start:start + batch_size]
+            real += sum(chunk)
+            padded += max(chunk) * len(chunk)
+    return 1 - real / padded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark length-bucketed batching")
+    parser.add_argument('--model', default='facebook/bart-large-mnli', help='Hub name or path of the NLI model')
+    parser.add_argument('--backend', default='torch', help='BERT_BACKEND to run')
+    parser.add_argument('--rows', type=int, default=64, help='Reviews to classify per run')
+    parser.add_argument('--claim', type=int, default=32, help='Rows per claimed batch, i.e. per classifier call')
+    parser.add_argument('--batch-size', type=int, default=16, help='Sequence-label pairs per forward pass')
+    parser.add_argument('--median-words', type=int, default=40, help='Median review length in words')
+    parser.add_argument('--sigma', type=float, default=0.9, help='Spread of the log-normal review lengths')
+    parser.add_argument('--max-words', type=int, default=400, help='Longest review in words')
+    parser.add_argument('--threads', type=int, default=0, help='torch threads (0 keeps the default)')
+    args = parser.parse_args()
+
+    os.environ.setdefault('STORAGE_BACKEND', 'sqlite')
+    os.environ['BERT_MIN_AGREEMENT'] = '0'
+    import torch
+    from sentiment_core.zero_shot import classify_by_length, load_zero_shot
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    classifier = load_zero_shot(args.model, args.backend)
+    reviews = long_tailed_reviews(args.rows, args.median_words, args.sigma, args.max_words)
+    prompts = [PROMPT.format(content=content) for content in reviews]
+    claims = [prompts[start:start + args.claim] for start in range(0, len(prompts), args.claim)]
+    classifier(prompts[:2], LABELS, batch_size=args.batch_size)
+
+    words = sorted(len(review.split()) for review in reviews)
+    print(f"{args.model} ({args.backend}): {args.rows} reviews, words min {words[0]} median "
+          f"{words[len(words) // 2]} max {words[-1]}, {args.claim} rows per claim, batch size {args.batch_size}")
+    runs = [
+        ('claim order', lambda claim: classifier(claim, LABELS, batch_size=args.batch_size), False),
+        ('bucketed', lambda claim: classify_by_length(classifier, claim, LABELS, args.batch_size), True),
+    ]
+    baseline = reference = None
+    with torch.inference_mode():
+        for name, classify, by_length in runs:
+            start = time.perf_counter()
+            labels = [result['labels'][0] for claim in claims for result in classify(claim)]
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            reference = reference or labels
+            same = sum(a == b for a, b in zip(labels, reference)) / len(reference)
+            padding = padding_share(classifier.tokenizer, claims, args.batch_size, by_length)
+            print(f"{name:<12} {elapsed:8.2f}s {args.rows / elapsed:8.2f} rows/s  padding {padding:6.1%}  "
+                  f"x{baseline / elapsed:4.2f}  same labels {same:.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Micro-benchmark for the worker's prepared statements.
+
+Runs the statements of one worker cycle (acquire a job, claim a batch, read
+the job status, release the batch, decrement the count) on a single
+connection, first sent as text and then as server-side prepared statements,
+and reports the mean cycle time together with the planning and execution
+time PostgreSQL reports for the acquire and claim statements.
+
+Usage:
+    python benchmarks/bench_prepared_statements.py --cycles 2000
+
+Requires the DB_* environment variables to point at a scratch database; the
+schema from db_setup is created if it is missing.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_claim_contention import DATASET_ID, MODEL_ID, PROMPT_ID, cleanup, seed
+
+LIBRARY = 'benchmark'
+
+
+def add_model(connection):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM models WHERE model_id = %s", (MODEL_ID,))
+        cursor.execute(
+            "INSERT INTO models (model_id, name, source, library) VALUES (%s, 'bench', 'bench', %s)",
+            (MODEL_ID, LIBRARY),
+        )
+        conn.commit()
+        cursor.close()
+
+
+def cycle(dbh, batch):
+    """One worker round trip over every hot statement."""
+    job = dbh.get_least_used_model_prompt_dataset(LIBRARY)
+    rows = dbh.claim_batch(MODEL_ID, PROMPT_ID, DATASET_ID, limit=batch)
+    dbh.get_job_status(MODEL_ID, PROMPT_ID, DATASET_ID)
+    dbh.revert_batch_status(rows, MODEL_ID, PROMPT_ID, DATASET_ID)
+    dbh.decrement_count(*job[:3])
+
+
+def explain(connection, prepared, statement, params, repeat):
+    """Return median (planning, execution) milliseconds of a statement."""
+    planning, execution = [], []
+    with connection() as conn:
+        cursor = conn.cursor()
+        for _ in range(repeat):
+            if prepared.prepared_statements:
+                prepared.execute(cursor, statement, params)
+                cursor.fetchall()
+                conn.rollback()
+                cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {statement.execute_sql}", tuple(params))
+            else:
+                cursor.execute(
+                    f"EXPLAIN (ANALYZE, FORMAT JSON) {statement.text_sql}", statement.text_params(params),
+                )
+            plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            planning.append(plan[0]['Planning Time'])
+            execution.append(plan[0]['Execution Time'])
+            conn.rollback()
+        cursor.close()
+    return statistics.median(planning), statistics.median(execution)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark prepared vs text worker statements")
+    parser.add_argument('--cycles', type=int, default=2000, help='Worker cycles per mode')
+    parser.add_argument('--rows', type=int, default=5000, help='Rows in the benchmark job')
+    parser.add_argument('--batch', type=int, default=5, help='Rows per claim')
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_MIN_SIZE'] = '1'
+    os.environ['DB_POOL_MAX_SIZE'] = '1'
+    from sentiment_core import db_helpers as dbh, prepared
+    from sentiment_core.pool import connection
+
+    seed(connection, args.rows)
+    add_model(connection)
+    acquire = dbh.ACQUIRE['ORDER BY count ASC', 'FOR UPDATE SKIP LOCKED']
+    try:
+        print(f"{args.cycles} cycles, {args.rows} rows, batch {args.batch}")
+        for mode in ('text', 'prepared'):
+            prepared.prepared_statements = mode == 'prepared'
+            for _ in range(20):
+                cycle(dbh, args.batch)
+            start = time.perf_counter()
+            for _ in range(args.cycles):
+                cycle(dbh, args.batch)
+            elapsed = time.perf_counter() - start
+            acquire_plan, acquire_exec = explain(connection, prepared, acquire, ([MODEL_ID], []), 50)
+            claim_plan, claim_exec = explain(
+                connection, prepared, dbh.CLAIM, (MODEL_ID, PROMPT_ID, DATASET_ID, args.batch, 300.0), 50,
+            )
+            print(f"{mode:<9} {elapsed / args.cycles * 1000:7.3f} ms/cycle  "
+                  f"acquire plan {acquire_plan:.3f} ms exec {acquire_exec:.3f} ms  "
+                  f"claim plan {claim_plan:.3f} ms exec {claim_exec:.3f} ms")
+    finally:
+        with connection() as conn:
+            cursor = conn.cursor()
+            cleanup(cursor)
+            cursor.execute("DELETE FROM models WHERE model_id = %s", (MODEL_ID,))
+            conn.commit()
+            cursor.close()
+
+
+if __name__ == '__main__':
+    main()
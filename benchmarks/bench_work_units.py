@@ -0,0 +1,125 @@
+"""
+Benchmark for work-unit tracking against one PredictionStatus row per row.
+
+Registers the same job once with per-row tracking and once with a
+unit_size, seeds it completely and reports the seeding time and the space
+its work-tracking rows take (tables and indexes), then drains the job with
+concurrent claimers and reports the claim rate.
+
+Usage:
+    python benchmarks/bench_work_units.py --rows 1000000 --unit-size 100
+
+Requires the DB_* environment variables to point at a scratch database; the
+schema from db_setup is created if it is missing. The work-tracking tables
+are vacuumed (FULL) between runs so their sizes can be compared.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_claim_contention import DATASET_ID, MODEL_ID, PROMPT_ID, cleanup, ensure_schema, run, report
+
+JOB = (MODEL_ID, PROMPT_ID, DATASET_ID)
+
+# predictionstatus is partitioned, so its size is the sum over its partitions
+TRACKING_SIZE_SQL = (
+    "SELECT SUM(pg_total_relation_size(relid))"
+    " FROM (SELECT relid FROM pg_partition_tree('predictionstatus') UNION ALL SELECT 'workunits'::regclass) t"
+)
+
+
+def add_rows(connection, n_rows):
+    """Replace the benchmark job and dataset with n_rows fresh rows."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        cleanup(cursor)
+        cursor.execute(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT %s + g, %s, 'benchmark review ' || g, 'positive'"
+            " FROM generate_series(1, %s) g",
+            (DATASET_ID * 10, DATASET_ID, n_rows),
+        )
+        conn.commit()
+        cursor.close()
+
+
+def register(connection, unit_size):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status, unit_size)"
+            " VALUES (%s, %s, %s, 'available', %s)",
+            (*JOB, unit_size),
+        )
+        conn.commit()
+        cursor.close()
+
+
+def compact(connection):
+    """Drop the previous run's dead tuples and return the tracking tables' size."""
+    with connection() as conn:
+        cursor = conn.cursor()
+        conn.autocommit = True
+        try:
+            cursor.execute("VACUUM (FULL, ANALYZE) predictionstatus, workunits")
+            cursor.execute(TRACKING_SIZE_SQL)
+            size = cursor.fetchone()[0]
+        finally:
+            conn.autocommit = False
+        cursor.close()
+    return size
+
+
+def tracking_size(connection):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(TRACKING_SIZE_SQL)
+        size = cursor.fetchone()[0]
+        conn.commit()
+        cursor.close()
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark work units against per-row status tracking")
+    parser.add_argument('--rows', type=int, default=1000000, help='Rows in the benchmark job')
+    parser.add_argument('--unit-size', type=int, default=100, help='Rows per work unit')
+    parser.add_argument('--workers', type=int, default=8, help='Concurrent claimers')
+    parser.add_argument('--batch', type=int, default=100, help='Rows per claim')
+    parser.add_argument('--chunk-size', type=int, default=10000, help='Rows seeded per chunk')
+    args = parser.parse_args()
+
+    os.environ['DB_POOL_MIN_SIZE'] = str(args.workers)
+    os.environ['DB_POOL_MAX_SIZE'] = str(args.workers)
+    from sentiment_core import db_helpers as dbh
+    from sentiment_core.pool import connection
+
+    ensure_schema(connection)
+    try:
+        print(f"{args.rows} rows, {args.workers} workers, batch {args.batch}, unit size {args.unit_size}")
+        for name, unit_size in (('per-row', None), ('work units', args.unit_size)):
+            add_rows(connection, args.rows)
+            dbh._unit_sizes.clear()
+            baseline = compact(connection)
+            start = time.perf_counter()
+            register(connection, unit_size)
+            while dbh.seed_job_chunk(*JOB, chunk_size=args.chunk_size):
+                pass
+            seeding = time.perf_counter() - start
+            size = tracking_size(connection) - baseline
+            print(f"{name:<12} seeded in {seeding:7.2f}s, tracking rows take {size / 2**20:8.1f} MB")
+            elapsed, claimed, calls = run(lambda: dbh.claim_batch(*JOB, limit=args.batch), args.workers, 0.0)
+            report(name, elapsed, claimed, calls, args.rows)
+    finally:
+        with connection() as conn:
+            cursor = conn.cursor()
+            cleanup(cursor)
+            conn.commit()
+            cursor.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -2,20 +2,202 @@
 Database schema and trigger setup module.
 Use create_schema(conn) to initialize tables, functions, and triggers.
 """
+import time
+
 from sqlalchemy import text
 
+# Indexes for the worker access paths. IF NOT EXISTS lets create_indexes()
+# add them to databases created before they existed.
+INDEXES = [
+    # claim_batch: a job's pending rows
+    """
+    CREATE INDEX IF NOT EXISTS predictionstatus_pending_idx
+        ON predictionstatus (model_id, prompt_id, dataset_id, row_id)
+        WHERE status = 'pending';
+    """,
+    # A job's rows in flight
+    """
+    CREATE INDEX IF NOT EXISTS predictionstatus_in_progress_idx
+        ON predictionstatus (model_id, prompt_id, dataset_id, row_id)
+        WHERE status = 'in_progress';
+    """,
+    # reclaim_expired_leases: in-flight rows across all jobs by lease expiry
+    """
+    CREATE INDEX IF NOT EXISTS predictionstatus_lease_idx
+        ON predictionstatus (lease_expires_at)
+        WHERE status = 'in_progress';
+    """,
+    # claim_work_units: a job's pending units in row order
+    """
+    CREATE INDEX IF NOT EXISTS workunits_pending_idx
+        ON workunits (model_id, prompt_id, dataset_id, first_row_id)
+        WHERE status = 'pending';
+    """,
+    # reclaim_expired_leases: units in flight by lease expiry
+    """
+    CREATE INDEX IF NOT EXISTS workunits_lease_idx
+        ON workunits (lease_expires_at)
+        WHERE status = 'in_progress';
+    """,
+    # One prediction per job and row, which the writes' ON CONFLICT relies
+    # on; also answers per-job prediction counts and lookups from the index
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS predictions_job_row_key
+        ON predictions (model_id, prompt_id, dataset_id, row_id)
+        INCLUDE (prediction);
+    """,
+    # Per-dataset prediction lookups (ensembles, comparisons across jobs)
+    """
+    CREATE INDEX IF NOT EXISTS predictions_dataset_idx
+        ON predictions (dataset_id, row_id)
+        INCLUDE (model_id, prompt_id, prediction);
+    """,
+    # Seeding a job and counting its total from the dataset's rows
+    """
+    CREATE INDEX IF NOT EXISTS rows_dataset_idx
+        ON rows (dataset_id, row_id);
+    """,
+]
+
+# Tables partitioned by dataset_id. create_dataset_partitions() adds the
+# <table>_d<dataset_id> partitions when the first job on a dataset is
+# registered; rows of other datasets go to <table>_default.
+PARTITIONED_TABLES = ('predictions', 'predictionstatus')
+
+# Labels and statuses compact_predictions() turns into enum types
+PREDICTION_LABELS = ('positive', 'negative', 'neutral', 'unknown')
+PREDICTION_STATUSES = ('done', 'failed')
+
+# Predictions with their formatted prompt, whether stored inline or, in
+# compact storage, once per distinct text in formatted_prompts
+PREDICTIONS_VIEW = """
+    CREATE VIEW predictions_expanded AS
+    SELECT p.prediction_id, p.row_id, p.model_id, p.prompt_id, p.dataset_id,
+           p.prediction, p.prediction_time, p.status,
+           COALESCE(p.formatted_prompt, fp.formatted_prompt) AS formatted_prompt
+    FROM   predictions p
+    LEFT   JOIN formatted_prompts fp ON fp.prompt_key = p.prompt_key;
+"""
+
+# Predictions shared across jobs by sentiment_core.inference_cache. IF NOT
+# EXISTS lets upgrade_schema() add it to databases created before it existed.
+INFERENCE_CACHE_TABLE = """
+    CREATE TABLE IF NOT EXISTS inference_cache (
+        cache_key UUID PRIMARY KEY,
+        model_name VARCHAR NOT NULL,
+        prediction VARCHAR NOT NULL,
+        prediction_time DOUBLE PRECISION NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+"""
+
 # DDL statements for tables, functions, and triggers.
 DDL = [
+    """
+    CREATE TABLE datasets (
+        dataset_id  SERIAL PRIMARY KEY,
+        name        VARCHAR NOT NULL,
+        description TEXT
+    );
+    """,
+    """
+    CREATE TABLE models (
+        model_id    SERIAL PRIMARY KEY,
+        name        VARCHAR NOT NULL,
+        source      VARCHAR NOT NULL,
+        description TEXT,
+        library     VARCHAR NOT NULL DEFAULT 'unknown'
+    );
+    """,
+    """
+    CREATE TABLE prompts (
+        prompt_id SERIAL PRIMARY KEY,
+        model_id  INT,
+        text      TEXT NOT NULL
+    );
+    """,
     """
     CREATE TABLE modelpromptstatus (
         model_id   INT  NOT NULL,
         prompt_id  INT  NOT NULL,
         dataset_id INT  NOT NULL,
         status     VARCHAR NOT NULL DEFAULT 'pending',
+        count      INT  DEFAULT 0,
+        unit_size  INT,
         PRIMARY KEY (model_id, prompt_id, dataset_id)
     );
     """,
     """
+    CREATE TABLE jobprogress (
+        model_id   INT NOT NULL,
+        prompt_id  INT NOT NULL,
+        dataset_id INT NOT NULL,
+        total      INT NOT NULL DEFAULT 0,
+        done       INT NOT NULL DEFAULT 0,
+        failed     INT NOT NULL DEFAULT 0,
+        seed_cursor  INT,
+        seeding_done BOOLEAN NOT NULL DEFAULT false,
+        unit_size    INT,
+        archive_cursor INT,
+        archived     BOOLEAN NOT NULL DEFAULT false,
+        PRIMARY KEY (model_id, prompt_id, dataset_id)
+    );
+    """,
+    # One confusion-matrix cell per job: predictions of rows labelled
+    # expected ('' when the row has no label) that were predicted as predicted
+    """
+    CREATE TABLE jobsummary (
+        model_id    INT NOT NULL,
+        prompt_id   INT NOT NULL,
+        dataset_id  INT NOT NULL,
+        expected    VARCHAR NOT NULL,
+        predicted   VARCHAR NOT NULL,
+        n           INT NOT NULL DEFAULT 0,
+        latency_sum FLOAT8 NOT NULL DEFAULT 0,
+        PRIMARY KEY (model_id, prompt_id, dataset_id, expected, predicted)
+    );
+    """,
+    # Precision and recall of every expected label of a job
+    """
+    CREATE VIEW job_label_metrics AS
+    SELECT l.model_id, l.prompt_id, l.dataset_id, l.label,
+           SUM(s.n) FILTER (WHERE s.expected = l.label) AS support,
+           SUM(s.n) FILTER (WHERE s.expected = l.label AND s.predicted = l.label)::FLOAT8
+               / NULLIF(SUM(s.n) FILTER (WHERE s.predicted = l.label), 0) AS precision,
+           SUM(s.n) FILTER (WHERE s.expected = l.label AND s.predicted = l.label)::FLOAT8
+               / NULLIF(SUM(s.n) FILTER (WHERE s.expected = l.label), 0) AS recall
+    FROM   (SELECT DISTINCT model_id, prompt_id, dataset_id, expected AS label
+            FROM   jobsummary
+            WHERE  expected <> '') l
+    JOIN   jobsummary s
+      ON   s.model_id = l.model_id AND s.prompt_id = l.prompt_id AND s.dataset_id = l.dataset_id
+     AND   s.expected <> ''
+    GROUP  BY l.model_id, l.prompt_id, l.dataset_id, l.label;
+    """,
+    # Accuracy, macro-averaged precision and recall, and latency per job;
+    # a label the job never predicted counts as precision 0
+    """
+    CREATE VIEW job_metrics AS
+    SELECT s.model_id, s.prompt_id, s.dataset_id,
+           SUM(s.n) AS predictions,
+           COALESCE(SUM(s.n) FILTER (WHERE s.predicted = 'unknown'), 0) AS unknown,
+           SUM(s.n) FILTER (WHERE s.expected = s.predicted)::FLOAT8
+               / NULLIF(SUM(s.n) FILTER (WHERE s.expected <> ''), 0) AS accuracy,
+           MAX(m.macro_precision) AS macro_precision,
+           MAX(m.macro_recall) AS macro_recall,
+           SUM(s.latency_sum) / NULLIF(SUM(s.n), 0) AS mean_latency
+    FROM   jobsummary s
+    LEFT   JOIN (
+               SELECT model_id, prompt_id, dataset_id,
+                      AVG(COALESCE(precision, 0)) AS macro_precision,
+                      AVG(recall) AS macro_recall
+               FROM   job_label_metrics
+               GROUP  BY model_id, prompt_id, dataset_id
+           ) m
+      ON   m.model_id = s.model_id AND m.prompt_id = s.prompt_id AND m.dataset_id = s.dataset_id
+    GROUP  BY s.model_id, s.prompt_id, s.dataset_id;
+    """,
+    """
     CREATE TABLE predictionstatus (
         row_id INT NOT NULL,
         model_id INT NOT NULL,
@@ -23,22 +205,53 @@ DDL = [
         dataset_id INT NOT NULL,
         status VARCHAR NOT NULL,
         in_progress_time TIMESTAMP,
+        lease_expires_at TIMESTAMPTZ,
         PRIMARY KEY (row_id, model_id, prompt_id, dataset_id)
+    ) PARTITION BY LIST (dataset_id);
+    """,
+    """
+    CREATE TABLE predictionstatus_default PARTITION OF predictionstatus DEFAULT;
+    """,
+    """
+    CREATE TABLE workunits (
+        model_id     INT NOT NULL,
+        prompt_id    INT NOT NULL,
+        dataset_id   INT NOT NULL,
+        first_row_id INT NOT NULL,
+        last_row_id  INT NOT NULL,
+        row_count    INT NOT NULL,
+        done_count   INT NOT NULL DEFAULT 0,
+        status       VARCHAR NOT NULL DEFAULT 'pending',
+        lease_expires_at TIMESTAMPTZ,
+        PRIMARY KEY (model_id, prompt_id, dataset_id, first_row_id)
     );
     """,
     """
     CREATE TABLE predictions (
-        prediction_id SERIAL PRIMARY KEY,
+        prediction_id SERIAL,
         row_id INT,
         model_id INT,
         prompt_id INT,
-        dataset_id INT,
+        dataset_id INT NOT NULL,
         prediction VARCHAR NOT NULL,
         prediction_time FLOAT8 NOT NULL,
         status VARCHAR NOT NULL,
-        formatted_prompt TEXT
+        formatted_prompt TEXT,
+        prompt_key UUID,
+        PRIMARY KEY (prediction_id, dataset_id)
+    ) PARTITION BY LIST (dataset_id);
+    """,
+    """
+    CREATE TABLE predictions_default PARTITION OF predictions DEFAULT;
+    """,
+    """
+    CREATE TABLE formatted_prompts (
+        prompt_key UUID PRIMARY KEY,
+        formatted_prompt TEXT NOT NULL
     );
     """,
+    INFERENCE_CACHE_TABLE,
+    PREDICTIONS_VIEW,
     """
     CREATE TABLE rows (
         row_id INT PRIMARY KEY,
@@ -57,15 +270,158 @@ DDL = [
         updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
     );
     """,
+    *INDEXES,
+    """
+    CREATE OR REPLACE FUNCTION public.create_dataset_partitions(p_dataset_id INTEGER)
+    RETURNS VOID LANGUAGE plpgsql AS $$
+    DECLARE
+        parent TEXT;
+        part TEXT;
+    BEGIN
+        -- Serialises registrations of jobs on the same dataset
+        PERFORM pg_advisory_xact_lock(hashtext('dataset_partitions'), p_dataset_id);
+        FOREACH parent IN ARRAY ARRAY['predictions', 'predictionstatus'] LOOP
+            part := parent || '_d' || p_dataset_id;
+            CONTINUE WHEN EXISTS (
+                SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass('public.' || part)
+            );
+            -- Rows written before the dataset had a partition sit in the
+            -- default partition; move them before attaching
+            EXECUTE format('CREATE TABLE public.%I (LIKE public.%I INCLUDING DEFAULTS)', part, parent);
+            EXECUTE format(
+                'WITH moved AS (DELETE FROM public.%I WHERE dataset_id = $1 RETURNING *) '
+                'INSERT INTO public.%I SELECT * FROM moved',
+                parent || '_default', part
+            ) USING p_dataset_id;
+            EXECUTE format(
+                'ALTER TABLE public.%I ATTACH PARTITION public.%I FOR VALUES IN (%s)', parent, part, p_dataset_id
+            );
+        END LOOP;
+    END;$$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION public.seed_prediction_status(
+        p_model_id INTEGER, p_prompt_id INTEGER, p_dataset_id INTEGER, chunk_size INTEGER DEFAULT 10000
+    )
+    RETURNS INTEGER LANGUAGE plpgsql AS $$
+    DECLARE
+        progress public.jobprogress%ROWTYPE;
+        chunk_rows INTEGER;
+        last_row INTEGER;
+    BEGIN
+        -- Serialises seeders of the same job; other jobs seed in parallel
+        SELECT * INTO progress
+        FROM   public.jobprogress
+        WHERE  model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id
+        FOR UPDATE;
+        IF NOT FOUND OR progress.seeding_done THEN
+            RETURN 0;
+        END IF;
+
+        IF progress.unit_size IS NULL THEN
+            WITH chunk AS (
+                SELECT r.row_id
+                FROM   public.rows r
+                WHERE  r.dataset_id = p_dataset_id
+                  AND  (progress.seed_cursor IS NULL OR r.row_id > progress.seed_cursor)
+                ORDER  BY r.row_id
+                LIMIT  chunk_size
+            ), seeded AS (
+                INSERT INTO public.predictionstatus (row_id, model_id, prompt_id, dataset_id, status)
+                SELECT row_id, p_model_id, p_prompt_id, p_dataset_id, 'pending' FROM chunk
+                ON CONFLICT DO NOTHING
+            )
+            SELECT COUNT(*), MAX(row_id) INTO chunk_rows, last_row FROM chunk;
+        ELSE
+            -- Work-unit jobs: one row per unit_size consecutive dataset rows
+            WITH chunk AS (
+                SELECT r.row_id
+                FROM   public.rows r
+                WHERE  r.dataset_id = p_dataset_id
+                  AND  (progress.seed_cursor IS NULL OR r.row_id > progress.seed_cursor)
+                ORDER  BY r.row_id
+                LIMIT  chunk_size
+            ), numbered AS (
+                SELECT row_id, (row_number() OVER (ORDER BY row_id) - 1) / progress.unit_size AS unit
+                FROM   chunk
+            ), seeded AS (
+                INSERT INTO public.workunits (model_id, prompt_id, dataset_id, first_row_id, last_row_id, row_count)
+                SELECT p_model_id, p_prompt_id, p_dataset_id, MIN(row_id), MAX(row_id), COUNT(*)
+                FROM   numbered
+                GROUP  BY unit
+                ON CONFLICT DO NOTHING
+            )
+            SELECT COUNT(*), MAX(row_id) INTO chunk_rows, last_row FROM chunk;
+        END IF;
+
+        UPDATE public.jobprogress
+           SET seed_cursor  = COALESCE(last_row, seed_cursor),
+               total        = total + chunk_rows,
+               seeding_done = chunk_rows < chunk_size
+         WHERE model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id
+        RETURNING * INTO progress;
+
+        -- Workers may have finished every seeded row before the last chunk
+        IF progress.seeding_done AND progress.total > 0
+           AND progress.done + progress.failed >= progress.total THEN
+            UPDATE public.modelpromptstatus
+               SET status = 'stop'
+             WHERE model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id
+               AND status <> 'stop';
+            IF FOUND THEN
+                INSERT INTO public.status_update_log (model_id, prompt_id, dataset_id, status)
+                VALUES (p_model_id, p_prompt_id, p_dataset_id, 'in_use');
+            END IF;
+        END IF;
+        RETURN chunk_rows;
+    END;$$;
+    """,
     """
     CREATE OR REPLACE FUNCTION public.add_prediction_status_for_model_prompt_dataset()
     RETURNS trigger LANGUAGE plpgsql AS $$
     BEGIN
-        INSERT INTO public.predictionstatus (row_id, model_id, prompt_id, dataset_id, status)
-        SELECT r.row_id, NEW.model_id, NEW.prompt_id, NEW.dataset_id, 'pending'
-        FROM   public.rows r
-        WHERE  r.dataset_id = NEW.dataset_id
-        ON CONFLICT DO NOTHING;
+        PERFORM public.create_dataset_partitions(NEW.dataset_id);
+
+        -- Counters start from whatever the job already predicted; afterwards
+        -- update_modelpromptstatus() maintains them incrementally
+        INSERT INTO public.jobprogress (model_id, prompt_id, dataset_id, done, failed, unit_size)
+        SELECT NEW.model_id, NEW.prompt_id, NEW.dataset_id,
+               COUNT(*) FILTER (WHERE p.prediction <> 'unknown'),
+               COUNT(*) FILTER (WHERE p.prediction = 'unknown'),
+               NEW.unit_size
+        FROM   public.predictions p
+        WHERE  p.model_id = NEW.model_id
+          AND  p.prompt_id = NEW.prompt_id
+          AND  p.dataset_id = NEW.dataset_id
+        ON CONFLICT (model_id, prompt_id, dataset_id) DO UPDATE
+           SET total        = 0,
+               done         = EXCLUDED.done,
+               failed       = EXCLUDED.failed,
+               seed_cursor  = NULL,
+               seeding_done = false,
+               unit_size    = EXCLUDED.unit_size,
+               archive_cursor = NULL,
+               archived     = false;
+
+        -- Same for the confusion-matrix cells
+        DELETE FROM public.jobsummary
+        WHERE model_id  = NEW.model_id
+          AND prompt_id = NEW.prompt_id
+          AND dataset_id = NEW.dataset_id;
+        INSERT INTO public.jobsummary (model_id, prompt_id, dataset_id, expected, predicted, n, latency_sum)
+        SELECT p.model_id, p.prompt_id, p.dataset_id,
+               COALESCE(lower(r.expected_prediction), ''), p.prediction::text,
+               COUNT(*), SUM(p.prediction_time)
+        FROM   public.predictions p
+        LEFT   JOIN public.rows r ON r.row_id = p.row_id
+        WHERE  p.model_id = NEW.model_id
+          AND  p.prompt_id = NEW.prompt_id
+          AND  p.dataset_id = NEW.dataset_id
+        GROUP  BY 1, 2, 3, 4, 5;
+
+        -- Seed only the first chunk here so registering a job stays cheap;
+        -- workers and sentiment_core.seeding seed the rest
+        PERFORM public.seed_prediction_status(NEW.model_id, NEW.prompt_id, NEW.dataset_id, 1000);
         RETURN NEW;
     END;$$;
     """,
@@ -74,6 +430,21 @@ DDL = [
     RETURNS trigger LANGUAGE plpgsql AS $$
     BEGIN
         DELETE FROM public.predictionstatus
+        WHERE model_id  = OLD.model_id
+          AND prompt_id = OLD.prompt_id
+          AND dataset_id = OLD.dataset_id;
+
+        DELETE FROM public.workunits
+        WHERE model_id  = OLD.model_id
+          AND prompt_id = OLD.prompt_id
+          AND dataset_id = OLD.dataset_id;
+
+        DELETE FROM public.jobprogress
+        WHERE model_id  = OLD.model_id
+          AND prompt_id = OLD.prompt_id
+          AND dataset_id = OLD.dataset_id;
+
+        DELETE FROM public.jobsummary
         WHERE model_id  = OLD.model_id
           AND prompt_id = OLD.prompt_id
           AND dataset_id = OLD.dataset_id;
@@ -91,38 +462,274 @@ DDL = [
     END;$$;
     """,
     """
-    CREATE OR REPLACE FUNCTION public.update_modelpromptstatus()
-    RETURNS trigger LANGUAGE plpgsql AS $$
+    CREATE OR REPLACE FUNCTION public.reclaim_expired_leases(max_rows INTEGER DEFAULT 1000)
+    RETURNS INTEGER LANGUAGE plpgsql AS $$
     DECLARE
-        total_rows INTEGER;
-        count_rows INTEGER;
+        reclaimed INTEGER;
+        expired_units INTEGER;
     BEGIN
-        SELECT COUNT(*) INTO count_rows
-        FROM   public.predictions
-        WHERE  model_id  = NEW.model_id
-          AND  prompt_id = NEW.prompt_id
-          AND  dataset_id = NEW.dataset_id;
-
-        IF count_rows % 50 = 0 THEN
-            SELECT COUNT(*) INTO total_rows
-            FROM   public.predictions
-            WHERE  dataset_id = NEW.dataset_id;
-
-            IF count_rows >= total_rows OR count_rows > 5000 THEN
-                UPDATE public.modelpromptstatus
-                   SET status = 'stop'
-                 WHERE model_id  = NEW.model_id
-                   AND prompt_id = NEW.prompt_id
-                   AND dataset_id = NEW.dataset_id;
+        WITH expired AS (
+            SELECT row_id, model_id, prompt_id, dataset_id
+            FROM   public.predictionstatus
+            WHERE  status = 'in_progress'
+              AND  lease_expires_at < CURRENT_TIMESTAMP
+            LIMIT  max_rows
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE public.predictionstatus ps
+           SET status = 'pending', lease_expires_at = NULL
+          FROM expired e
+         WHERE ps.row_id = e.row_id
+           AND ps.model_id = e.model_id
+           AND ps.prompt_id = e.prompt_id
+           AND ps.dataset_id = e.dataset_id;
+        GET DIAGNOSTICS reclaimed = ROW_COUNT;
 
-                INSERT INTO public.status_update_log (model_id, prompt_id, dataset_id, status)
-                VALUES (NEW.model_id, NEW.prompt_id, NEW.dataset_id, 'in_use');
+        WITH expired AS (
+            SELECT model_id, prompt_id, dataset_id, first_row_id
+            FROM   public.workunits
+            WHERE  status = 'in_progress'
+              AND  lease_expires_at < CURRENT_TIMESTAMP
+            LIMIT  max_rows
+            FOR UPDATE SKIP LOCKED
+        )
+        UPDATE public.workunits wu
+           SET status = 'pending', lease_expires_at = NULL
+          FROM expired e
+         WHERE wu.model_id = e.model_id
+           AND wu.prompt_id = e.prompt_id
+           AND wu.dataset_id = e.dataset_id
+           AND wu.first_row_id = e.first_row_id;
+        GET DIAGNOSTICS expired_units = ROW_COUNT;
+        RETURN reclaimed + expired_units;
+    END;$$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION public.claim_work_units(
+        p_model_id INTEGER, p_prompt_id INTEGER, p_dataset_id INTEGER, max_rows INTEGER, lease_secs FLOAT8
+    )
+    RETURNS TABLE (row_id INTEGER, content TEXT) LANGUAGE plpgsql AS $$
+    #variable_conflict use_column
+    DECLARE
+        unit_limit INTEGER;
+        unit_lease FLOAT8;
+        firsts INTEGER[];
+        lasts INTEGER[];
+    BEGIN
+        SELECT GREATEST(1, CEIL(max_rows::NUMERIC / jp.unit_size))::INTEGER,
+               -- lease_secs covers max_rows; whole units can hand out more
+               lease_secs * GREATEST(1.0, jp.unit_size::FLOAT8 / GREATEST(max_rows, 1))
+        INTO   unit_limit, unit_lease
+        FROM   public.jobprogress jp
+        WHERE  jp.model_id = p_model_id AND jp.prompt_id = p_prompt_id AND jp.dataset_id = p_dataset_id;
+        IF unit_limit IS NULL THEN
+            RETURN;
+        END IF;
+
+        LOOP
+            WITH units AS (
+                SELECT wu.first_row_id
+                FROM   public.workunits wu
+                WHERE  wu.model_id = p_model_id AND wu.prompt_id = p_prompt_id AND wu.dataset_id = p_dataset_id
+                  AND  wu.status = 'pending'
+                ORDER  BY wu.first_row_id
+                LIMIT  unit_limit
+                FOR UPDATE SKIP LOCKED
+            ), claimed AS (
+                UPDATE public.workunits wu
+                   SET status = 'in_progress',
+                       lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => unit_lease)
+                  FROM units u
+                 WHERE wu.model_id = p_model_id AND wu.prompt_id = p_prompt_id AND wu.dataset_id = p_dataset_id
+                   AND wu.first_row_id = u.first_row_id
+                RETURNING wu.first_row_id, wu.last_row_id
+            )
+            SELECT array_agg(c.first_row_id), array_agg(c.last_row_id) INTO firsts, lasts FROM claimed c;
+            IF firsts IS NULL THEN
+                RETURN;
+            END IF;
+
+            -- Rows of a released or reclaimed unit that were already
+            -- predicted are not handed out again
+            RETURN QUERY
+            SELECT r.row_id, r.content
+            FROM   unnest(firsts, lasts) AS u (first_row_id, last_row_id)
+            JOIN   public.rows r
+              ON   r.dataset_id = p_dataset_id AND r.row_id BETWEEN u.first_row_id AND u.last_row_id
+            WHERE  NOT EXISTS (
+                       SELECT 1 FROM public.predictions p
+                       WHERE  p.model_id = p_model_id AND p.prompt_id = p_prompt_id
+                         AND  p.dataset_id = p_dataset_id AND p.row_id = r.row_id
+                   )
+            ORDER  BY r.row_id;
+            IF FOUND THEN
+                RETURN;
             END IF;
+
+            -- Every row of these units is predicted already
+            UPDATE public.workunits wu
+               SET status = 'done', lease_expires_at = NULL
+             WHERE wu.model_id = p_model_id AND wu.prompt_id = p_prompt_id AND wu.dataset_id = p_dataset_id
+               AND wu.first_row_id = ANY(firsts);
+        END LOOP;
+    END;$$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION public.update_modelpromptstatus()
+    RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        -- Fold this statement's predictions into the job counters and
+        -- confusion-matrix cells, then stop jobs that are complete or reached
+        -- the 5000 prediction cap
+        WITH delta AS (
+            SELECT model_id, prompt_id, dataset_id,
+                   COUNT(*) FILTER (WHERE prediction <> 'unknown') AS done,
+                   COUNT(*) FILTER (WHERE prediction = 'unknown')  AS failed
+            FROM   inserted
+            GROUP  BY model_id, prompt_id, dataset_id
+        ), progress AS (
+            INSERT INTO public.jobprogress (model_id, prompt_id, dataset_id, done, failed)
+            SELECT model_id, prompt_id, dataset_id, done, failed FROM delta
+            ON CONFLICT (model_id, prompt_id, dataset_id) DO UPDATE
+               SET done   = jobprogress.done + EXCLUDED.done,
+                   failed = jobprogress.failed + EXCLUDED.failed
+            RETURNING model_id, prompt_id, dataset_id, total, seeding_done, done + failed AS processed
+        ), summary AS (
+            -- Confusion-matrix cells against the rows' expected labels,
+            -- upserted in key order so concurrent batches cannot deadlock
+            INSERT INTO public.jobsummary AS js (model_id, prompt_id, dataset_id, expected, predicted, n, latency_sum)
+            SELECT i.model_id, i.prompt_id, i.dataset_id,
+                   COALESCE((SELECT lower(r.expected_prediction) FROM public.rows r WHERE r.row_id = i.row_id), ''),
+                   i.prediction::text, COUNT(*), SUM(i.prediction_time)
+            FROM   inserted i
+            GROUP  BY 1, 2, 3, 4, 5
+            ORDER  BY 1, 2, 3, 4, 5
+            ON CONFLICT (model_id, prompt_id, dataset_id, expected, predicted) DO UPDATE
+               SET n           = js.n + EXCLUDED.n,
+                   latency_sum = js.latency_sum + EXCLUDED.latency_sum
+        ), unit_delta AS (
+            -- Each prediction of a work-unit job counts towards the unit
+            -- holding its row; the unit is done once all its rows are
+            SELECT u.model_id, u.prompt_id, u.dataset_id, u.first_row_id, COUNT(*) AS n
+            FROM   inserted i
+            JOIN   LATERAL (
+                       SELECT wu.model_id, wu.prompt_id, wu.dataset_id, wu.first_row_id, wu.last_row_id
+                       FROM   public.workunits wu
+                       WHERE  wu.model_id = i.model_id AND wu.prompt_id = i.prompt_id
+                         AND  wu.dataset_id = i.dataset_id AND wu.first_row_id <= i.row_id
+                       ORDER  BY wu.first_row_id DESC
+                       LIMIT  1
+                   ) u ON u.last_row_id >= i.row_id
+            GROUP  BY u.model_id, u.prompt_id, u.dataset_id, u.first_row_id
+        ), units AS (
+            UPDATE public.workunits wu
+               SET done_count = wu.done_count + d.n,
+                   status = CASE WHEN wu.done_count + d.n >= wu.row_count THEN 'done' ELSE wu.status END,
+                   lease_expires_at = CASE WHEN wu.done_count + d.n >= wu.row_count THEN NULL
+                                           ELSE wu.lease_expires_at END
+              FROM unit_delta d
+             WHERE wu.model_id = d.model_id AND wu.prompt_id = d.prompt_id
+               AND wu.dataset_id = d.dataset_id AND wu.first_row_id = d.first_row_id
+        ), stopped AS (
+            UPDATE public.modelpromptstatus mps
+               SET status = 'stop'
+              FROM progress p
+             WHERE mps.model_id  = p.model_id
+               AND mps.prompt_id = p.prompt_id
+               AND mps.dataset_id = p.dataset_id
+               AND mps.status <> 'stop'
+               AND ((p.seeding_done AND p.total > 0 AND p.processed >= p.total) OR p.processed > 5000)
+            RETURNING mps.model_id, mps.prompt_id, mps.dataset_id
+        )
+        INSERT INTO public.status_update_log (model_id, prompt_id, dataset_id, status)
+        SELECT model_id, prompt_id, dataset_id, 'in_use' FROM stopped;
+        RETURN NULL;
+    END;$$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION public.notify_job_status()
+    RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF NEW.status IS DISTINCT FROM OLD.status THEN
+            PERFORM pg_notify('job_status', json_build_object(
+                'model_id',   NEW.model_id,
+                'prompt_id',  NEW.prompt_id,
+                'dataset_id', NEW.dataset_id,
+                'status',     NEW.status
+            )::text);
         END IF;
         RETURN NEW;
     END;$$;
     """,
     """
+    CREATE OR REPLACE FUNCTION public.archive_job_status(
+        p_model_id INTEGER, p_prompt_id INTEGER, p_dataset_id INTEGER, chunk_size INTEGER DEFAULT 10000
+    )
+    RETURNS INTEGER LANGUAGE plpgsql AS $$
+    DECLARE
+        progress public.jobprogress%ROWTYPE;
+        chunk_rows INTEGER := 0;
+        last_row INTEGER;
+    BEGIN
+        -- Serialises archivers of the same job
+        SELECT * INTO progress
+        FROM   public.jobprogress
+        WHERE  model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id
+        FOR UPDATE;
+        IF NOT FOUND OR progress.archived THEN
+            RETURN 0;
+        END IF;
+
+        -- Only stopped jobs with a prediction for every row and nothing in flight
+        IF NOT (progress.seeding_done AND progress.done + progress.failed >= progress.total)
+           OR NOT EXISTS (
+               SELECT 1 FROM public.modelpromptstatus
+               WHERE  model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id
+                 AND  status = 'stop'
+           )
+           OR EXISTS (
+               SELECT 1 FROM public.predictionstatus
+               WHERE  model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id
+                 AND  status = 'pending'
+           )
+           OR EXISTS (
+               SELECT 1 FROM public.predictionstatus
+               WHERE  model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id
+                 AND  status = 'in_progress'
+           ) THEN
+            RAISE EXCEPTION 'job (%, %, %) is not complete', p_model_id, p_prompt_id, p_dataset_id
+                USING ERRCODE = 'object_not_in_prerequisite_state';
+        END IF;
+
+        -- Work-unit jobs have no per-row status to walk through
+        IF progress.unit_size IS NULL THEN
+            SELECT COUNT(*), MAX(c.row_id) INTO chunk_rows, last_row
+            FROM   (
+                       SELECT r.row_id
+                       FROM   public.rows r
+                       WHERE  r.dataset_id = p_dataset_id
+                         AND  (progress.archive_cursor IS NULL OR r.row_id > progress.archive_cursor)
+                       ORDER  BY r.row_id
+                       LIMIT  chunk_size
+                   ) c;
+            -- A primary-key range scan over this chunk's rows only
+            DELETE FROM public.predictionstatus
+            WHERE  row_id > COALESCE(progress.archive_cursor, -2147483648) AND row_id <= last_row
+              AND  model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id;
+        END IF;
+
+        IF chunk_rows < chunk_size THEN
+            DELETE FROM public.workunits
+            WHERE  model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id;
+        END IF;
+        UPDATE public.jobprogress
+           SET archive_cursor = COALESCE(last_row, archive_cursor),
+               archived       = chunk_rows < chunk_size
+         WHERE model_id = p_model_id AND prompt_id = p_prompt_id AND dataset_id = p_dataset_id;
+        RETURN chunk_rows;
+    END;$$;
+    """,
+    """
     CREATE TRIGGER after_insert_model_prompt_status
     AFTER INSERT ON modelpromptstatus
     FOR EACH ROW EXECUTE FUNCTION add_prediction_status_for_model_prompt_dataset();
@@ -133,6 +740,11 @@ DDL = [
     FOR EACH ROW EXECUTE FUNCTION remove_prediction_status_for_model_prompt_dataset();
     """,
     """
+    CREATE TRIGGER after_update_model_prompt_status
+    AFTER UPDATE OF status ON modelpromptstatus
+    FOR EACH ROW EXECUTE FUNCTION notify_job_status();
+    """,
+    """
     CREATE TRIGGER before_update_prediction_status
     BEFORE UPDATE ON predictionstatus
     FOR EACH ROW EXECUTE FUNCTION update_in_progress_time();
@@ -140,7 +752,8 @@ DDL = [
     """
     CREATE TRIGGER predictions_after_insert
     AFTER INSERT ON predictions
-    FOR EACH ROW EXECUTE FUNCTION update_modelpromptstatus();
+    REFERENCING NEW TABLE AS inserted
+    FOR EACH STATEMENT EXECUTE FUNCTION update_modelpromptstatus();
     """,
 ]
 
@@ -149,4 +762,123 @@ def create_schema(conn):
     Execute all DDL statements on the given SQLAlchemy connection or transaction.
     """
     for stmt in DDL:
-        conn.execute(text(stmt))
\ No newline at end of file
+        conn.execute(text(stmt))
+
+def create_indexes(conn):
+    """
+    Add any missing worker indexes to an existing database.
+    """
+    for stmt in INDEXES:
+        conn.execute(text(stmt))
+
+def upgrade_schema(conn):
+    """
+    Add the tables and indexes newer code expects to an existing database; safe to rerun.
+
+    predictions_job_row_key replaces the non-unique predictions_job_idx;
+    building it fails if a job already has two predictions for a row.
+    """
+    conn.execute(text(INFERENCE_CACHE_TABLE))
+    create_indexes(conn)
+    conn.execute(text("DROP INDEX IF EXISTS predictions_job_idx"))
+
+def dataset_partitions(dataset_id):
+    """
+    Return (table, partition) for each partitioned table's partition of a dataset.
+    """
+    return [(table, f"{table}_d{int(dataset_id)}") for table in PARTITIONED_TABLES]
+
+def detach_dataset_partitions(conn, dataset_id):
+    """
+    Detach a dataset's partitions, keeping them as standalone tables; returns their names.
+
+    The dataset's predictions and status rows disappear from the parent
+    tables without being deleted row by row, e.g. to archive or dump a
+    finished experiment. The detached tables are renamed
+    <partition>_detached_<YYYYmmddHHMMSS>, so registering jobs on the
+    dataset again creates fresh partitions.
+    """
+    suffix = time.strftime('%Y%m%d%H%M%S')
+    detached = []
+    for table, partition in dataset_partitions(dataset_id):
+        conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {partition}"))
+        conn.execute(text(f"ALTER TABLE {partition} RENAME TO {partition}_detached_{suffix}"))
+        detached.append(f"{partition}_detached_{suffix}")
+    return detached
+
+def drop_dataset_partitions(conn, dataset_id):
+    """
+    Drop a dataset's predictions and status rows with its partitions, then its jobs.
+    """
+    for _, partition in dataset_partitions(dataset_id):
+        conn.execute(text(f"DROP TABLE IF EXISTS {partition}"))
+    conn.execute(text("DELETE FROM modelpromptstatus WHERE dataset_id = :dataset_id"), {"dataset_id": dataset_id})
+
+def predictions_size(conn):
+    """
+    Return the bytes predictions (all partitions, with indexes) and formatted_prompts take.
+    """
+    return conn.execute(text(
+        "SELECT SUM(pg_total_relation_size(relid)) FROM ("
+        " SELECT relid FROM pg_partition_tree('predictions')"
+        " UNION ALL SELECT 'formatted_prompts'::regclass) t"
+    )).scalar_one()
+
+def compact_predictions(conn, normalize=False):
+    """
+    Convert predictions to compact storage; returns (bytes before, bytes after).
+
+    prediction and status become the enum types prediction_label and
+    prediction_status, and each distinct formatted prompt moves to
+    formatted_prompts, referenced by the md5 prompt_key. The table is
+    rewritten once. Predictions outside PREDICTION_LABELS (raw model output
+    from the legacy scripts) raise ValueError unless normalize is set, which
+    maps them the way sentiment_core.parsers.parse_sentiment does. Workers
+    must run with COMPACT_PREDICTIONS=1 afterwards.
+    """
+    before = predictions_size(conn)
+    if conn.execute(text("SELECT to_regtype('prediction_label') IS NOT NULL")).scalar_one():
+        return before, before
+    labels = ', '.join(f"'{label}'" for label in PREDICTION_LABELS)
+    statuses = ', '.join(f"'{status}'" for status in PREDICTION_STATUSES)
+    unexpected = conn.execute(text(
+        f"SELECT DISTINCT status FROM predictions WHERE status NOT IN ({statuses}) LIMIT 5"
+    )).scalars().all()
+    if unexpected:
+        raise ValueError(f"predictions with statuses outside {PREDICTION_STATUSES}: {unexpected}")
+    unexpected = conn.execute(text(
+        f"SELECT DISTINCT prediction FROM predictions WHERE prediction NOT IN ({labels}) LIMIT 5"
+    )).scalars().all()
+    if unexpected and not normalize:
+        raise ValueError(
+            f"predictions outside {PREDICTION_LABELS}, e.g. {unexpected}; pass normalize=True to parse them"
+        )
+
+    conn.execute(text(f"CREATE TYPE prediction_label AS ENUM ({labels})"))
+    conn.execute(text(f"CREATE TYPE prediction_status AS ENUM ({statuses})"))
+    conn.execute(text(
+        "INSERT INTO formatted_prompts (prompt_key, formatted_prompt)"
+        " SELECT DISTINCT md5(formatted_prompt)::uuid, formatted_prompt"
+        " FROM predictions WHERE formatted_prompt IS NOT NULL"
+        " ON CONFLICT DO NOTHING"
+    ))
+    conn.execute(text("DROP VIEW predictions_expanded"))
+    # Every USING sees the old row, so this is a single rewrite
+    conn.execute(text(r"""
+        ALTER TABLE predictions
+            ALTER COLUMN prompt_key TYPE UUID USING COALESCE(prompt_key, md5(formatted_prompt)::uuid),
+            ALTER COLUMN formatted_prompt TYPE TEXT USING NULL,
+            ALTER COLUMN prediction TYPE prediction_label USING (
+                CASE
+                    WHEN prediction IN ('positive', 'negative', 'neutral', 'unknown') THEN prediction
+                    WHEN lower(prediction) ~ '\mpositive\M' THEN 'positive'
+                    WHEN lower(prediction) ~ '\mnegative\M' THEN 'negative'
+                    WHEN lower(prediction) ~ '\mneutral\M' THEN 'neutral'
+                    ELSE 'unknown'
+                END
+            )::prediction_label,
+            ALTER COLUMN status TYPE prediction_status USING status::prediction_status
+    """))
+    conn.execute(text(PREDICTIONS_VIEW))
+    conn.execute(text("ANALYZE predictions, formatted_prompts"))
+    return before, predictions_size(conn)
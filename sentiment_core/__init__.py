@@ -5,8 +5,23 @@ from .config import db_params, batch_size
 from .parsers import parse_sentiment
 from .db_helpers import (
     get_least_used_model_prompt_dataset,
+    claim_batch,
     fetch_batch,
     update_prediction,
+    write_predictions,
     revert_batch_status,
     decrement_count,
-)
\ No newline at end of file
+    get_job_status,
+    get_job_progress,
+    reclaim_expired_leases,
+    seed_job_chunk,
+    get_unseeded_jobs,
+)
+from .backends import StorageBackend, PostgresBackend, SQLiteBackend, get_backend, set_backend
+from .pool import ConnectionPool, PoolError, PoolTimeout, get_pool, pool_stats, close_pool
+from .writer import PredictionWriter
+from .model_registry import ModelRegistry
+from .inference_cache import InferenceCache
+from .prefetch import BatchPrefetcher
+from .notifications import JobStatusListener
+from .worker import Job, run_worker, process_job
@@ -0,0 +1,73 @@
+"""
+Remove the PredictionStatus rows of finished jobs in resumable chunks.
+
+A job that reached stop with every row predicted keeps one done status row
+per dataset row, which only weighs on the claim path's table and indexes.
+Archiving deletes them (and the job's work units) chunk by chunk while
+workers keep running on other jobs; predictions, job counters and the job
+summary stay. Run it after experiments finish:
+
+    python -m sentiment_core.archiving --chunk-size 10000 --vacuum
+"""
+import argparse
+import logging
+
+from .config import archive_chunk_size
+from .db_helpers import archive_job_chunk, get_archivable_jobs
+from .pool import connection
+
+
+def archive_jobs(chunk_size=None, jobs=None):
+    """
+    Archive the given jobs, or every finished job; returns the dataset rows covered.
+
+    Safe to interrupt and to run next to workers and other archivers.
+    """
+    chunk_size = archive_chunk_size if chunk_size is None else chunk_size
+    total = 0
+    for job in (get_archivable_jobs() if jobs is None else jobs):
+        job_rows = 0
+        while True:
+            archived = archive_job_chunk(*job, chunk_size=chunk_size)
+            job_rows += archived
+            if archived < chunk_size:
+                break
+        logging.info(f"Archived {job_rows} rows for model {job[0]}, prompt {job[1]}, dataset {job[2]}")
+        total += job_rows
+    return total
+
+
+def vacuum_status_tables():
+    """
+    VACUUM the status tables so the space of archived rows is reused; returns their size in bytes.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        conn.autocommit = True
+        try:
+            cursor.execute("VACUUM (ANALYZE) predictionstatus, workunits")
+            cursor.execute(
+                "SELECT SUM(pg_total_relation_size(relid))"
+                " FROM (SELECT relid FROM pg_partition_tree('predictionstatus')"
+                " UNION ALL SELECT 'workunits'::regclass) t"
+            )
+            return cursor.fetchone()[0]
+        finally:
+            conn.autocommit = False
+            cursor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive PredictionStatus rows of finished jobs")
+    parser.add_argument('--chunk-size', type=int, default=archive_chunk_size, help='Rows per transaction')
+    parser.add_argument('--vacuum', action='store_true', help='VACUUM the status tables afterwards')
+    args = parser.parse_args()
+    archived = archive_jobs(args.chunk_size)
+    print(f"Archived {archived} rows.")
+    if args.vacuum:
+        size = vacuum_status_tables()
+        print(f"Status tables take {size / 2**20:.1f} MB.")
+
+
+if __name__ == '__main__':
+    main()
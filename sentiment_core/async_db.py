@@ -0,0 +1,358 @@
+"""
+Asyncio data access for sentiment_core on psycopg 3.
+
+The coroutines mirror db_helpers: same names, arguments and results, and
+the same statements, so asyncio-based runners can use the work queue without
+blocking their event loop. Connections run in autocommit mode, as every
+worker query is a single statement, and in pipeline mode, so a call sends its
+statements without waiting for each result: most calls take one network
+round trip instead of two (statement, then COMMIT) with psycopg2.
+write_and_claim pipelines the worker's write, status check and next claim
+into one round trip.
+
+Requires psycopg 3 (pip install "psycopg[binary]"); the rest of
+sentiment_core does not import this module.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+
+import psycopg
+
+from . import db_helpers
+from .config import (
+    batch_size,
+    catalog_ttl,
+    compact_predictions,
+    db_params,
+    lease_reclaim_limit,
+    lease_seconds as default_lease_seconds,
+    pool_connect_retries,
+    pool_max_size,
+    pool_timeout,
+    prepared_statements,
+    seed_chunk_size,
+)
+from .db_helpers import (
+    ACQUIRE,
+    CLAIM,
+    CLAIM_UNITS,
+    DECREMENT,
+    JOB_PROGRESS,
+    JOB_STATUS,
+    RECLAIM,
+    REVERT,
+    REVERT_UNITS,
+    SEED,
+    UNIT_SIZE,
+    WRITE,
+    WRITE_COMPACT,
+)
+from .pool import PoolError, PoolTimeout
+
+
+class AsyncConnectionPool:
+    """
+    Pool of long-lived psycopg 3 AsyncConnections for one event loop.
+
+    Connections are opened on demand up to max_size; broken connections are
+    discarded and replaced on the next checkout.
+    """
+
+    def __init__(self, params, max_size=5, timeout=30.0, connect_retries=3):
+        self._params = params
+        self._timeout = timeout
+        self._connect_retries = connect_retries
+        self._slots = asyncio.Semaphore(max_size)
+        self._idle = []
+        self._closed = False
+        self._stats = {'checkouts': 0, 'timeouts': 0, 'connects': 0, 'discarded': 0}
+
+    async def _connect(self):
+        """Open a new connection, retrying with backoff on failure."""
+        for attempt in range(self._connect_retries):
+            try:
+                # prepare_threshold=0 prepares every statement on first use,
+                # None never does, as PREPARED_STATEMENTS=0 asks
+                conn = await psycopg.AsyncConnection.connect(
+                    autocommit=True, prepare_threshold=0 if prepared_statements else None,
+                    **{'client_encoding': 'utf8', **self._params},
+                )
+            except psycopg.OperationalError:
+                if attempt == self._connect_retries - 1:
+                    raise
+                logging.warning('Database connection failed, retrying (attempt %d)', attempt + 1)
+                await asyncio.sleep(0.5 * 2 ** attempt)
+                continue
+            self._stats['connects'] += 1
+            return conn
+
+    @asynccontextmanager
+    async def connection(self):
+        """Async context manager yielding a pooled connection."""
+        if self._closed:
+            raise PoolError('connection pool is closed')
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self._timeout)
+        except asyncio.TimeoutError:
+            self._stats['timeouts'] += 1
+            raise PoolTimeout(f'no connection available after {self._timeout}s') from None
+        conn = None
+        discard = False
+        try:
+            while self._idle and conn is None:
+                conn = self._idle.pop()
+                if conn.closed:
+                    conn = None
+            if conn is None:
+                conn = await self._connect()
+            self._stats['checkouts'] += 1
+            yield conn
+        except (psycopg.OperationalError, psycopg.InterfaceError):
+            # The server side is gone; never hand this connection out again
+            discard = True
+            raise
+        finally:
+            if conn is not None:
+                if discard or self._closed or conn.closed:
+                    self._stats['discarded'] += 1
+                    await conn.close()
+                else:
+                    self._idle.append(conn)
+            self._slots.release()
+
+    def stats(self):
+        """Return a snapshot of pool usage counters."""
+        return dict(self._stats, idle=len(self._idle))
+
+    async def close(self):
+        """Close all idle connections; checked-out ones close when returned."""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            await conn.close()
+
+
+_pool = None
+
+
+def get_async_pool():
+    """Return the process-wide async pool, creating it from config on first use."""
+    global _pool
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            db_params, max_size=pool_max_size, timeout=pool_timeout, connect_retries=pool_connect_retries,
+        )
+    return _pool
+
+
+def connection():
+    """Check out a connection from the process-wide async pool."""
+    return get_async_pool().connection()
+
+
+async def close_async_pool():
+    """Close and forget the process-wide async pool."""
+    global _pool
+    if _pool is not None:
+        pool, _pool = _pool, None
+        await pool.close()
+
+
+async def _execute(conn, statement, params):
+    """Queue one of the db_helpers statements on conn and return its cursor."""
+    cursor = conn.cursor()
+    await cursor.execute(statement.typed_sql, statement.text_params(params))
+    return cursor
+
+
+async def _load_catalog(library: str, refresh=False):
+    """
+    Return the {id: name} lookups of db_helpers._load_catalog, sharing its cache.
+
+    The three tables are read in one round trip.
+    """
+    with db_helpers._catalog_lock:
+        entry = db_helpers._catalogs.get(library)
+        if entry and not refresh and time.monotonic() - entry[0] < catalog_ttl:
+            return entry[1:]
+    async with connection() as conn, conn.pipeline():
+        queued = [conn.cursor() for _ in range(3)]
+        await queued[0].execute("SELECT model_id, name FROM Models WHERE library = %s", (library,))
+        await queued[1].execute("SELECT prompt_id, text FROM Prompts")
+        await queued[2].execute("SELECT dataset_id, name FROM Datasets")
+        models, prompts, datasets = [dict(await cursor.fetchall()) for cursor in queued]
+    with db_helpers._catalog_lock:
+        db_helpers._catalogs[library] = (time.monotonic(), models, prompts, datasets)
+    return models, prompts, datasets
+
+
+async def _unit_size(conn, job):
+    """Return the job's work unit size from the cache db_helpers._unit_size fills."""
+    with db_helpers._catalog_lock:
+        if job in db_helpers._unit_sizes:
+            return db_helpers._unit_sizes[job]
+    result = await (await _execute(conn, UNIT_SIZE, job)).fetchone()
+    if result is None:
+        return None
+    with db_helpers._catalog_lock:
+        db_helpers._unit_sizes[job] = result[0]
+    return result[0]
+
+
+def _write_columns(batch):
+    columns = [[] for _ in range(7)]
+    for row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, formatted_prompt in batch:
+        record = (
+            row_id, model_id, prompt_id, dataset_id,
+            prediction.strip().lower(), prediction_time, formatted_prompt.strip().lower(),
+        )
+        for column, value in zip(columns, record):
+            column.append(value)
+    return columns
+
+
+async def get_least_used_model_prompt_dataset(library: str, exclude_prompt_ids=None):
+    """
+    Acquire the least used model-prompt-dataset combination for the given library.
+
+    See db_helpers.get_least_used_model_prompt_dataset.
+    """
+    exclude_prompt_ids = list(exclude_prompt_ids or [])
+    models, prompts, datasets = await _load_catalog(library)
+    if not models:
+        return None
+    order_clause = 'ORDER BY model_id * RANDOM()' if library == 'openai' else 'ORDER BY count ASC'
+    async with connection() as conn:
+        for lock_clause in ('FOR UPDATE SKIP LOCKED', 'FOR UPDATE'):
+            cursor = await _execute(conn, ACQUIRE[order_clause, lock_clause], (list(models), exclude_prompt_ids))
+            result = await cursor.fetchone()
+            if result:
+                break
+    if not result:
+        return None
+    model_id, prompt_id, dataset_id, count = result
+    if prompt_id not in prompts or dataset_id not in datasets:
+        models, prompts, datasets = await _load_catalog(library, refresh=True)
+    return (
+        model_id, prompt_id, dataset_id,
+        models.get(model_id), prompts.get(prompt_id), datasets.get(dataset_id),
+        count,
+    )
+
+
+async def claim_batch(model_id, prompt_id, dataset_id, limit=None, lease_seconds=None):
+    """
+    Atomically claim up to limit pending rows of a job and return (row_id, content).
+
+    See db_helpers.claim_batch.
+    """
+    limit = batch_size if limit is None else limit
+    lease = default_lease_seconds if lease_seconds is None else lease_seconds
+    job = (model_id, prompt_id, dataset_id)
+    async with connection() as conn:
+        statement = CLAIM_UNITS if await _unit_size(conn, job) else CLAIM
+        return await (await _execute(conn, statement, (*job, limit, lease))).fetchall()
+
+
+async def write_predictions(batch):
+    """
+    Insert a batch of predictions and mark their status done in one statement; returns how many were written.
+
+    See db_helpers.write_predictions.
+    """
+    if not batch:
+        return 0
+    async with connection() as conn:
+        cursor = await _execute(conn, WRITE_COMPACT if compact_predictions else WRITE, _write_columns(batch))
+        return (await cursor.fetchone())[0]
+
+
+async def write_and_claim(batch, model_id, prompt_id, dataset_id, limit=None, lease_seconds=None):
+    """
+    Write a batch of predictions, then claim the job's next rows unless it stopped; returns (status, rows).
+
+    The write, the status check and the claim are sent in one pipeline, so
+    they take one round trip. If the status check finds the job stopped (or
+    gone), the rows claimed alongside it are released again and rows is [].
+    The write and the claim commit independently, as their db_helpers
+    counterparts do.
+    """
+    limit = batch_size if limit is None else limit
+    lease = default_lease_seconds if lease_seconds is None else lease_seconds
+    job = (model_id, prompt_id, dataset_id)
+    async with connection() as conn:
+        # Read before the pipeline starts: the claim statement depends on it
+        statement = CLAIM_UNITS if await _unit_size(conn, job) else CLAIM
+        async with conn.pipeline():
+            if batch:
+                await _execute(conn, WRITE_COMPACT if compact_predictions else WRITE, _write_columns(batch))
+            status_cursor = await _execute(conn, JOB_STATUS, job)
+            claim_cursor = await _execute(conn, statement, (*job, limit, lease))
+        # Leaving the pipeline sends it and collects every result at once
+        result = await status_cursor.fetchone()
+        rows = await claim_cursor.fetchall()
+        status = result[0] if result else None
+        if rows and status in ('stop', None):
+            await _execute(conn, REVERT_UNITS if statement is CLAIM_UNITS else REVERT, ([r[0] for r in rows], *job))
+            rows = []
+    return status, rows
+
+
+async def revert_batch_status(rows, model_id, prompt_id, dataset_id):
+    """
+    Reset batch status back to pending on error.
+
+    See db_helpers.revert_batch_status.
+    """
+    job = (model_id, prompt_id, dataset_id)
+    async with connection() as conn:
+        statement = REVERT_UNITS if await _unit_size(conn, job) else REVERT
+        await _execute(conn, statement, ([r[0] for r in rows], *job))
+
+
+async def decrement_count(model_id, prompt_id, dataset_id):
+    """
+    Decrement the count on ModelPromptStatus.
+    """
+    async with connection() as conn:
+        await _execute(conn, DECREMENT, (model_id, prompt_id, dataset_id))
+
+
+async def get_job_status(model_id, prompt_id, dataset_id):
+    """
+    Return the current ModelPromptStatus status, or None if the job is gone.
+    """
+    async with connection() as conn:
+        result = await (await _execute(conn, JOB_STATUS, (model_id, prompt_id, dataset_id))).fetchone()
+    return result[0] if result else None
+
+
+async def get_job_progress(model_id, prompt_id, dataset_id):
+    """
+    Return the job's (total, done, failed) counters, or None if it has none.
+    """
+    async with connection() as conn:
+        result = await (await _execute(conn, JOB_PROGRESS, (model_id, prompt_id, dataset_id))).fetchone()
+    return tuple(result) if result else None
+
+
+async def reclaim_expired_leases(max_rows=None):
+    """
+    Return in_progress rows and work units whose lease expired to pending; returns the count.
+    """
+    max_rows = lease_reclaim_limit if max_rows is None else max_rows
+    async with connection() as conn:
+        return (await (await _execute(conn, RECLAIM, (max_rows,))).fetchone())[0]
+
+
+async def seed_job_chunk(model_id, prompt_id, dataset_id, chunk_size=None):
+    """
+    Seed the job's next chunk of pending PredictionStatus rows or WorkUnits; returns how many rows.
+
+    See db_helpers.seed_job_chunk.
+    """
+    chunk_size = seed_chunk_size if chunk_size is None else chunk_size
+    async with connection() as conn:
+        return (await (await _execute(conn, SEED, (model_id, prompt_id, dataset_id, chunk_size))).fetchone())[0]
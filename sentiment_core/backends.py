@@ -0,0 +1,617 @@
+"""
+Storage backends for the sentiment_core work queue.
+
+PostgresBackend is the shared multi-worker setup: db_helpers plus the
+triggers and functions from db_setup. SQLiteBackend keeps the same queue in
+one SQLite file in WAL mode for runs on a single machine with no database
+server; what the PostgreSQL triggers do (seeding, progress counters,
+stopping finished jobs) happens in Python inside the same transactions.
+
+STORAGE_BACKEND selects the backend the worker uses; the module-level
+functions below dispatch to it.
+"""
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from contextlib import contextmanager
+
+from . import db_helpers
+from .config import (
+    batch_size,
+    lease_reclaim_limit,
+    lease_seconds as default_lease_seconds,
+    seed_chunk_size,
+    sqlite_path,
+    storage_backend,
+)
+from .pool import connection
+
+# Rows seeded when a job is registered, as in add_prediction_status_for_model_prompt_dataset
+REGISTRATION_CHUNK = 1000
+# Jobs stop once they processed this many rows, as in update_modelpromptstatus
+PREDICTION_CAP = 5000
+
+
+class StorageBackend(ABC):
+    """
+    The work-queue operations the worker needs from its storage.
+
+    Rows are (row_id, content) pairs; a batch item is (row_id, model_id,
+    prompt_id, dataset_id, prediction, prediction_time, formatted_prompt).
+    A backend missing any of the operations cannot be instantiated.
+    """
+
+    @abstractmethod
+    def register_job(self, model_id, prompt_id, dataset_id, status='available'):
+        """Register a job and seed its first chunk of pending rows."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_least_used_model_prompt_dataset(self, library, exclude_prompt_ids=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim_batch(self, model_id, prompt_id, dataset_id, limit=None, lease_seconds=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def write_predictions(self, batch):
+        raise NotImplementedError
+
+    @abstractmethod
+    def revert_batch_status(self, rows, model_id, prompt_id, dataset_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def decrement_count(self, model_id, prompt_id, dataset_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_job_status(self, model_id, prompt_id, dataset_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_job_progress(self, model_id, prompt_id, dataset_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def reclaim_expired_leases(self, max_rows=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def seed_job_chunk(self, model_id, prompt_id, dataset_id, chunk_size=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_cached_predictions(self, keys):
+        """Return {cache_key: (prediction, prediction_time)} for the cached keys."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def cache_predictions(self, entries):
+        """Store (cache_key, model_name, prediction, prediction_time) entries, keeping existing keys."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class PostgresBackend(StorageBackend):
+    """
+    The PostgreSQL work queue in db_helpers and db_setup.
+    """
+
+    def register_job(self, model_id, prompt_id, dataset_id, status='available'):
+        # The after_insert_model_prompt_status trigger does the rest
+        with connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(
+                    "INSERT INTO ModelPromptStatus (model_id, prompt_id, dataset_id, status) VALUES (%s, %s, %s, %s)",
+                    (model_id, prompt_id, dataset_id, status),
+                )
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def get_least_used_model_prompt_dataset(self, library, exclude_prompt_ids=None):
+        return db_helpers.get_least_used_model_prompt_dataset(library, exclude_prompt_ids)
+
+    def claim_batch(self, model_id, prompt_id, dataset_id, limit=None, lease_seconds=None):
+        return db_helpers.claim_batch(model_id, prompt_id, dataset_id, limit=limit, lease_seconds=lease_seconds)
+
+    def write_predictions(self, batch):
+        return db_helpers.write_predictions(batch)
+
+    def revert_batch_status(self, rows, model_id, prompt_id, dataset_id):
+        return db_helpers.revert_batch_status(rows, model_id, prompt_id, dataset_id)
+
+    def decrement_count(self, model_id, prompt_id, dataset_id):
+        return db_helpers.decrement_count(model_id, prompt_id, dataset_id)
+
+    def get_job_status(self, model_id, prompt_id, dataset_id):
+        return db_helpers.get_job_status(model_id, prompt_id, dataset_id)
+
+    def get_job_progress(self, model_id, prompt_id, dataset_id):
+        return db_helpers.get_job_progress(model_id, prompt_id, dataset_id)
+
+    def reclaim_expired_leases(self, max_rows=None):
+        return db_helpers.reclaim_expired_leases(max_rows)
+
+    def seed_job_chunk(self, model_id, prompt_id, dataset_id, chunk_size=None):
+        return db_helpers.seed_job_chunk(model_id, prompt_id, dataset_id, chunk_size=chunk_size)
+
+    def get_cached_predictions(self, keys):
+        return db_helpers.get_cached_predictions(keys)
+
+    def cache_predictions(self, entries):
+        return db_helpers.cache_predictions(entries)
+
+
+SQLITE_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS datasets (
+        dataset_id  INTEGER PRIMARY KEY,
+        name        TEXT NOT NULL,
+        description TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS models (
+        model_id    INTEGER PRIMARY KEY,
+        name        TEXT NOT NULL,
+        source      TEXT NOT NULL DEFAULT '',
+        description TEXT,
+        library     TEXT NOT NULL DEFAULT 'unknown'
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS prompts (
+        prompt_id INTEGER PRIMARY KEY,
+        model_id  INTEGER,
+        text      TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS rows (
+        row_id              INTEGER PRIMARY KEY,
+        dataset_id          INTEGER NOT NULL,
+        content             TEXT,
+        expected_prediction TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS rows_dataset_idx ON rows (dataset_id, row_id)",
+    """
+    CREATE TABLE IF NOT EXISTS modelpromptstatus (
+        model_id   INTEGER NOT NULL,
+        prompt_id  INTEGER NOT NULL,
+        dataset_id INTEGER NOT NULL,
+        status     TEXT NOT NULL DEFAULT 'pending',
+        count      INTEGER DEFAULT 0,
+        PRIMARY KEY (model_id, prompt_id, dataset_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS jobprogress (
+        model_id     INTEGER NOT NULL,
+        prompt_id    INTEGER NOT NULL,
+        dataset_id   INTEGER NOT NULL,
+        total        INTEGER NOT NULL DEFAULT 0,
+        done         INTEGER NOT NULL DEFAULT 0,
+        failed       INTEGER NOT NULL DEFAULT 0,
+        seed_cursor  INTEGER,
+        seeding_done INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (model_id, prompt_id, dataset_id)
+    )
+    """,
+    # Leases are Unix timestamps
+    """
+    CREATE TABLE IF NOT EXISTS predictionstatus (
+        row_id     INTEGER NOT NULL,
+        model_id   INTEGER NOT NULL,
+        prompt_id  INTEGER NOT NULL,
+        dataset_id INTEGER NOT NULL,
+        status     TEXT NOT NULL,
+        lease_expires_at REAL,
+        PRIMARY KEY (model_id, prompt_id, dataset_id, row_id)
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS predictionstatus_pending_idx
+        ON predictionstatus (model_id, prompt_id, dataset_id, row_id) WHERE status = 'pending'
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS predictionstatus_lease_idx
+        ON predictionstatus (lease_expires_at) WHERE status = 'in_progress'
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS predictions (
+        prediction_id    INTEGER PRIMARY KEY,
+        row_id           INTEGER,
+        model_id         INTEGER,
+        prompt_id        INTEGER,
+        dataset_id       INTEGER NOT NULL,
+        prediction       TEXT NOT NULL,
+        prediction_time  REAL NOT NULL,
+        status           TEXT NOT NULL,
+        formatted_prompt TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS predictions_job_idx ON predictions (model_id, prompt_id, dataset_id, row_id)",
+    """
+    CREATE TABLE IF NOT EXISTS status_update_log (
+        id         INTEGER PRIMARY KEY,
+        model_id   INTEGER,
+        prompt_id  INTEGER,
+        dataset_id INTEGER,
+        status     TEXT,
+        updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS inference_cache (
+        cache_key       TEXT PRIMARY KEY,
+        model_name      TEXT NOT NULL,
+        prediction      TEXT NOT NULL,
+        prediction_time REAL NOT NULL,
+        created_at      TEXT DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+]
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    The work queue in one SQLite file, for one machine.
+
+    WAL mode lets readers run next to the single writer; every claim and
+    write takes the write lock up front (BEGIN IMMEDIATE), which is what
+    SKIP LOCKED and the row locks do on PostgreSQL. Each thread gets its
+    own connection, so the worker's writer thread works as it does with
+    the connection pool. Jobs are tracked per row; work units, partitions,
+    compact storage and the job summary need the PostgreSQL backend.
+    """
+
+    def __init__(self, path=None, timeout=30.0):
+        self.path = sqlite_path if path is None else path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        conn = self.connect()
+        for stmt in SQLITE_DDL:
+            conn.execute(stmt)
+
+    def connect(self):
+        """Return this thread's connection, opening it on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            # Durable at checkpoints; a crash loses at most the last commits, which leases recover
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """A write transaction that holds the database's write lock from the start."""
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
+
+    def register_job(self, model_id, prompt_id, dataset_id, status='available'):
+        job = (model_id, prompt_id, dataset_id)
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status) VALUES (?, ?, ?, ?)",
+                (*job, status),
+            )
+            # Counters start from whatever the job already predicted
+            conn.execute(
+                """
+                INSERT INTO jobprogress (model_id, prompt_id, dataset_id, done, failed)
+                SELECT ?, ?, ?,
+                       COUNT(*) FILTER (WHERE prediction <> 'unknown'),
+                       COUNT(*) FILTER (WHERE prediction = 'unknown')
+                FROM predictions
+                WHERE model_id = ? AND prompt_id = ? AND dataset_id = ?
+                ON CONFLICT (model_id, prompt_id, dataset_id) DO UPDATE
+                   SET total = 0, done = excluded.done, failed = excluded.failed,
+                       seed_cursor = NULL, seeding_done = 0
+                """,
+                (*job, *job),
+            )
+            self._seed(conn, job, REGISTRATION_CHUNK)
+
+    def _seed(self, conn, job, chunk_size):
+        progress = conn.execute(
+            "SELECT seed_cursor, seeding_done FROM jobprogress WHERE model_id = ? AND prompt_id = ? AND dataset_id = ?",
+            job,
+        ).fetchone()
+        if progress is None or progress[1]:
+            return 0
+        row_ids = [row_id for row_id, in conn.execute(
+            "SELECT row_id FROM rows WHERE dataset_id = ? AND row_id > ? ORDER BY row_id LIMIT ?",
+            (job[2], -1 if progress[0] is None else progress[0], chunk_size),
+        )]
+        conn.executemany(
+            "INSERT OR IGNORE INTO predictionstatus (row_id, model_id, prompt_id, dataset_id, status)"
+            " VALUES (?, ?, ?, ?, 'pending')",
+            [(row_id, *job) for row_id in row_ids],
+        )
+        total, processed, seeding_done = conn.execute(
+            """
+            UPDATE jobprogress
+            SET seed_cursor = COALESCE(?, seed_cursor), total = total + ?, seeding_done = ?
+            WHERE model_id = ? AND prompt_id = ? AND dataset_id = ?
+            RETURNING total, done + failed, seeding_done
+            """,
+            (row_ids[-1] if row_ids else None, len(row_ids), len(row_ids) < chunk_size, *job),
+        ).fetchone()
+        # Workers may have finished every seeded row before the last chunk
+        if seeding_done and total > 0 and processed >= total:
+            self._stop(conn, job)
+        return len(row_ids)
+
+    def _stop(self, conn, job):
+        cursor = conn.execute(
+            "UPDATE modelpromptstatus SET status = 'stop'"
+            " WHERE model_id = ? AND prompt_id = ? AND dataset_id = ? AND status <> 'stop'",
+            job,
+        )
+        if cursor.rowcount:
+            conn.execute(
+                "INSERT INTO status_update_log (model_id, prompt_id, dataset_id, status) VALUES (?, ?, ?, 'in_use')",
+                job,
+            )
+
+    def get_least_used_model_prompt_dataset(self, library, exclude_prompt_ids=None):
+        order_clause = 'ORDER BY random()' if library == 'openai' else 'ORDER BY mps.count ASC'
+        with self._transaction() as conn:
+            result = conn.execute(
+                f"""
+                SELECT mps.model_id, mps.prompt_id, mps.dataset_id, m.name, p.text, d.name, mps.count
+                FROM modelpromptstatus mps
+                JOIN models m ON m.model_id = mps.model_id
+                LEFT JOIN prompts p ON p.prompt_id = mps.prompt_id
+                LEFT JOIN datasets d ON d.dataset_id = mps.dataset_id
+                WHERE m.library = ? AND mps.status IN ('available', 'in_use')
+                  AND mps.prompt_id NOT IN (SELECT value FROM json_each(?))
+                {order_clause}
+                LIMIT 1
+                """,
+                (library, json.dumps(list(exclude_prompt_ids or []))),
+            ).fetchone()
+            if result is None:
+                return None
+            conn.execute(
+                "UPDATE modelpromptstatus SET count = count + 1, status = 'in_use'"
+                " WHERE model_id = ? AND prompt_id = ? AND dataset_id = ?",
+                result[:3],
+            )
+        return result
+
+    def claim_batch(self, model_id, prompt_id, dataset_id, limit=None, lease_seconds=None):
+        limit = batch_size if limit is None else limit
+        lease = default_lease_seconds if lease_seconds is None else lease_seconds
+        job = (model_id, prompt_id, dataset_id)
+        with self._transaction() as conn:
+            row_ids = [row_id for row_id, in conn.execute(
+                """
+                UPDATE predictionstatus
+                SET status = 'in_progress', lease_expires_at = ?
+                WHERE model_id = ? AND prompt_id = ? AND dataset_id = ? AND row_id IN (
+                    SELECT row_id FROM predictionstatus
+                    WHERE model_id = ? AND prompt_id = ? AND dataset_id = ? AND status = 'pending'
+                    ORDER BY row_id
+                    LIMIT ?
+                )
+                RETURNING row_id
+                """,
+                (time.time() + lease, *job, *job, limit),
+            )]
+            if not row_ids:
+                return []
+            return conn.execute(
+                "SELECT row_id, content FROM rows WHERE row_id IN (SELECT value FROM json_each(?)) ORDER BY row_id",
+                (json.dumps(row_ids),),
+            ).fetchall()
+
+    def write_predictions(self, batch):
+        if not batch:
+            return 0
+        records = [
+            (
+                row_id, model_id, prompt_id, dataset_id,
+                prediction.strip().lower(), prediction_time, formatted_prompt.strip().lower(),
+            )
+            for row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, formatted_prompt in batch
+        ]
+        with self._transaction() as conn:
+            # Only rows still claimed are written, as in db_helpers.WRITE: a
+            # reclaimed lease may have handed the row to another worker
+            records = [
+                record for record in records
+                if conn.execute(
+                    "UPDATE predictionstatus SET status = 'done'"
+                    " WHERE row_id = ? AND model_id = ? AND prompt_id = ? AND dataset_id = ? AND status = 'in_progress'",
+                    record[:4],
+                ).rowcount
+            ]
+            conn.executemany(
+                "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time,"
+                " status, formatted_prompt) VALUES (?, ?, ?, ?, ?, ?, 'done', ?)",
+                records,
+            )
+            done, failed = Counter(), Counter()
+            for record in records:
+                (failed if record[4] == 'unknown' else done)[record[1:4]] += 1
+            # What update_modelpromptstatus does once per INSERT statement
+            for job in sorted(done.keys() | failed.keys()):
+                total, processed, seeding_done = conn.execute(
+                    """
+                    INSERT INTO jobprogress (model_id, prompt_id, dataset_id, done, failed)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (model_id, prompt_id, dataset_id) DO UPDATE
+                       SET done = done + excluded.done, failed = failed + excluded.failed
+                    RETURNING total, done + failed, seeding_done
+                    """,
+                    (*job, done[job], failed[job]),
+                ).fetchone()
+                if (seeding_done and total > 0 and processed >= total) or processed > PREDICTION_CAP:
+                    self._stop(conn, job)
+        return len(records)
+
+    def revert_batch_status(self, rows, model_id, prompt_id, dataset_id):
+        if not rows:
+            return
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE predictionstatus SET status = 'pending'"
+                " WHERE model_id = ? AND prompt_id = ? AND dataset_id = ?"
+                " AND row_id IN (SELECT value FROM json_each(?))",
+                (model_id, prompt_id, dataset_id, json.dumps([row[0] for row in rows])),
+            )
+
+    def decrement_count(self, model_id, prompt_id, dataset_id):
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE modelpromptstatus SET count = count - 1 WHERE model_id = ? AND prompt_id = ? AND dataset_id = ?",
+                (model_id, prompt_id, dataset_id),
+            )
+
+    def get_job_status(self, model_id, prompt_id, dataset_id):
+        result = self.connect().execute(
+            "SELECT status FROM modelpromptstatus WHERE model_id = ? AND prompt_id = ? AND dataset_id = ?",
+            (model_id, prompt_id, dataset_id),
+        ).fetchone()
+        return result[0] if result else None
+
+    def get_job_progress(self, model_id, prompt_id, dataset_id):
+        result = self.connect().execute(
+            "SELECT total, done, failed FROM jobprogress WHERE model_id = ? AND prompt_id = ? AND dataset_id = ?",
+            (model_id, prompt_id, dataset_id),
+        ).fetchone()
+        return tuple(result) if result else None
+
+    def reclaim_expired_leases(self, max_rows=None):
+        max_rows = lease_reclaim_limit if max_rows is None else max_rows
+        with self._transaction() as conn:
+            return conn.execute(
+                """
+                UPDATE predictionstatus
+                SET status = 'pending', lease_expires_at = NULL
+                WHERE rowid IN (
+                    SELECT rowid FROM predictionstatus
+                    WHERE status = 'in_progress' AND lease_expires_at < ?
+                    LIMIT ?
+                )
+                """,
+                (time.time(), max_rows),
+            ).rowcount
+
+    def seed_job_chunk(self, model_id, prompt_id, dataset_id, chunk_size=None):
+        chunk_size = seed_chunk_size if chunk_size is None else chunk_size
+        with self._transaction() as conn:
+            return self._seed(conn, (model_id, prompt_id, dataset_id), chunk_size)
+
+    def get_cached_predictions(self, keys):
+        if not keys:
+            return {}
+        return {
+            key: (prediction, prediction_time)
+            for key, prediction, prediction_time in self.connect().execute(
+                "SELECT cache_key, prediction, prediction_time FROM inference_cache"
+                " WHERE cache_key IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(keys)),),
+            )
+        }
+
+    def cache_predictions(self, entries):
+        if not entries:
+            return
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO inference_cache (cache_key, model_name, prediction, prediction_time)"
+                " VALUES (?, ?, ?, ?)",
+                entries,
+            )
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend selected by STORAGE_BACKEND."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = SQLiteBackend() if storage_backend == 'sqlite' else PostgresBackend()
+        return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend, e.g. with a SQLiteBackend on another file; returns the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
+
+
+def get_least_used_model_prompt_dataset(library, exclude_prompt_ids=None):
+    return get_backend().get_least_used_model_prompt_dataset(library, exclude_prompt_ids)
+
+
+def claim_batch(model_id, prompt_id, dataset_id, limit=None, lease_seconds=None):
+    return get_backend().claim_batch(model_id, prompt_id, dataset_id, limit=limit, lease_seconds=lease_seconds)
+
+
+def write_predictions(batch):
+    return get_backend().write_predictions(batch)
+
+
+def revert_batch_status(rows, model_id, prompt_id, dataset_id):
+    return get_backend().revert_batch_status(rows, model_id, prompt_id, dataset_id)
+
+
+def decrement_count(model_id, prompt_id, dataset_id):
+    return get_backend().decrement_count(model_id, prompt_id, dataset_id)
+
+
+def get_job_status(model_id, prompt_id, dataset_id):
+    return get_backend().get_job_status(model_id, prompt_id, dataset_id)
+
+
+def reclaim_expired_leases(max_rows=None):
+    return get_backend().reclaim_expired_leases(max_rows)
+
+
+def seed_job_chunk(model_id, prompt_id, dataset_id, chunk_size=None):
+    return get_backend().seed_job_chunk(model_id, prompt_id, dataset_id, chunk_size=chunk_size)
+
+
+def get_cached_predictions(keys):
+    return get_backend().get_cached_predictions(keys)
+
+
+def cache_predictions(entries):
+    return get_backend().cache_predictions(entries)
@@ -0,0 +1,68 @@
+"""
+Adaptive batch sizing for the worker loop.
+"""
+import logging
+import math
+
+
+class BatchSizeController:
+    """
+    Choose how many rows to claim per batch from observed latencies.
+
+    Batches grow until the claim round trip is a small share of inference
+    time, and shrink so a batch finishes well within its lease. The size
+    moves at most a factor of two per batch and stays within bounds.
+    """
+
+    def __init__(self, initial, min_size=1, max_size=100, lease_seconds=300.0,
+                 db_overhead_target=0.1, lease_fraction=0.5, smoothing=0.3):
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.size = self._clamp(initial)
+        self.lease_seconds = lease_seconds
+        self.db_overhead_target = db_overhead_target
+        self.lease_fraction = lease_fraction
+        self.smoothing = smoothing
+        self.row_seconds = None  # smoothed inference time per row
+        self.db_seconds = None   # smoothed claim round trip
+        self.adjustments = 0
+
+    def _clamp(self, size):
+        return max(self.min_size, min(self.max_size, int(size)))
+
+    def _smooth(self, current, sample):
+        if current is None:
+            return sample
+        return current + self.smoothing * (sample - current)
+
+    def observe(self, rows, infer_seconds, db_seconds):
+        """Record one finished batch and return the size for the next claim."""
+        if rows <= 0:
+            return self.size
+        self.row_seconds = self._smooth(self.row_seconds, infer_seconds / rows)
+        self.db_seconds = self._smooth(self.db_seconds, db_seconds)
+        per_row = max(self.row_seconds, 1e-6)
+        # Large enough that the claim round trip is amortised...
+        wanted = math.ceil(self.db_seconds / (self.db_overhead_target * per_row))
+        # ...but small enough to finish comfortably inside the lease
+        lease_cap = math.floor(self.lease_fraction * self.lease_seconds / per_row)
+        wanted = min(wanted, lease_cap)
+        wanted = max(self.size // 2, min(self.size * 2, wanted))
+        new_size = self._clamp(wanted)
+        if new_size != self.size:
+            logging.info(
+                f"Batch size {self.size} -> {new_size} "
+                f"(row {per_row:.4f}s, claim {self.db_seconds:.4f}s, lease {self.lease_seconds:.0f}s)"
+            )
+            self.size = new_size
+            self.adjustments += 1
+        return self.size
+
+    def stats(self):
+        """Return the current size and the latencies it is based on."""
+        return {
+            'batch_size': self.size,
+            'row_seconds': self.row_seconds,
+            'db_seconds': self.db_seconds,
+            'adjustments': self.adjustments,
+        }
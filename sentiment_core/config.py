@@ -10,17 +10,120 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s',
 )
 
+
+def _env_int(name: str, default: int) -> int:
+    """Read an integer from the environment, falling back to default."""
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    """Read a float from the environment, falling back to default."""
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# Work queue storage: 'postgres', or 'sqlite' for runs on a single machine
+storage_backend = os.getenv('STORAGE_BACKEND', 'postgres')
+# Database file of the SQLite backend
+sqlite_path = os.getenv('SQLITE_PATH', 'sentiment.sqlite3')
+
+# The SQLite backend runs without a database server
+_db_env = os.getenv if storage_backend == 'sqlite' else os.environ.__getitem__
+
 # Database connection parameters (must be provided via environment variables)
 db_params = {
-    'dbname': os.environ['DB_NAME'],
-    'user': os.environ['DB_USER'],
-    'password': os.environ['DB_PASSWORD'],
-    'host': os.environ['DB_HOST'],
+    'dbname': _db_env('DB_NAME'),
+    'user': _db_env('DB_USER'),
+    'password': _db_env('DB_PASSWORD'),
+    'host': _db_env('DB_HOST'),
     'port': os.environ.get('DB_PORT', '5432'),
 }
 
 # Batch size for processing (optional, defaults to 5)
-try:
-    batch_size = int(os.getenv('BATCH_SIZE', '5'))
-except ValueError:
-    batch_size = 5
\ No newline at end of file
+batch_size = _env_int('BATCH_SIZE', 5)
+# Bounds for adaptive batch sizing; set ADAPTIVE_BATCH_SIZE=0 to keep batch_size fixed
+adaptive_batch_size = os.getenv('ADAPTIVE_BATCH_SIZE', '1') != '0'
+batch_size_min = max(_env_int('BATCH_SIZE_MIN', 1), 1)
+batch_size_max = max(_env_int('BATCH_SIZE_MAX', 100), batch_size_min)
+# Batches claimed ahead while the current one is inferred (0 disables prefetching)
+prefetch_batches = max(_env_int('PREFETCH_BATCHES', 0), 0)
+
+# Sequence-label pairs per forward pass of the BERT zero-shot pipeline; each
+# claimed batch is classified with one pipeline call
+bert_batch_size = max(_env_int('BERT_BATCH_SIZE', 16), 1)
+# Sort each claimed batch by token length before inference, so forward
+# passes pad short reviews to similar ones instead of the batch's longest
+bert_length_buckets = os.getenv('BERT_LENGTH_BUCKETS', '1') != '0'
+
+# Zero-shot inference backend of the BERT runners: 'torch' (the transformers
+# pipeline), 'int8' (PyTorch with int8 Linear layers), 'onnx' or 'onnx-int8'
+# (ONNX Runtime on an exported, optionally int8, model)
+bert_backend = os.getenv('BERT_BACKEND', 'torch')
+# Threads within one operator and across independent operators; 0 keeps the library default
+bert_intra_op_threads = max(_env_int('BERT_INTRA_OP_THREADS', 0), 0)
+bert_inter_op_threads = max(_env_int('BERT_INTER_OP_THREADS', 0), 0)
+# Share of sample reviews a non-torch backend must label like the PyTorch
+# pipeline before it is used; 0 skips the check
+bert_min_agreement = _env_float('BERT_MIN_AGREEMENT', 1.0)
+# Directory the ONNX exports are written to and reused from
+onnx_cache_dir = os.getenv('ONNX_CACHE_DIR', '.onnx_cache')
+
+# Memory budget in MB for models a runner keeps loaded between jobs
+model_cache_mb = max(_env_int('MODEL_CACHE_MB', 4096), 0)
+
+# Reuse predictions for inputs a model already classified with the same labels,
+# from the inference_cache table, instead of running the model again. Off by
+# default: databases created before the table need db_setup.upgrade_schema()
+inference_cache = os.getenv('INFERENCE_CACHE', '0') != '0'
+
+# Seconds the model/prompt/dataset names used for job acquisition are cached
+catalog_ttl = _env_float('CATALOG_TTL', 60.0)
+
+# Listen for job status NOTIFY messages instead of polling after every batch
+job_notifications = os.getenv('JOB_NOTIFICATIONS', '1') != '0'
+
+# Send the hot worker queries as server-side prepared statements; disable
+# behind a transaction-pooling proxy that does not keep session state
+prepared_statements = os.getenv('PREPARED_STATEMENTS', '1') != '0'
+# Write predictions in compact storage (enum labels, prompts stored once);
+# set once db_setup.compact_predictions() converted the database
+compact_predictions = os.getenv('COMPACT_PREDICTIONS', '0') != '0'
+
+# Connection pool settings (optional)
+pool_min_size = _env_int('DB_POOL_MIN_SIZE', 1)
+pool_max_size = max(_env_int('DB_POOL_MAX_SIZE', 5), pool_min_size, 1)
+# Seconds to wait for a free connection before giving up
+pool_timeout = _env_float('DB_POOL_TIMEOUT', 30.0)
+# Idle connections older than this many seconds are pinged before reuse
+pool_health_check_interval = _env_float('DB_POOL_HEALTH_CHECK_INTERVAL', 30.0)
+# Attempts made to (re)open a connection before the error is raised
+pool_connect_retries = max(_env_int('DB_POOL_CONNECT_RETRIES', 3), 1)
+
+# Write-behind queue for predictions (optional)
+writer_queue_size = max(_env_int('WRITER_QUEUE_SIZE', 100), 1)
+# Flush once this many predictions are pending...
+writer_flush_size = max(_env_int('WRITER_FLUSH_SIZE', 20), 1)
+# ...or once the oldest pending prediction is this many seconds old
+writer_flush_interval = _env_float('WRITER_FLUSH_INTERVAL', 1.0)
+
+# Lease on claimed rows in seconds; rows of crashed workers return to pending
+# once it expires. Override per library with LEASE_SECONDS_<LIBRARY>.
+lease_seconds = _env_float('LEASE_SECONDS', 300.0)
+# Rows added to predictionstatus per seeding transaction of a large job
+seed_chunk_size = max(_env_int('SEED_CHUNK_SIZE', 10000), 1)
+
+# Status rows of a finished job removed per archiving transaction
+archive_chunk_size = max(_env_int('ARCHIVE_CHUNK_SIZE', 10000), 1)
+
+# Maximum number of expired rows returned to pending per sweep
+lease_reclaim_limit = max(_env_int('LEASE_RECLAIM_LIMIT', 1000), 1)
+
+
+def lease_seconds_for(library: str) -> float:
+    """Return the claim lease length for a runner library."""
+    return _env_float(f'LEASE_SECONDS_{library.upper()}', lease_seconds)
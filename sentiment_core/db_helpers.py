@@ -1,171 +1,729 @@
 """
 Database helper functions for sentiment_core.
 """
-import psycopg2
-from .config import db_params, batch_size
+import threading
+import time
 
-def get_least_used_model_prompt_dataset(library: str, exclude_prompt_ids=None):
+from . import prepared
+from .config import (
+    archive_chunk_size,
+    batch_size,
+    catalog_ttl,
+    compact_predictions,
+    lease_reclaim_limit,
+    lease_seconds as default_lease_seconds,
+    seed_chunk_size,
+)
+from .pool import connection
+from .prepared import PreparedStatement
+
+_ACQUIRE_SQL = """
+    WITH candidate AS (
+        SELECT model_id, prompt_id, dataset_id
+        FROM ModelPromptStatus
+        WHERE (status = 'available' OR status = 'in_use')
+          AND model_id = ANY($1)
+          AND NOT (prompt_id = ANY($2))
+        {order_clause}
+        LIMIT 1
+        {lock_clause}
+    )
+    UPDATE ModelPromptStatus mps
+    SET count = mps.count + 1, status = 'in_use'
+    FROM candidate c
+    WHERE mps.model_id = c.model_id AND mps.prompt_id = c.prompt_id AND mps.dataset_id = c.dataset_id
+    RETURNING mps.model_id, mps.prompt_id, mps.dataset_id, mps.count - 1
+"""
+
+# (order_clause, lock_clause) -> acquisition statement
+ACQUIRE = {
+    (order_clause, lock_clause): PreparedStatement(
+        f"sc_acquire_{order_name}_{lock_name}",
+        _ACQUIRE_SQL.format(order_clause=order_clause, lock_clause=lock_clause),
+        ['int[]', 'int[]'],
+    )
+    for order_name, order_clause in (('random', 'ORDER BY model_id * RANDOM()'), ('least_used', 'ORDER BY count ASC'))
+    for lock_name, lock_clause in (('skip_locked', 'FOR UPDATE SKIP LOCKED'), ('wait', 'FOR UPDATE'))
+}
+
+CLAIM = PreparedStatement(
+    'sc_claim_batch',
     """
-    Acquire the least used model-prompt-dataset combination for the given library.
+    WITH claimed AS (
+        SELECT row_id
+        FROM PredictionStatus
+        WHERE model_id = $1 AND prompt_id = $2 AND dataset_id = $3 AND status = 'pending'
+        LIMIT $4
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE PredictionStatus ps
+    SET status = 'in_progress',
+        lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => $5)
+    FROM claimed, Rows r
+    WHERE ps.row_id = claimed.row_id
+      AND ps.model_id = $1 AND ps.prompt_id = $2 AND ps.dataset_id = $3
+      AND r.row_id = ps.row_id
+    RETURNING ps.row_id, r.content
+    """,
+    ['int', 'int', 'int', 'int', 'float8'],
+)
+
+# Jobs registered with a unit_size are claimed a work unit at a time
+CLAIM_UNITS = PreparedStatement(
+    'sc_claim_work_units',
+    "SELECT row_id, content FROM claim_work_units($1, $2, $3, $4, $5)",
+    ['int', 'int', 'int', 'int', 'float8'],
+)
+
+UNIT_SIZE = PreparedStatement(
+    'sc_unit_size',
     """
-    exclude_prompt_ids = exclude_prompt_ids or []
-    conn = psycopg2.connect(**db_params)
-    cursor = conn.cursor()
-    try:
-        exclude_clause = ''
-        if exclude_prompt_ids:
-            placeholders = ','.join(str(x) for x in exclude_prompt_ids)
-            exclude_clause = f"AND mps.prompt_id NOT IN ({placeholders})"
-        # Choose ordering based on library
-        if library == 'openai':
-            order_clause = 'ORDER BY mps.model_id * RANDOM()'
-        else:
-            order_clause = 'ORDER BY mps.count ASC'
-        sql = f"""
-            SELECT mps.model_id, mps.prompt_id, mps.dataset_id,
-                   m.name, p.text, d.name AS dataset_name,
-                   mps.count, m.library
-            FROM ModelPromptStatus mps
-            JOIN Models m ON mps.model_id = m.model_id
-            JOIN Prompts p ON mps.prompt_id = p.prompt_id
-            JOIN Datasets d ON mps.dataset_id = d.dataset_id
-            WHERE (mps.status = 'available' OR mps.status = 'in_use')
-              AND m.library = %s {exclude_clause}
-            {order_clause}
+    SELECT unit_size
+    FROM JobProgress
+    WHERE model_id = $1 AND prompt_id = $2 AND dataset_id = $3
+    """,
+    ['int', 'int', 'int'],
+)
+
+# Inserts the predictions of the rows still claimed and marks them done in
+# one statement, returning how many were written; the batch arrives as one
+# array per column so any batch size shares one plan
+WRITE = PreparedStatement(
+    'sc_write_predictions',
+    """
+    WITH batch AS (
+        SELECT *
+        FROM unnest($1, $2, $3, $4, $5, $6, $7)
+            AS b (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, formatted_prompt)
+    ), written AS (
+        -- Only rows still claimed are written: a worker whose lease was
+        -- reclaimed, and whose rows were claimed and written again by
+        -- another worker, must not add a second prediction. The row lock of
+        -- the UPDATE serialises writers of the same row
+        UPDATE PredictionStatus ps
+        SET status = 'done'
+        FROM batch b
+        WHERE ps.row_id = b.row_id AND ps.model_id = b.model_id
+          AND ps.prompt_id = b.prompt_id AND ps.dataset_id = b.dataset_id
+          -- Lets the executor skip the partitions of other datasets
+          AND ps.dataset_id = ANY($4)
+          AND ps.status = 'in_progress'
+        RETURNING ps.row_id, ps.model_id, ps.prompt_id, ps.dataset_id
+    ), unit_rows AS (
+        -- Work-unit jobs keep no per-row status: a row is written while its
+        -- unit is claimed and the row has no prediction yet. Two writers can
+        -- both pass this check; predictions_job_row_key and ON CONFLICT below
+        -- keep the second one out
+        SELECT b.row_id, b.model_id, b.prompt_id, b.dataset_id
+        FROM batch b
+        JOIN LATERAL (
+            SELECT wu.last_row_id, wu.status
+            FROM WorkUnits wu
+            WHERE wu.model_id = b.model_id AND wu.prompt_id = b.prompt_id
+              AND wu.dataset_id = b.dataset_id AND wu.first_row_id <= b.row_id
+            ORDER BY wu.first_row_id DESC
+            LIMIT 1
+        ) u ON u.last_row_id >= b.row_id
+        WHERE u.status = 'in_progress'
+          AND NOT EXISTS (
+              SELECT 1 FROM Predictions p
+              WHERE p.model_id = b.model_id AND p.prompt_id = b.prompt_id
+                AND p.dataset_id = b.dataset_id AND p.row_id = b.row_id
+          )
+    ), accepted AS (
+        SELECT b.*
+        FROM batch b
+        JOIN (SELECT * FROM written UNION SELECT * FROM unit_rows) w
+          ON w.row_id = b.row_id AND w.model_id = b.model_id
+         AND w.prompt_id = b.prompt_id AND w.dataset_id = b.dataset_id
+    ), inserted AS (
+        INSERT INTO Predictions (
+            row_id, model_id, prompt_id, dataset_id,
+            prediction, prediction_time, status, formatted_prompt
+        )
+        SELECT row_id, model_id, prompt_id, dataset_id,
+               prediction, prediction_time, 'done', formatted_prompt
+        FROM accepted
+        ON CONFLICT (model_id, prompt_id, dataset_id, row_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM inserted
+    """,
+    ['int[]', 'int[]', 'int[]', 'int[]', 'varchar[]', 'float8[]', 'text[]'],
+)
+
+# WRITE for compact storage: labels are enums and each distinct formatted
+# prompt is kept once in formatted_prompts, keyed by its md5
+WRITE_COMPACT = PreparedStatement(
+    'sc_write_predictions_compact',
+    """
+    WITH batch AS (
+        SELECT *
+        FROM unnest($1, $2, $3, $4, $5, $6, $7)
+            AS b (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, formatted_prompt)
+    ), written AS (
+        -- Only rows still claimed are written, as in WRITE
+        UPDATE PredictionStatus ps
+        SET status = 'done'
+        FROM batch b
+        WHERE ps.row_id = b.row_id AND ps.model_id = b.model_id
+          AND ps.prompt_id = b.prompt_id AND ps.dataset_id = b.dataset_id
+          AND ps.dataset_id = ANY($4)
+          AND ps.status = 'in_progress'
+        RETURNING ps.row_id, ps.model_id, ps.prompt_id, ps.dataset_id
+    ), unit_rows AS (
+        -- Work-unit jobs keep no per-row status: a row is written while its
+        -- unit is claimed and the row has no prediction yet. Two writers can
+        -- both pass this check; predictions_job_row_key and ON CONFLICT below
+        -- keep the second one out
+        SELECT b.row_id, b.model_id, b.prompt_id, b.dataset_id
+        FROM batch b
+        JOIN LATERAL (
+            SELECT wu.last_row_id, wu.status
+            FROM WorkUnits wu
+            WHERE wu.model_id = b.model_id AND wu.prompt_id = b.prompt_id
+              AND wu.dataset_id = b.dataset_id AND wu.first_row_id <= b.row_id
+            ORDER BY wu.first_row_id DESC
             LIMIT 1
-        """
-        cursor.execute(sql, (library,))
-        result = cursor.fetchone()
-        if not result:
-            return None
-        model_id, prompt_id, dataset_id, model_name, prompt_text, dataset_name, count, _ = result
-        # Lock, update count, and mark in use
-        cursor.execute("SELECT pg_advisory_lock(%s)", (model_id,))
-        cursor.execute(
-            """
-            UPDATE ModelPromptStatus
-            SET count = count + 1, status = 'in_use'
-            WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s
-            """,
-            (model_id, prompt_id, dataset_id),
+        ) u ON u.last_row_id >= b.row_id
+        WHERE u.status = 'in_progress'
+          AND NOT EXISTS (
+              SELECT 1 FROM Predictions p
+              WHERE p.model_id = b.model_id AND p.prompt_id = b.prompt_id
+                AND p.dataset_id = b.dataset_id AND p.row_id = b.row_id
+          )
+    ), accepted AS (
+        SELECT b.*
+        FROM batch b
+        JOIN (SELECT * FROM written UNION SELECT * FROM unit_rows) w
+          ON w.row_id = b.row_id AND w.model_id = b.model_id
+         AND w.prompt_id = b.prompt_id AND w.dataset_id = b.dataset_id
+    ), prompts AS (
+        INSERT INTO formatted_prompts (prompt_key, formatted_prompt)
+        SELECT DISTINCT md5(formatted_prompt)::uuid, formatted_prompt
+        FROM accepted
+        ON CONFLICT DO NOTHING
+    ), inserted AS (
+        INSERT INTO Predictions (
+            row_id, model_id, prompt_id, dataset_id,
+            prediction, prediction_time, status, prompt_key
         )
-        cursor.execute("SELECT pg_advisory_unlock(%s)", (model_id,))
-        conn.commit()
-        return model_id, prompt_id, dataset_id, model_name, prompt_text, dataset_name, count
-    finally:
-        cursor.close()
-        conn.close()
+        SELECT row_id, model_id, prompt_id, dataset_id,
+               prediction::prediction_label, prediction_time, 'done', md5(formatted_prompt)::uuid
+        FROM accepted
+        ON CONFLICT (model_id, prompt_id, dataset_id, row_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT COUNT(*) FROM inserted
+    """,
+    ['int[]', 'int[]', 'int[]', 'int[]', 'varchar[]', 'float8[]', 'text[]'],
+)
+
+REVERT = PreparedStatement(
+    'sc_revert_batch_status',
+    """
+    UPDATE PredictionStatus
+    SET status = 'pending'
+    WHERE row_id = ANY($1) AND model_id = $2 AND prompt_id = $3 AND dataset_id = $4
+    """,
+    ['int[]', 'int', 'int', 'int'],
+)
+
+# Returns the work units holding the given rows to pending
+REVERT_UNITS = PreparedStatement(
+    'sc_revert_work_units',
+    """
+    UPDATE WorkUnits wu
+    SET status = 'pending', lease_expires_at = NULL
+    FROM (
+        SELECT DISTINCT u.first_row_id
+        FROM unnest($1) AS r (row_id)
+        JOIN LATERAL (
+            SELECT first_row_id, last_row_id
+            FROM WorkUnits
+            WHERE model_id = $2 AND prompt_id = $3 AND dataset_id = $4 AND first_row_id <= r.row_id
+            ORDER BY first_row_id DESC
+            LIMIT 1
+        ) u ON u.last_row_id >= r.row_id
+    ) released
+    WHERE wu.model_id = $2 AND wu.prompt_id = $3 AND wu.dataset_id = $4
+      AND wu.first_row_id = released.first_row_id AND wu.status = 'in_progress'
+    """,
+    ['int[]', 'int', 'int', 'int'],
+)
+
+DECREMENT = PreparedStatement(
+    'sc_decrement_count',
+    """
+    UPDATE ModelPromptStatus
+    SET count = count - 1
+    WHERE model_id = $1 AND prompt_id = $2 AND dataset_id = $3
+    """,
+    ['int', 'int', 'int'],
+)
+
+JOB_STATUS = PreparedStatement(
+    'sc_job_status',
+    """
+    SELECT status
+    FROM ModelPromptStatus
+    WHERE model_id = $1 AND prompt_id = $2 AND dataset_id = $3
+    """,
+    ['int', 'int', 'int'],
+)
+
+JOB_PROGRESS = PreparedStatement(
+    'sc_job_progress',
+    """
+    SELECT total, done, failed
+    FROM JobProgress
+    WHERE model_id = $1 AND prompt_id = $2 AND dataset_id = $3
+    """,
+    ['int', 'int', 'int'],
+)
+
+SEED = PreparedStatement(
+    'sc_seed_prediction_status', "SELECT seed_prediction_status($1, $2, $3, $4)", ['int', 'int', 'int', 'int'],
+)
+
+ARCHIVE = PreparedStatement(
+    'sc_archive_job_status', "SELECT archive_job_status($1, $2, $3, $4)", ['int', 'int', 'int', 'int'],
+)
+
+RECLAIM = PreparedStatement('sc_reclaim_expired_leases', "SELECT reclaim_expired_leases($1)", ['int'])
+
+# Keys arrive as text arrays (psycopg2 sends strings); the casts make them uuids
+CACHE_LOOKUP = PreparedStatement(
+    'sc_inference_cache_lookup',
+    "SELECT cache_key, prediction, prediction_time FROM inference_cache WHERE cache_key = ANY($1::uuid[])",
+    ['text[]'],
+)
+
+CACHE_STORE = PreparedStatement(
+    'sc_inference_cache_store',
+    """
+    INSERT INTO inference_cache (cache_key, model_name, prediction, prediction_time)
+    SELECT * FROM unnest($1::uuid[], $2::varchar[], $3::varchar[], $4::float8[])
+    ON CONFLICT DO NOTHING
+    """,
+    ['text[]', 'varchar[]', 'varchar[]', 'float8[]'],
+)
+
+_catalog_lock = threading.Lock()
+_catalogs = {}  # library -> (loaded_at, models, prompts, datasets)
+_unit_sizes = {}  # (model_id, prompt_id, dataset_id) -> unit_size, None for per-row jobs
+
+def _load_catalog(library: str, refresh=False):
+    """
+    Return cached {id: name} lookups of the library's models, prompts and datasets.
+
+    These tables only change when an experiment is set up, so they are read
+    once per catalog_ttl seconds instead of being joined on every acquisition.
+    """
+    with _catalog_lock:
+        entry = _catalogs.get(library)
+        if entry and not refresh and time.monotonic() - entry[0] < catalog_ttl:
+            return entry[1:]
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT model_id, name FROM Models WHERE library = %s", (library,))
+            models = dict(cursor.fetchall())
+            cursor.execute("SELECT prompt_id, text FROM Prompts")
+            prompts = dict(cursor.fetchall())
+            cursor.execute("SELECT dataset_id, name FROM Datasets")
+            datasets = dict(cursor.fetchall())
+            conn.commit()
+        finally:
+            cursor.close()
+    with _catalog_lock:
+        _catalogs[library] = (time.monotonic(), models, prompts, datasets)
+    return models, prompts, datasets
+
+def _unit_size(conn, cursor, job):
+    """
+    Return the job's work unit size, or None if it tracks PredictionStatus rows.
+
+    Fixed when the job is registered, so it is read once per job and process.
+    """
+    with _catalog_lock:
+        if job in _unit_sizes:
+            return _unit_sizes[job]
+    prepared.execute(cursor, UNIT_SIZE, job)
+    result = cursor.fetchone()
+    conn.commit()
+    if result is None:
+        # Not registered (yet); look again next time
+        return None
+    with _catalog_lock:
+        _unit_sizes[job] = result[0]
+    return result[0]
+
+def get_least_used_model_prompt_dataset(library: str, exclude_prompt_ids=None):
+    """
+    Acquire the least used model-prompt-dataset combination for the given library.
+
+    The job is chosen and its count incremented in one statement; SKIP LOCKED
+    makes concurrent workers pass over a job another worker is acquiring
+    instead of queueing behind it.
+    """
+    exclude_prompt_ids = list(exclude_prompt_ids or [])
+    models, prompts, datasets = _load_catalog(library)
+    if not models:
+        return None
+    # Choose ordering based on library
+    if library == 'openai':
+        order_clause = 'ORDER BY model_id * RANDOM()'
+    else:
+        order_clause = 'ORDER BY count ASC'
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            # Only if every candidate is momentarily locked by other acquirers,
+            # wait for the least used one instead of reporting no work
+            for lock_clause in ('FOR UPDATE SKIP LOCKED', 'FOR UPDATE'):
+                prepared.execute(
+                    cursor, ACQUIRE[order_clause, lock_clause], (list(models), exclude_prompt_ids),
+                )
+                result = cursor.fetchone()
+                if result:
+                    break
+            conn.commit()
+        finally:
+            cursor.close()
+    if not result:
+        return None
+    model_id, prompt_id, dataset_id, count = result
+    if prompt_id not in prompts or dataset_id not in datasets:
+        # The job references a prompt or dataset added after the catalog was read
+        models, prompts, datasets = _load_catalog(library, refresh=True)
+    return (
+        model_id, prompt_id, dataset_id,
+        models.get(model_id), prompts.get(prompt_id), datasets.get(dataset_id),
+        count,
+    )
+
+def claim_batch(model_id, prompt_id, dataset_id, limit=None, lease_seconds=None):
+    """
+    Atomically claim up to limit pending rows of a job and return (row_id, content).
+
+    The PredictionStatus rows themselves are locked with SKIP LOCKED and
+    flipped to in_progress in the same statement, so concurrent workers
+    never receive the same row. Claimed rows carry a lease that
+    reclaim_expired_leases honours if the worker never finishes them.
+    Jobs registered with a unit_size claim whole WorkUnits the same way,
+    as many as it takes to cover limit rows.
+    """
+    limit = batch_size if limit is None else limit
+    lease = default_lease_seconds if lease_seconds is None else lease_seconds
+    job = (model_id, prompt_id, dataset_id)
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            statement = CLAIM_UNITS if _unit_size(conn, cursor, job) else CLAIM
+            prepared.execute(cursor, statement, (*job, limit, lease))
+            rows = cursor.fetchall()
+            conn.commit()
+            return rows
+        finally:
+            cursor.close()
 
 def fetch_batch(model_id, prompt_id, dataset_id):
     """
     Reserve and return a batch of pending rows.
     """
-    conn = psycopg2.connect(**db_params)
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            """
-            SELECT row_id, content
-            FROM Rows
-            WHERE dataset_id = %s AND row_id IN (
-                SELECT row_id
-                FROM PredictionStatus
-                WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s AND status = 'pending'
-                LIMIT %s
+    return claim_batch(model_id, prompt_id, dataset_id)
+
+def update_prediction(row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, formatted_prompt):
+    """
+    Insert a prediction record and mark status done.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                INSERT INTO Predictions (
+                    row_id, model_id, prompt_id, dataset_id,
+                    prediction, prediction_time, status, formatted_prompt
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (model_id, prompt_id, dataset_id, row_id) DO NOTHING
+                """,
+                (
+                    row_id, model_id, prompt_id, dataset_id,
+                    prediction.strip().lower(), prediction_time,
+                    'done', formatted_prompt.strip().lower(),
+                ),
             )
-            FOR UPDATE SKIP LOCKED
-            """,
-            (dataset_id, model_id, prompt_id, dataset_id, batch_size),
-        )
-        rows = cursor.fetchall()
-        if rows:
-            ids = [r[0] for r in rows]
             cursor.execute(
                 """
                 UPDATE PredictionStatus
-                SET status = 'in_progress'
-                WHERE row_id = ANY(%s) AND model_id = %s AND prompt_id = %s AND dataset_id = %s
+                SET status = 'done'
+                WHERE row_id = %s AND model_id = %s AND prompt_id = %s AND dataset_id = %s
                 """,
-                (ids, model_id, prompt_id, dataset_id),
+                (row_id, model_id, prompt_id, dataset_id),
             )
             conn.commit()
-        return rows
-    finally:
-        cursor.close()
-        conn.close()
+        finally:
+            cursor.close()
 
-def update_prediction(row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, formatted_prompt):
+def write_predictions(batch):
     """
-    Insert a prediction record and mark status done.
+    Insert a batch of predictions and mark their status done in one transaction; returns how many were written.
+
+    Each item is (row_id, model_id, prompt_id, dataset_id, prediction,
+    prediction_time, formatted_prompt), the arguments of update_prediction.
+    With COMPACT_PREDICTIONS set the prediction must be one of
+    db_setup.PREDICTION_LABELS, as parse_sentiment returns. Rows that are
+    no longer claimed (their lease was reclaimed, or another worker already
+    wrote them) are skipped, so a row never gets two predictions.
     """
-    conn = psycopg2.connect(**db_params)
-    cursor = conn.cursor()
-    try:
-        cursor.execute(
-            """
-            INSERT INTO Predictions (
-                row_id, model_id, prompt_id, dataset_id,
-                prediction, prediction_time, status, formatted_prompt
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """,
-            (
-                row_id, model_id, prompt_id, dataset_id,
-                prediction.strip().lower(), prediction_time,
-                'done', formatted_prompt.strip().lower(),
-            ),
-        )
-        cursor.execute(
-            """
-            UPDATE PredictionStatus
-            SET status = 'done'
-            WHERE row_id = %s AND model_id = %s AND prompt_id = %s AND dataset_id = %s
-            """,
-            (row_id, model_id, prompt_id, dataset_id),
+    if not batch:
+        return 0
+    columns = [[] for _ in range(7)]
+    for row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, formatted_prompt in batch:
+        record = (
+            row_id, model_id, prompt_id, dataset_id,
+            prediction.strip().lower(), prediction_time, formatted_prompt.strip().lower(),
         )
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
+        for column, value in zip(columns, record):
+            column.append(value)
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, WRITE_COMPACT if compact_predictions else WRITE, columns)
+            written = cursor.fetchone()[0]
+            conn.commit()
+            return written
+        finally:
+            cursor.close()
 
 def revert_batch_status(rows, model_id, prompt_id, dataset_id):
     """
     Reset batch status back to pending on error.
+
+    For work-unit jobs the units holding the rows are released instead; rows
+    predicted in the meantime are skipped when a unit is claimed again.
     """
-    conn = psycopg2.connect(**db_params)
-    cursor = conn.cursor()
-    try:
-        ids = [r[0] for r in rows]
-        cursor.execute(
-            """
-            UPDATE PredictionStatus
-            SET status = 'pending'
-            WHERE row_id = ANY(%s) AND model_id = %s AND prompt_id = %s AND dataset_id = %s
-            """,
-            (ids, model_id, prompt_id, dataset_id),
-        )
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
+    job = (model_id, prompt_id, dataset_id)
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            ids = [r[0] for r in rows]
+            statement = REVERT_UNITS if _unit_size(conn, cursor, job) else REVERT
+            prepared.execute(cursor, statement, (ids, *job))
+            conn.commit()
+        finally:
+            cursor.close()
 
 def decrement_count(model_id, prompt_id, dataset_id):
     """
-    Decrement the count on ModelPromptStatus and release lock.
-    """
-    conn = psycopg2.connect(**db_params)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("SELECT pg_advisory_lock(%s)", (model_id,))
-        cursor.execute(
-            """
-            UPDATE ModelPromptStatus
-            SET count = count - 1
-            WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s
-            """,
-            (model_id, prompt_id, dataset_id),
-        )
-        cursor.execute("SELECT pg_advisory_unlock(%s)", (model_id,))
-        conn.commit()
-    finally:
-        cursor.close()
-        conn.close()
\ No newline at end of file
+    Decrement the count on ModelPromptStatus.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, DECREMENT, (model_id, prompt_id, dataset_id))
+            conn.commit()
+        finally:
+            cursor.close()
+
+def get_job_status(model_id, prompt_id, dataset_id):
+    """
+    Return the current ModelPromptStatus status, or None if the job is gone.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, JOB_STATUS, (model_id, prompt_id, dataset_id))
+            result = cursor.fetchone()
+            conn.commit()
+            return result[0] if result else None
+        finally:
+            cursor.close()
+
+def get_job_progress(model_id, prompt_id, dataset_id):
+    """
+    Return the job's (total, done, failed) counters, or None if it has none.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, JOB_PROGRESS, (model_id, prompt_id, dataset_id))
+            result = cursor.fetchone()
+            conn.commit()
+            return tuple(result) if result else None
+        finally:
+            cursor.close()
+
+def get_job_metrics(model_id, prompt_id, dataset_id):
+    """
+    Return the job's metrics from the job_metrics view as a dict, or None if it has no predictions.
+
+    Keys are predictions, unknown, accuracy, macro_precision, macro_recall,
+    mean_latency and labels, which maps each expected label to its
+    (precision, recall, support) from job_label_metrics.
+    """
+    job = (model_id, prompt_id, dataset_id)
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT predictions, unknown, accuracy, macro_precision, macro_recall, mean_latency
+                FROM job_metrics
+                WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s
+                """,
+                job,
+            )
+            row = cursor.fetchone()
+            if row is None:
+                conn.commit()
+                return None
+            metrics = dict(zip(
+                ('predictions', 'unknown', 'accuracy', 'macro_precision', 'macro_recall', 'mean_latency'), row
+            ))
+            cursor.execute(
+                """
+                SELECT label, precision, recall, support
+                FROM job_label_metrics
+                WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s
+                ORDER BY label
+                """,
+                job,
+            )
+            metrics['labels'] = {label: tuple(rest) for label, *rest in cursor.fetchall()}
+            conn.commit()
+            return metrics
+        finally:
+            cursor.close()
+
+def reclaim_expired_leases(max_rows=None):
+    """
+    Return in_progress rows and work units whose lease expired to pending; returns the count.
+    """
+    max_rows = lease_reclaim_limit if max_rows is None else max_rows
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, RECLAIM, (max_rows,))
+            reclaimed = cursor.fetchone()[0]
+            conn.commit()
+            return reclaimed
+        finally:
+            cursor.close()
+
+def seed_job_chunk(model_id, prompt_id, dataset_id, chunk_size=None):
+    """
+    Seed the job's next chunk of pending PredictionStatus rows or WorkUnits; returns how many rows.
+
+    Returns 0 once the job is fully seeded. Each chunk commits on its own, so
+    seeding can be interrupted and resumed, and workers claim seeded rows
+    while the rest of the job is still being added.
+    """
+    chunk_size = seed_chunk_size if chunk_size is None else chunk_size
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, SEED, (model_id, prompt_id, dataset_id, chunk_size))
+            seeded = cursor.fetchone()[0]
+            conn.commit()
+            return seeded
+        finally:
+            cursor.close()
+
+def get_cached_predictions(keys):
+    """
+    Return {cache_key: (prediction, prediction_time)} for the keys found in inference_cache.
+    """
+    if not keys:
+        return {}
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, CACHE_LOOKUP, (list(keys),))
+            found = {key: (prediction, prediction_time) for key, prediction, prediction_time in cursor.fetchall()}
+            conn.commit()
+            return found
+        finally:
+            cursor.close()
+
+def cache_predictions(entries):
+    """
+    Store (cache_key, model_name, prediction, prediction_time) entries; keys already cached are kept.
+    """
+    if not entries:
+        return
+    columns = [list(column) for column in zip(*entries)]
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, CACHE_STORE, columns)
+            conn.commit()
+        finally:
+            cursor.close()
+
+def get_unseeded_jobs():
+    """
+    Return (model_id, prompt_id, dataset_id) of every job that is not fully seeded.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT model_id, prompt_id, dataset_id
+                FROM JobProgress
+                WHERE NOT seeding_done
+                ORDER BY model_id, prompt_id, dataset_id
+                """
+            )
+            jobs = cursor.fetchall()
+            conn.commit()
+            return jobs
+        finally:
+            cursor.close()
+
+def archive_job_chunk(model_id, prompt_id, dataset_id, chunk_size=None):
+    """
+    Remove the next chunk of a finished job's PredictionStatus rows; returns how many dataset rows it covered.
+
+    Returns 0 once the job is archived. Predictions are kept. Each chunk
+    commits on its own, so archiving can be interrupted and resumed next to
+    running workers. Raises psycopg2.errors.ObjectNotInPrerequisiteState if
+    the job is not stopped with every row predicted.
+    """
+    chunk_size = archive_chunk_size if chunk_size is None else chunk_size
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            prepared.execute(cursor, ARCHIVE, (model_id, prompt_id, dataset_id, chunk_size))
+            archived = cursor.fetchone()[0]
+            conn.commit()
+            return archived
+        finally:
+            cursor.close()
+
+def get_archivable_jobs():
+    """
+    Return (model_id, prompt_id, dataset_id) of every stopped, complete job that is not archived yet.
+    """
+    with connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(
+                """
+                SELECT jp.model_id, jp.prompt_id, jp.dataset_id
+                FROM JobProgress jp
+                JOIN ModelPromptStatus mps
+                  ON mps.model_id = jp.model_id AND mps.prompt_id = jp.prompt_id AND mps.dataset_id = jp.dataset_id
+                WHERE mps.status = 'stop' AND NOT jp.archived
+                  AND jp.seeding_done AND jp.done + jp.failed >= jp.total
+                ORDER BY jp.model_id, jp.prompt_id, jp.dataset_id
+                """
+            )
+            jobs = cursor.fetchall()
+            conn.commit()
+            return jobs
+        finally:
+            cursor.close()
@@ -0,0 +1,88 @@
+"""
+Content-addressed cache of model predictions for the runners.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+
+from . import backends
+from .config import inference_cache
+
+
+def cache_key(model_name, labels, text):
+    """
+    Return the cache key of classifying text with model_name over labels.
+
+    The key is the md5 of the three as a uuid, as formatted_prompts keys
+    prompts; the same input gets the same key in every job and worker.
+    """
+    digest = hashlib.md5(json.dumps([model_name, list(labels), text]).encode('utf-8')).hexdigest()
+    return str(uuid.UUID(digest))
+
+
+class InferenceCache:
+    """
+    Reuse predictions for inputs a model already classified with the same labels.
+
+    A deterministic model gives the same answer for the same input, so an
+    input shared by several jobs (prompts that leave the text unchanged,
+    datasets with overlapping reviews, a rerun) only needs inference once.
+    lookup(keys) returns {key: (prediction, prediction_time)} and
+    store(entries) saves (key, model_name, prediction, prediction_time)
+    entries; both default to the storage backend's inference_cache table.
+    A hit reports its share of the lookup as its prediction time, so batch
+    sizing and latency metrics see what the row cost this run.
+    """
+
+    def __init__(self, lookup=None, store=None, enabled=None):
+        self._lookup = lookup or backends.get_cached_predictions
+        self._store = store or backends.cache_predictions
+        self.enabled = inference_cache if enabled is None else enabled
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'computed': 0}
+
+    def classify(self, model_name, labels, texts, compute):
+        """
+        Return a (prediction, prediction_time) for each of texts.
+
+        compute(texts) runs the model and returns (prediction, prediction_time)
+        pairs in order; it is called once, with each uncached text once.
+        """
+        if not self.enabled:
+            return list(compute(texts))
+        keys = [cache_key(model_name, labels, text) for text in texts]
+        start = time.perf_counter()
+        found = self._lookup(list(dict.fromkeys(keys)))
+        lookup_time = (time.perf_counter() - start) / len(texts)
+        results = {key: (prediction, lookup_time) for key, (prediction, _) in found.items()}
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in results:
+                missing.setdefault(key, text)
+        if missing:
+            computed = list(compute(list(missing.values())))
+            entries = [
+                (key, model_name, prediction, prediction_time)
+                for key, (prediction, prediction_time) in zip(missing, computed)
+            ]
+            self._store(entries)
+            results.update(zip(missing, computed))
+        hits = len(texts) - sum(key in missing for key in keys)
+        with self._lock:
+            self._stats['hits'] += hits
+            self._stats['misses'] += len(texts) - hits
+            self._stats['computed'] += len(missing)
+        if missing:
+            logging.debug(f"Inference cache: {hits}/{len(texts)} hits, {len(missing)} inputs computed")
+        return [tuple(results[key]) for key in keys]
+
+    def stats(self):
+        """Return a snapshot of cache counters and the hit rate."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        lookups = snapshot['hits'] + snapshot['misses']
+        snapshot['hit_rate'] = snapshot['hits'] / lookups if lookups else 0.0
+        return snapshot
@@ -0,0 +1,115 @@
+"""
+Process-wide cache of loaded models for the runners.
+"""
+import gc
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from .config import model_cache_mb
+
+
+def model_bytes(model):
+    """
+    Return the bytes held by a model's parameters and buffers, or 0 if unknown.
+
+    Wrappers are unwrapped through their .model attribute, so a runner's
+    adapter, a transformers pipeline and a bare torch module all work. An
+    object that reports its own size in .nbytes, such as a
+    zero_shot.ZeroShotClassifier on ONNX Runtime, is taken at its word.
+    """
+    seen = set()
+    while not hasattr(model, 'parameters') and not hasattr(model, 'nbytes') \
+            and hasattr(model, 'model') and id(model) not in seen:
+        seen.add(id(model))
+        model = model.model
+    if hasattr(model, 'nbytes'):
+        return model.nbytes
+    if not hasattr(model, 'parameters'):
+        return 0
+    tensors = list(model.parameters())
+    if hasattr(model, 'buffers'):
+        tensors += list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class ModelRegistry:
+    """
+    Load models by name on first use and keep the most recently used ones resident.
+
+    load(name) builds a model; size_of(model) reports the memory it holds.
+    Once the resident models exceed max_bytes the least recently used ones
+    are dropped. The model just requested always stays, even if it alone
+    exceeds the budget. A model evicted earlier makes room for itself
+    before it is loaded again, so the budget also bounds the peak while
+    loading. Loaders may hold more than the loaded model for a moment: a
+    quantized or ONNX zero_shot.load_zero_shot loads the PyTorch pipeline
+    alongside for its agreement check (BERT_MIN_AGREEMENT), so the peak
+    can briefly exceed the budget by that pipeline.
+    """
+
+    def __init__(self, load, max_bytes=None, size_of=model_bytes):
+        self._load = load
+        self.max_bytes = model_cache_mb * 2**20 if max_bytes is None else max_bytes
+        self._size_of = size_of
+        self._lock = threading.Lock()
+        self._models = OrderedDict()  # name -> (model, bytes), least recently used first
+        self._known_sizes = {}  # name -> bytes, kept after eviction
+        self._stats = {'hits': 0, 'loads': 0, 'evictions': 0, 'load_seconds': 0.0}
+
+    def get(self, name):
+        """Return the model called name, loading it if it is not resident."""
+        with self._lock:
+            if name in self._models:
+                self._models.move_to_end(name)
+                self._stats['hits'] += 1
+                return self._models[name][0]
+            self._evict(self._known_sizes.get(name, 0))
+            start = time.monotonic()
+            model = self._load(name)
+            elapsed = time.monotonic() - start
+            size = self._size_of(model)
+            self._models[name] = (model, size)
+            self._known_sizes[name] = size
+            self._stats['loads'] += 1
+            self._stats['load_seconds'] += elapsed
+            logging.info(f"Loaded model {name} in {elapsed:.1f}s ({size / 2**20:.0f} MB)")
+            self._evict(0, keep=name)
+            return model
+
+    def _evict(self, incoming, keep=None):
+        """Drop least recently used models until incoming more bytes fit the budget."""
+        evicted = False
+        while self._models and self.resident_bytes() + incoming > self.max_bytes:
+            name = next(iter(self._models))
+            if name == keep:
+                break
+            _, size = self._models.pop(name)
+            self._stats['evictions'] += 1
+            evicted = True
+            logging.info(f"Evicted model {name} ({size / 2**20:.0f} MB)")
+        if evicted:
+            # Release the weights now rather than whenever a cycle is collected
+            gc.collect()
+
+    def resident_bytes(self):
+        return sum(size for _, size in self._models.values())
+
+    def names(self):
+        """Return the resident model names, least recently used first."""
+        with self._lock:
+            return list(self._models)
+
+    def stats(self):
+        """Return a snapshot of cache counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['resident'] = len(self._models)
+            snapshot['resident_bytes'] = self.resident_bytes()
+        return snapshot
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+        gc.collect()
@@ -0,0 +1,131 @@
+"""
+Push-based job status updates via PostgreSQL LISTEN/NOTIFY.
+"""
+import json
+import logging
+import select
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+from .config import db_params
+
+# Channel the notify_job_status() trigger publishes ModelPromptStatus changes on
+JOB_STATUS_CHANNEL = 'job_status'
+
+
+class JobStatusListener:
+    """
+    Track stopped jobs from NOTIFY messages on one persistent connection.
+
+    A daemon thread LISTENs on JOB_STATUS_CHANNEL and reconnects when the
+    connection drops. After every (re)connect the watched jobs are re-read,
+    so no stop is lost while the connection was down. Callers should poll
+    the database themselves while connected is False.
+    """
+
+    def __init__(self, params=None, reconnect_delay=1.0, poll_interval=0.5):
+        self._params = params or db_params
+        self._reconnect_delay = reconnect_delay
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._watched = set()
+        self._stopped = set()
+        self._connected = threading.Event()
+        self._closing = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='job-status-listener', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._closing.set()
+        self._thread.join()
+
+    @property
+    def connected(self):
+        return self._connected.is_set()
+
+    def wait_connected(self, timeout=None):
+        """Block until LISTEN is active; returns False on timeout."""
+        return self._connected.wait(timeout)
+
+    def watch(self, model_id, prompt_id, dataset_id):
+        """Re-read this job's status after every reconnect."""
+        with self._lock:
+            self._watched.add((model_id, prompt_id, dataset_id))
+
+    def unwatch(self, model_id, prompt_id, dataset_id):
+        """Stop re-reading a job's status after reconnects."""
+        with self._lock:
+            self._watched.discard((model_id, prompt_id, dataset_id))
+
+    def is_stopped(self, model_id, prompt_id, dataset_id):
+        """Return True once a stop was announced for the job."""
+        with self._lock:
+            return (model_id, prompt_id, dataset_id) in self._stopped
+
+    def _record(self, key, status):
+        # Every job is tracked, so a stop announced just before watch() counts
+        with self._lock:
+            if status == 'stop':
+                self._stopped.add(key)
+            else:
+                self._stopped.discard(key)
+
+    def _resync(self, conn):
+        """Re-read watched jobs so stops sent while disconnected are not missed."""
+        with self._lock:
+            watched = list(self._watched)
+        cursor = conn.cursor()
+        try:
+            for key in watched:
+                cursor.execute(
+                    """
+                    SELECT status
+                    FROM ModelPromptStatus
+                    WHERE model_id = %s AND prompt_id = %s AND dataset_id = %s
+                    """,
+                    key,
+                )
+                result = cursor.fetchone()
+                if result:
+                    self._record(key, result[0])
+        finally:
+            cursor.close()
+
+    def _run(self):
+        while not self._closing.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self._params)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = conn.cursor()
+                cursor.execute(f"LISTEN {JOB_STATUS_CHANNEL}")
+                cursor.close()
+                self._resync(conn)
+                self._connected.set()
+                while not self._closing.is_set():
+                    if select.select([conn], [], [], self._poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._handle(conn.notifies.pop(0).payload)
+            except psycopg2.Error as e:
+                logging.warning(f"Job status listener disconnected: {e}. Reconnecting.")
+                self._closing.wait(self._reconnect_delay)
+            finally:
+                self._connected.clear()
+                if conn is not None:
+                    conn.close()
+
+    def _handle(self, payload):
+        try:
+            message = json.loads(payload)
+            key = (message['model_id'], message['prompt_id'], message['dataset_id'])
+        except (ValueError, KeyError) as e:
+            logging.warning(f"Ignoring malformed job status notification {payload!r}: {e}")
+            return
+        self._record(key, message.get('status'))
@@ -0,0 +1,240 @@
+"""
+Process-wide PostgreSQL connection pool for sentiment_core.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extensions
+
+from .config import (
+    db_params,
+    pool_min_size,
+    pool_max_size,
+    pool_timeout,
+    pool_health_check_interval,
+    pool_connect_retries,
+)
+
+
+class PoolError(Exception):
+    """Raised when the pool cannot hand out a connection."""
+
+
+class PoolTimeout(PoolError):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived psycopg2 connections.
+
+    Idle connections are health-checked before reuse, broken connections are
+    replaced transparently, and checkout/wait statistics are kept for sizing.
+    """
+
+    def __init__(self, params, min_size=1, max_size=5, timeout=30.0,
+                 health_check_interval=30.0, connect_retries=3):
+        self._params = params
+        self._max_size = max_size
+        self._timeout = timeout
+        self._health_check_interval = health_check_interval
+        self._connect_retries = connect_retries
+        self._cond = threading.Condition()
+        self._idle = []  # (connection, last_used) pairs, most recent last
+        self._size = 0   # open connections, idle plus checked out
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'timeouts': 0,
+            'connects': 0,
+            'reconnects': 0,
+            'discarded': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+        }
+        for _ in range(min(min_size, max_size)):
+            self._idle.append((self._connect(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        """Open a new connection, retrying with backoff on failure."""
+        for attempt in range(self._connect_retries):
+            try:
+                conn = psycopg2.connect(**self._params)
+            except psycopg2.OperationalError:
+                if attempt == self._connect_retries - 1:
+                    raise
+                logging.warning('Database connection failed, retrying (attempt %d)', attempt + 1)
+                time.sleep(0.5 * 2 ** attempt)
+                continue
+            with self._cond:
+                self._stats['connects'] += 1
+            return conn
+
+    def _is_healthy(self, conn, last_used):
+        """Return False if the connection is closed or fails a ping."""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self._health_check_interval:
+            return True
+        try:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT 1')
+            finally:
+                cursor.close()
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Check out a connection, blocking up to the pool timeout."""
+        start = time.monotonic()
+        deadline = start + self._timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError('connection pool is closed')
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self._max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'no connection available after {self._timeout}s')
+                self._cond.wait(remaining)
+        try:
+            if conn is None:
+                conn = self._connect()
+            elif not self._is_healthy(conn, last_used):
+                self._close_quietly(conn)
+                conn = self._connect()
+                with self._cond:
+                    self._stats['reconnects'] += 1
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        waited = time.monotonic() - start
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['wait_time_total'] += waited
+            self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool, closing it if broken or discarded."""
+        if not discard and not conn.closed:
+            try:
+                if conn.status != psycopg2.extensions.STATUS_READY:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        if discard or conn.closed or self._closed:
+            self._close_quietly(conn)
+            with self._cond:
+                self._size -= 1
+                self._stats['discarded'] += 1
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection."""
+        conn = self.getconn()
+        discard = False
+        try:
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # The server side is gone; never hand this connection out again
+            discard = True
+            raise
+        except Exception:
+            if not conn.closed:
+                # A failed rollback must not hide the error that caused it
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+            raise
+        finally:
+            self.putconn(conn, discard=discard)
+
+    def stats(self):
+        """Return a snapshot of pool usage counters."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot['size'] = self._size
+            snapshot['idle'] = len(self._idle)
+            snapshot['in_use'] = self._size - len(self._idle)
+        checkouts = snapshot['checkouts']
+        snapshot['wait_time_avg'] = snapshot['wait_time_total'] / checkouts if checkouts else 0.0
+        return snapshot
+
+    def close(self):
+        """Close all idle connections; checked-out ones close when returned."""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it from config on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(
+                db_params,
+                min_size=pool_min_size,
+                max_size=pool_max_size,
+                timeout=pool_timeout,
+                health_check_interval=pool_health_check_interval,
+                connect_retries=pool_connect_retries,
+            )
+        return _pool
+
+
+def connection():
+    """Check out a connection from the process-wide pool."""
+    return get_pool().connection()
+
+
+def pool_stats():
+    """Return usage counters of the process-wide pool."""
+    return get_pool().stats()
+
+
+def close_pool():
+    """Close and forget the process-wide pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
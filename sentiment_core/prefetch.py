@@ -0,0 +1,71 @@
+"""
+Claim upcoming batches in the background while the current one is inferred.
+"""
+import queue
+import threading
+
+
+class BatchPrefetcher:
+    """
+    Keep up to lookahead claimed batches of one job ready for the worker.
+
+    claim() is called on a daemon thread and returns (rows, claim_seconds);
+    an empty rows list means the job is drained and ends prefetching. Rows
+    that were claimed but never handed out are returned by close(), so the
+    caller can release them when a job is stopped or fails.
+    """
+
+    def __init__(self, claim, lookahead=1, put_timeout=0.1):
+        self._claim = claim
+        self._queue = queue.Queue(maxsize=max(lookahead, 1))
+        self._put_timeout = put_timeout
+        self._closing = threading.Event()
+        self._unsent = []
+        self._thread = threading.Thread(target=self._run, name='batch-prefetcher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def get(self):
+        """Return the next (rows, claim_seconds); re-raises errors from claim()."""
+        rows, claim_seconds, error = self._queue.get()
+        if error is not None:
+            raise error
+        return rows, claim_seconds
+
+    def close(self):
+        """Stop claiming and return the claimed rows that were never handed out."""
+        self._closing.set()
+        self._thread.join()
+        released = list(self._unsent)
+        while True:
+            try:
+                rows, _, _ = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if rows:
+                released.extend(rows)
+        return released
+
+    def _put(self, item):
+        # Give up once closing so close() never waits on a full queue
+        while not self._closing.is_set():
+            try:
+                self._queue.put(item, timeout=self._put_timeout)
+                return True
+            except queue.Full:
+                continue
+        if item[0]:
+            self._unsent.extend(item[0])
+        return False
+
+    def _run(self):
+        while not self._closing.is_set():
+            try:
+                rows, claim_seconds = self._claim()
+            except Exception as e:
+                self._put((None, 0.0, e))
+                return
+            if not self._put((rows, claim_seconds, None)) or not rows:
+                return
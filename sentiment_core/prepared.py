@@ -0,0 +1,93 @@
+"""
+Server-side prepared statements for the worker's hot queries.
+"""
+import re
+import threading
+import weakref
+
+import psycopg2.errors
+
+from .config import prepared_statements
+
+_PLACEHOLDER = re.compile(r'\$(\d+)')
+
+
+class PreparedStatement:
+    """
+    A statement PREPAREd once per connection and run with EXECUTE.
+
+    sql uses $1..$n placeholders and types lists their PostgreSQL types.
+    With PREPARED_STATEMENTS=0 the same SQL is sent as plain text instead,
+    e.g. behind a transaction-pooling proxy that cannot keep session state.
+    """
+
+    def __init__(self, name, sql, types):
+        self.name = name
+        self.sql = sql
+        self.types = tuple(types)
+        self.prepare_sql = f"PREPARE {name} ({', '.join(self.types)}) AS {sql}"
+        self.execute_sql = f"EXECUTE {name} ({', '.join(['%s'] * len(self.types))})"
+        self.text_sql = _PLACEHOLDER.sub(r'%(p\1)s', sql)
+        # text_sql with each parameter cast to its type, for drivers that
+        # send parameters separately instead of interpolating them
+        self.typed_sql = _PLACEHOLDER.sub(lambda m: f'%(p{m[1]})s::{self.types[int(m[1]) - 1]}', sql)
+
+    def text_params(self, params):
+        return {f'p{i}': value for i, value in enumerate(params, 1)}
+
+
+_registry_lock = threading.Lock()
+# Statement names prepared on each connection; a replacement connection
+# opened by the pool after a reconnect starts out empty
+_registry = weakref.WeakKeyDictionary()
+
+
+def _is_prepared(conn, statement):
+    with _registry_lock:
+        return statement.name in _registry.get(conn, ())
+
+
+def _mark_prepared(conn, statement):
+    with _registry_lock:
+        _registry.setdefault(conn, set()).add(statement.name)
+
+
+def _forget(conn):
+    with _registry_lock:
+        _registry.pop(conn, None)
+
+
+def execute(cursor, statement, params):
+    """
+    Run statement on the cursor's connection, preparing it there first if needed.
+
+    Must be the first statement of its transaction: if the server no longer
+    knows the statement (for instance after DISCARD ALL), the transaction is
+    rolled back and the statement prepared again and retried; a PREPARE
+    that finds the statement already there rolls back the same way.
+    """
+    if not prepared_statements:
+        cursor.execute(statement.text_sql, statement.text_params(params))
+        return
+    conn = cursor.connection
+    if not _is_prepared(conn, statement):
+        try:
+            cursor.execute(statement.prepare_sql)
+        except psycopg2.errors.DuplicatePreparedStatement:
+            # Prepared on this session by an earlier, forgotten registration
+            conn.rollback()
+        _mark_prepared(conn, statement)
+    try:
+        cursor.execute(statement.execute_sql, tuple(params))
+    except psycopg2.errors.InvalidSqlStatementName:
+        conn.rollback()
+        _forget(conn)
+        cursor.execute(statement.prepare_sql)
+        _mark_prepared(conn, statement)
+        cursor.execute(statement.execute_sql, tuple(params))
+
+
+def prepared_names(conn):
+    """Return the statement names prepared on a connection."""
+    with _registry_lock:
+        return set(_registry.get(conn, ()))
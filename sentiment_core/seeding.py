@@ -0,0 +1,46 @@
+"""
+Seed the PredictionStatus rows of registered jobs in resumable chunks.
+
+Registering a job only seeds its first chunk; workers seed further chunks
+when they run out of claimable rows. Run this module to seed whole jobs
+ahead of the workers, e.g. right after registering a model x prompt matrix:
+
+    python -m sentiment_core.seeding --chunk-size 10000
+"""
+import argparse
+import logging
+
+from .config import seed_chunk_size
+from .db_helpers import get_unseeded_jobs, seed_job_chunk
+
+
+def seed_jobs(chunk_size=None, jobs=None):
+    """
+    Seed the given jobs, or every job that is not fully seeded; returns the rows added.
+
+    Safe to interrupt and to run next to workers and other seeders.
+    """
+    chunk_size = seed_chunk_size if chunk_size is None else chunk_size
+    total = 0
+    for job in (get_unseeded_jobs() if jobs is None else jobs):
+        job_rows = 0
+        while True:
+            seeded = seed_job_chunk(*job, chunk_size=chunk_size)
+            job_rows += seeded
+            if seeded < chunk_size:
+                break
+        logging.info(f"Seeded {job_rows} rows for model {job[0]}, prompt {job[1]}, dataset {job[2]}")
+        total += job_rows
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed PredictionStatus rows of registered jobs")
+    parser.add_argument('--chunk-size', type=int, default=seed_chunk_size, help='Rows per transaction')
+    args = parser.parse_args()
+    seeded = seed_jobs(args.chunk_size)
+    print(f"Seeded {seeded} rows.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""
+Shared worker loop for the sentiment_core runners.
+"""
+import logging
+import time
+from collections import namedtuple
+
+from .batching import BatchSizeController
+from .config import (
+    adaptive_batch_size,
+    batch_size,
+    batch_size_min,
+    batch_size_max,
+    job_notifications,
+    lease_seconds_for,
+    prefetch_batches,
+    storage_backend,
+)
+from .backends import (
+    get_least_used_model_prompt_dataset,
+    claim_batch,
+    write_predictions,
+    revert_batch_status,
+    decrement_count,
+    get_job_status,
+    reclaim_expired_leases,
+    seed_job_chunk,
+)
+from .notifications import JobStatusListener
+from .prefetch import BatchPrefetcher
+from .writer import PredictionWriter
+
+# A model-prompt-dataset combination as returned by get_least_used_model_prompt_dataset
+Job = namedtuple('Job', 'model_id prompt_id dataset_id model_name prompt_text dataset_name count')
+
+
+def run_worker(library: str, classify, once: bool = False):
+    """
+    Process jobs for the given library until none are left.
+
+    classify(job, rows) receives a claimed batch of (row_id, content) pairs and
+    yields (row_id, prediction, prediction_time, formatted_prompt) per row.
+    Results go through a PredictionWriter, so inference on the next rows
+    overlaps with writing the previous ones. With PREFETCH_BATCHES > 0 the
+    next batches are also claimed while the current one is inferred.
+    """
+    exclude_prompt_ids = []
+    lease_seconds = lease_seconds_for(library)
+    # Prefetched rows wait for the batches ahead of them, so they must fit
+    # in the lease together
+    lease_fraction = 0.5 / (prefetch_batches + 1)
+    if adaptive_batch_size:
+        sizer = BatchSizeController(
+            batch_size, batch_size_min, batch_size_max, lease_seconds, lease_fraction=lease_fraction,
+        )
+    else:
+        sizer = BatchSizeController(batch_size, batch_size, batch_size, lease_seconds)
+    writer = PredictionWriter(write_predictions, revert_batch_status).start()
+    # NOTIFY needs PostgreSQL; other backends poll the job status
+    listener = JobStatusListener().start() if job_notifications and storage_backend == 'postgres' else None
+    try:
+        # Release rows left behind by workers that died mid-batch
+        sweep_expired_leases()
+        while True:
+            model_info = get_least_used_model_prompt_dataset(library, exclude_prompt_ids)
+            if model_info is None:
+                print("No available model-prompt-dataset combination found.")
+                break
+
+            job = Job(*model_info)
+            print(f"Using model: {job.model_name} with prompt: {job.prompt_text} on dataset: {job.dataset_name}")
+            if listener is not None:
+                listener.watch(job.model_id, job.prompt_id, job.dataset_id)
+            process_job(job, classify, writer, once, sizer, listener, prefetch_batches)
+            if listener is not None:
+                listener.unwatch(job.model_id, job.prompt_id, job.dataset_id)
+
+            # After the job, decrement count and exclude this prompt
+            decrement_count(job.model_id, job.prompt_id, job.dataset_id)
+            exclude_prompt_ids.append(job.prompt_id)
+            if once:
+                break
+    finally:
+        if listener is not None:
+            listener.close()
+        writer.close()
+        logging.info(f"Prediction writer stats: {writer.stats()}")
+        logging.info(f"Batch size stats: {sizer.stats()}")
+
+
+def sweep_expired_leases():
+    """
+    Opportunistically return expired in_progress rows to pending.
+    """
+    reclaimed = reclaim_expired_leases()
+    if reclaimed:
+        logging.info(f"Reclaimed {reclaimed} rows with expired leases")
+    return reclaimed
+
+
+def job_stopped(job: Job, listener=None):
+    """
+    Return True if the job was set to 'stop'.
+
+    Uses the pushed status while the listener is connected and falls back to
+    polling ModelPromptStatus otherwise.
+    """
+    if listener is not None and listener.connected:
+        return listener.is_stopped(job.model_id, job.prompt_id, job.dataset_id)
+    return get_job_status(job.model_id, job.prompt_id, job.dataset_id) == 'stop'
+
+
+def process_job(job: Job, classify, writer: PredictionWriter, once: bool = False, sizer=None, listener=None,
+                prefetch: int = 0):
+    """
+    Claim and classify batches of one job until it is drained, stopped or fails.
+
+    sizer is a BatchSizeController that picks each claim's size and the
+    lease; without one the configured batch_size and lease are used. With a
+    JobStatusListener a stop interrupts the current batch after the row in
+    flight, and its remaining rows are released. With prefetch > 0 up to that
+    many further batches are claimed while the current one is inferred;
+    prefetched rows still waiting when the job ends are released as well.
+    """
+    def claim():
+        while True:
+            claim_start = time.monotonic()
+            if sizer is None:
+                rows = claim_batch(job.model_id, job.prompt_id, job.dataset_id)
+            else:
+                rows = claim_batch(
+                    job.model_id, job.prompt_id, job.dataset_id,
+                    limit=sizer.size, lease_seconds=sizer.lease_seconds,
+                )
+            claim_seconds = time.monotonic() - claim_start
+            if rows:
+                return rows, claim_seconds
+            # Rows held by dead workers only come back once their lease
+            # expires, and large jobs are seeded a chunk at a time
+            if not sweep_expired_leases() and not seed_job_chunk(job.model_id, job.prompt_id, job.dataset_id):
+                return rows, claim_seconds
+
+    prefetcher = None
+    if prefetch > 0 and not once:
+        prefetcher = BatchPrefetcher(claim, prefetch).start()
+    try:
+        while True:
+            rows, claim_seconds = prefetcher.get() if prefetcher is not None else claim()
+            if not rows:
+                return
+
+            submitted = set()
+            infer_seconds = 0.0
+            interrupted = False
+            try:
+                for row_id, prediction, prediction_time, formatted_prompt in classify(job, rows):
+                    writer.submit((
+                        row_id, job.model_id, job.prompt_id, job.dataset_id,
+                        prediction, prediction_time, formatted_prompt,
+                    ))
+                    submitted.add(row_id)
+                    infer_seconds += prediction_time
+                    logging.info(f"Processed row {row_id} with model {job.model_name}")
+                    if listener is not None and listener.is_stopped(job.model_id, job.prompt_id, job.dataset_id):
+                        interrupted = True
+                        break
+            except Exception as e:
+                logging.error(f"Error occurred: {e}. Reverting batch status.")
+                # Rows already handed to the writer are written; release the rest
+                unfinished = [row for row in rows if row[0] not in submitted]
+                revert_batch_status(unfinished, job.model_id, job.prompt_id, job.dataset_id)
+                return
+            if interrupted:
+                unfinished = [row for row in rows if row[0] not in submitted]
+                revert_batch_status(unfinished, job.model_id, job.prompt_id, job.dataset_id)
+            elif sizer is not None:
+                sizer.observe(len(rows), infer_seconds, claim_seconds)
+            if once:
+                return
+
+            # Check if the job was set to 'stop' after each batch
+            if interrupted or job_stopped(job, listener):
+                print(f"Model-prompt-dataset combination {job.model_name} - {job.prompt_text} - {job.dataset_name} is set to stop. Moving to the next combination.")
+                return
+    finally:
+        if prefetcher is not None:
+            prefetched = prefetcher.close()
+            if prefetched:
+                logging.info(f"Releasing {len(prefetched)} prefetched rows")
+                revert_batch_status(prefetched, job.model_id, job.prompt_id, job.dataset_id)
@@ -0,0 +1,140 @@
+"""
+Background write-behind queue for predictions.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from .config import writer_queue_size, writer_flush_size, writer_flush_interval
+from .db_helpers import write_predictions, revert_batch_status
+
+_STOP = object()
+
+
+class PredictionWriter:
+    """
+    Collect finished predictions on a bounded queue and write them in groups.
+
+    A daemon thread flushes whenever flush_size records are pending or the
+    oldest pending record is flush_interval seconds old. submit() blocks
+    while the queue is full, and close() drains everything before returning.
+    Records use the write_predictions item layout, and write returns how
+    many it wrote (a write that returns None is taken to have written them
+    all); records it skipped because their rows were no longer claimed
+    count as skipped. The rows of a flush that
+    fails are handed to revert, with revert_batch_status's arguments, so
+    they go back to pending in the same storage write sends them to.
+    """
+
+    def __init__(self, write=write_predictions, revert=revert_batch_status, max_queue=None, flush_size=None,
+                 flush_interval=None):
+        self._write = write
+        self._revert_rows = revert
+        self._flush_size = flush_size or writer_flush_size
+        self._flush_interval = writer_flush_interval if flush_interval is None else flush_interval
+        self._queue = queue.Queue(maxsize=max_queue or writer_queue_size)
+        self._thread = threading.Thread(target=self._run, name='prediction-writer', daemon=True)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats = {
+            'submitted': 0,
+            'written': 0,
+            'skipped': 0,
+            'failed': 0,
+            'flushes': 0,
+            'backpressure_waits': 0,
+            'flush_latency_total': 0.0,
+            'flush_latency_max': 0.0,
+        }
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def submit(self, record):
+        """Queue one prediction record, blocking while the queue is full."""
+        if self._closed:
+            raise RuntimeError('PredictionWriter is closed')
+        if self._queue.full():
+            with self._lock:
+                self._stats['backpressure_waits'] += 1
+        self._queue.put(record)
+        with self._lock:
+            self._stats['submitted'] += 1
+
+    def close(self):
+        """Flush all queued records and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _run(self):
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if not pending else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _STOP:
+                self._flush(pending)
+                return
+            if item is not None:
+                if not pending:
+                    deadline = time.monotonic() + self._flush_interval
+                pending.append(item)
+            if len(pending) >= self._flush_size or (pending and time.monotonic() >= deadline):
+                self._flush(pending)
+                pending = []
+
+    def _flush(self, records):
+        if not records:
+            return
+        start = time.monotonic()
+        try:
+            written = self._write(records)
+        except Exception as e:
+            logging.error(f"Failed to write {len(records)} predictions: {e}. Reverting their status.")
+            with self._lock:
+                self._stats['failed'] += len(records)
+            self._revert(records)
+            return
+        latency = time.monotonic() - start
+        written = len(records) if written is None else written
+        with self._lock:
+            self._stats['written'] += written
+            self._stats['skipped'] += len(records) - written
+            self._stats['flushes'] += 1
+            self._stats['flush_latency_total'] += latency
+            self._stats['flush_latency_max'] = max(self._stats['flush_latency_max'], latency)
+
+    def _revert(self, records):
+        """Return rows of a failed flush to pending so another claim picks them up."""
+        by_job = defaultdict(list)
+        for record in records:
+            by_job[record[1:4]].append((record[0],))
+        for (model_id, prompt_id, dataset_id), rows in by_job.items():
+            try:
+                self._revert_rows(rows, model_id, prompt_id, dataset_id)
+            except Exception as e:
+                logging.error(f"Could not revert rows of job {model_id}/{prompt_id}/{dataset_id}: {e}")
+
+    def stats(self):
+        """Return a snapshot of queue depth and flush counters."""
+        with self._lock:
+            snapshot = dict(self._stats)
+        snapshot['queue_depth'] = self._queue.qsize()
+        flushes = snapshot['flushes']
+        snapshot['flush_latency_avg'] = snapshot['flush_latency_total'] / flushes if flushes else 0.0
+        return snapshot
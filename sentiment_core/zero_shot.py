@@ -0,0 +1,329 @@
+"""
+Zero-shot NLI classification for the BERT runners on PyTorch, dynamic int8 or ONNX Runtime.
+
+load_zero_shot(model_name) returns the classifier BERT_BACKEND selects:
+
+- torch:     the transformers zero-shot pipeline, in full precision
+- int8:      the PyTorch model with its Linear layers quantized to int8
+- onnx:      the model exported to ONNX and run with ONNX Runtime
+- onnx-int8: the ONNX export with dynamically quantized int8 weights
+
+All of them are called like the pipeline. The exported models are written
+to ONNX_CACHE_DIR once and reused. Before a quantized or ONNX model is used,
+it labels SAMPLE_REVIEWS next to the PyTorch pipeline; if fewer than
+BERT_MIN_AGREEMENT of the labels match, the runner keeps the pipeline.
+
+Needs transformers and torch; the ONNX backends also need onnx and
+onnxruntime. The rest of sentiment_core does not import this module.
+"""
+import gc
+import logging
+import os
+import re
+import threading
+
+import numpy as np
+
+from .config import (
+    bert_backend,
+    bert_inter_op_threads,
+    bert_intra_op_threads,
+    bert_min_agreement,
+    onnx_cache_dir,
+)
+
+BACKENDS = ('torch', 'int8', 'onnx', 'onnx-int8')
+HYPOTHESIS_TEMPLATE = 'This example is {}.'
+SAMPLE_LABELS = ['positive', 'negative', 'neutral']
+# Reviews of every label and length the agreement check classifies
+SAMPLE_REVIEWS = [
+    "Absolutely love it, works perfectly and arrived a day early.",
+    "Broke after two days and support never replied. Waste of money.",
+    "It is a phone case. It fits the phone.",
+    "The sound quality is stunning and the battery lasts all week, best purchase this year.",
+    "Terrible fit, the seams came apart in the first wash and the colour faded.",
+    "Delivered on Tuesday in the original packaging.",
+    "I was sceptical at first, but after a month of daily use I can say the blender is sturdy, "
+    "easy to clean and crushes ice without complaint. Highly recommended.",
+    "The manual is missing half the steps, the screws did not match the holes and the drawer "
+    "jams every time it is opened. I am returning it.",
+    "Does what it says. Nothing special, nothing wrong.",
+    "Great value.",
+    "Awful.",
+    "The charger works with my laptop but not with my tablet.",
+]
+
+_threads_lock = threading.Lock()
+_threads_set = False
+
+
+class ZeroShotClassifier:
+    """
+    Zero-shot classification with an NLI model, called like the transformers pipeline.
+
+    classifier(sequences, candidate_labels, batch_size=16) pairs each
+    sequence with one hypothesis per label and returns, per sequence, a
+    {'sequence', 'labels', 'scores'} dict with the labels by descending
+    score (a bare dict for a single string). Scores follow the pipeline's
+    single-label rule: the entailment logits of a sequence's hypotheses,
+    softmaxed across its labels. batch_size counts sequence-hypothesis pairs
+    per forward pass. forward(input_ids, attention_mask) takes int64 numpy
+    arrays and returns the model's logits as a numpy array.
+    """
+
+    def __init__(self, tokenizer, forward, entailment_id, model=None, hypothesis_template=HYPOTHESIS_TEMPLATE):
+        self.tokenizer = tokenizer
+        self.forward = forward
+        self.entailment_id = entailment_id
+        # Kept for ModelRegistry's size accounting
+        self.model = model
+        self.hypothesis_template = hypothesis_template
+
+    def __call__(self, sequences, candidate_labels, batch_size=1, **kwargs):
+        single = isinstance(sequences, str)
+        if single:
+            sequences = [sequences]
+        candidate_labels = list(candidate_labels)
+        hypotheses = [self.hypothesis_template.format(label) for label in candidate_labels]
+        pairs = [(sequence, hypothesis) for sequence in sequences for hypothesis in hypotheses]
+        logits = []
+        for start in range(0, len(pairs), batch_size):
+            chunk = pairs[start:start + batch_size]
+            encoded = self.tokenizer(
+                [premise for premise, _ in chunk], [hypothesis for _, hypothesis in chunk],
+                padding=True, truncation='only_first', return_tensors='np',
+            )
+            logits.append(self.forward(
+                encoded['input_ids'].astype(np.int64), encoded['attention_mask'].astype(np.int64),
+            ))
+        logits = np.concatenate(logits).reshape(len(sequences), len(candidate_labels), -1)
+        results = [
+            self._result(sequence, candidate_labels, sequence_logits)
+            for sequence, sequence_logits in zip(sequences, logits)
+        ]
+        return results[0] if single else results
+
+    def _result(self, sequence, candidate_labels, logits):
+        if len(candidate_labels) == 1:
+            # One label: entailment against contradiction, as the pipeline does
+            contradiction_id = -1 if self.entailment_id == 0 else 0
+            pair = logits[..., [contradiction_id, self.entailment_id]]
+            scores = (np.exp(pair) / np.exp(pair).sum(-1, keepdims=True))[..., 1]
+        else:
+            entail = logits[..., self.entailment_id]
+            scores = np.exp(entail) / np.exp(entail).sum(-1, keepdims=True)
+        # The pipeline's order, ties included
+        order = list(reversed(scores.argsort()))
+        return {
+            'sequence': sequence,
+            'labels': [candidate_labels[i] for i in order],
+            'scores': [float(scores[i]) for i in order],
+        }
+
+
+def entailment_id(config):
+    """Return the index of the entailment logit in an NLI model config, or -1."""
+    for label, index in config.label2id.items():
+        if label.lower().startswith('entail'):
+            return index
+    return -1
+
+
+def set_torch_threads():
+    """Apply BERT_INTRA_OP_THREADS and BERT_INTER_OP_THREADS to PyTorch, once per process."""
+    global _threads_set
+    import torch
+
+    with _threads_lock:
+        if _threads_set:
+            return
+        _threads_set = True
+        if bert_intra_op_threads:
+            torch.set_num_threads(bert_intra_op_threads)
+        if bert_inter_op_threads:
+            try:
+                torch.set_num_interop_threads(bert_inter_op_threads)
+            except RuntimeError:
+                # Only possible before the first parallel operation
+                logging.warning("Could not set PyTorch inter-op threads; inference already started")
+
+
+def _load_torch_model(model_name, **kwargs):
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_name, **kwargs).eval()
+    return model, AutoTokenizer.from_pretrained(model_name)
+
+
+def torch_forward(model):
+    """Return forward(input_ids, attention_mask) for a PyTorch sequence classification model."""
+    import torch
+
+    def forward(input_ids, attention_mask):
+        with torch.inference_mode():
+            return model(
+                input_ids=torch.from_numpy(input_ids), attention_mask=torch.from_numpy(attention_mask),
+                use_cache=False,
+            ).logits.float().numpy()
+    return forward
+
+
+def load_int8(model_name):
+    """Return a ZeroShotClassifier on the PyTorch model with dynamically quantized Linear layers."""
+    import torch
+
+    set_torch_threads()
+    model, tokenizer = _load_torch_model(model_name)
+    # In place, so the full-precision copy of the layers is not kept around
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    classifier = ZeroShotClassifier(tokenizer, torch_forward(quantized), entailment_id(model.config), model=quantized)
+    # Packed int8 weights are not parameters; count them from the state dict
+    classifier.nbytes = sum(_tensor_bytes(value) for value in quantized.state_dict().values())
+    return classifier
+
+
+def _tensor_bytes(value):
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(item) for item in value)
+    return value.numel() * value.element_size() if hasattr(value, 'numel') else 0
+
+
+def onnx_path(model_name, quantized=False):
+    """Return where the ONNX export of model_name is cached."""
+    name = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name.strip('/'))
+    return os.path.join(onnx_cache_dir, f"{name}{'-int8' if quantized else ''}.onnx")
+
+
+def export_onnx(model_name, quantized=False):
+    """Export model_name to ONNX (quantizing its weights to int8 if asked) unless cached; returns the path."""
+    path = onnx_path(model_name, quantized)
+    if os.path.exists(path):
+        return path
+    os.makedirs(onnx_cache_dir, exist_ok=True)
+    if quantized:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(export_onnx(model_name), path + '.tmp', weight_type=QuantType.QInt8)
+        os.replace(path + '.tmp', path)
+        return path
+    import torch
+
+    # Eager attention traces without the shape-dependent branches of SDPA
+    model, tokenizer = _load_torch_model(model_name, attn_implementation='eager')
+
+    class Logits(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, use_cache=False).logits
+
+    example = tokenizer(['An example review.'] * 2, ['This example is positive.'] * 2, return_tensors='pt')
+    dynamic = {0: 'pairs', 1: 'tokens'}
+    logging.info(f"Exporting {model_name} to {path}")
+    torch.onnx.export(
+        Logits().eval(), (example['input_ids'], example['attention_mask']), path + '.tmp',
+        input_names=['input_ids', 'attention_mask'], output_names=['logits'],
+        dynamic_axes={'input_ids': dynamic, 'attention_mask': dynamic, 'logits': {0: 'pairs'}},
+        opset_version=17, dynamo=False,
+    )
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def load_onnx(model_name, quantized=False):
+    """Return a ZeroShotClassifier running the ONNX export of model_name with ONNX Runtime."""
+    import onnxruntime
+    from transformers import AutoConfig, AutoTokenizer
+
+    path = export_onnx(model_name, quantized)
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = bert_intra_op_threads
+    options.inter_op_num_threads = bert_inter_op_threads
+    session = onnxruntime.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+
+    def forward(input_ids, attention_mask):
+        return session.run(['logits'], {'input_ids': input_ids, 'attention_mask': attention_mask})[0]
+    classifier = ZeroShotClassifier(
+        AutoTokenizer.from_pretrained(model_name), forward, entailment_id(AutoConfig.from_pretrained(model_name)),
+    )
+    classifier.session = session
+    classifier.nbytes = os.path.getsize(path)
+    return classifier
+
+
+def load_torch(model_name):
+    """Return the transformers zero-shot pipeline for model_name."""
+    from transformers import pipeline
+
+    set_torch_threads()
+    return pipeline("zero-shot-classification", model=model_name)
+
+
+def classify_by_length(classifier, sequences, candidate_labels, batch_size):
+    """
+    Classify sequences with one classifier call, grouping them by token length; results keep the input order.
+
+    The sequences are tokenized up front and sent shortest first, so each
+    forward pass of batch_size pairs holds reviews of about the same length
+    and pads them little. A classifier without a tokenizer is called as is.
+    """
+    sequences = list(sequences)
+    tokenizer = getattr(classifier, 'tokenizer', None)
+    if tokenizer is None or len(sequences) < 2:
+        results = classifier(sequences, candidate_labels, batch_size=batch_size)
+        return [results] if isinstance(results, dict) else list(results)
+    lengths = [len(ids) for ids in tokenizer(sequences, add_special_tokens=False)['input_ids']]
+    order = sorted(range(len(sequences)), key=lengths.__getitem__)
+    results = classifier([sequences[i] for i in order], candidate_labels, batch_size=batch_size)
+    restored = [None] * len(sequences)
+    for index, result in zip(order, results):
+        restored[index] = result
+    return restored
+
+
+def agreement(reference, candidate, sequences=None, labels=None, batch_size=16):
+    """Return the fraction of sequences (default SAMPLE_REVIEWS) both classifiers give the same top label."""
+    sequences = SAMPLE_REVIEWS if sequences is None else sequences
+    labels = SAMPLE_LABELS if labels is None else labels
+    expected = reference(list(sequences), labels, batch_size=batch_size)
+    actual = candidate(list(sequences), labels, batch_size=batch_size)
+    same = sum(e['labels'][0] == a['labels'][0] for e, a in zip(expected, actual))
+    return same / len(sequences)
+
+
+def load_zero_shot(model_name, backend=None):
+    """
+    Return a zero-shot classifier for model_name on the given backend (default BERT_BACKEND).
+
+    A quantized or ONNX classifier that labels the sample reviews
+    differently from the pipeline more often than BERT_MIN_AGREEMENT
+    allows is dropped for the pipeline. The check loads the pipeline next
+    to the classifier, so loading briefly holds both; the pipeline is freed
+    before a classifier that passes is returned.
+    """
+    backend = bert_backend if backend is None else backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown BERT backend {backend!r}; expected one of {', '.join(BACKENDS)}")
+    if backend == 'torch':
+        return load_torch(model_name)
+    if backend == 'int8':
+        classifier = load_int8(model_name)
+    else:
+        classifier = load_onnx(model_name, quantized=backend == 'onnx-int8')
+    if not bert_min_agreement:
+        return classifier
+    reference = load_torch(model_name)
+    agreed = agreement(reference, classifier)
+    if agreed < bert_min_agreement:
+        logging.warning(
+            f"{backend} labels {agreed:.0%} of the sample reviews like the PyTorch pipeline "
+            f"(BERT_MIN_AGREEMENT={bert_min_agreement:g}); using the pipeline for {model_name}"
+        )
+        return reference
+    logging.info(f"{backend} agrees with the PyTorch pipeline on {agreed:.0%} of the sample reviews")
+    del reference
+    gc.collect()
+    return classifier
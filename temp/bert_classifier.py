@@ -2,24 +2,59 @@
 Ossified BERT classifier runner that uses the shared sentiment_core library.
 """
 import argparse
-import time
 import logging
+import time
 
-import psycopg2
-from transformers import pipeline
-
-from sentiment_core.config import db_params, batch_size
+from sentiment_core.config import bert_batch_size, bert_length_buckets
+from sentiment_core.inference_cache import InferenceCache
+from sentiment_core.model_registry import ModelRegistry
 from sentiment_core.parsers import parse_sentiment
-from sentiment_core.db_helpers import (
-    get_least_used_model_prompt_dataset,
-    fetch_batch,
-    update_prediction,
-    revert_batch_status,
-    decrement_count,
-)
+from sentiment_core.worker import run_worker
+from sentiment_core.zero_shot import classify_by_length, load_zero_shot
+
+def load_pipeline(model_name):
+    """
+    Build the zero-shot classifier for a Models row's name on the BERT_BACKEND backend.
+    """
+    return load_zero_shot(model_name)
+
+# Pipelines stay loaded across jobs within MODEL_CACHE_MB
+models = ModelRegistry(load_pipeline)
+# Inputs already classified by the same model and labels, in any job, are not run again
+cache = InferenceCache()
+
+def classify(job, rows):
+    """
+    Run BERT zero-shot classification on a claimed batch with one pipeline call.
 
-# Initialize BERT zero-shot classification pipeline once
-bert_pipeline = pipeline("zero-shot-classification", model="facebook/bart-large-mnli")
+    The pipeline runs its forward passes over bert_batch_size sequence-label
+    pairs at a time, over rows of similar token length unless
+    BERT_LENGTH_BUCKETS=0; each row's prediction time is its share of the call.
+    Formatted prompts found in the inference cache skip the pipeline.
+    """
+    labels = ['positive', 'negative', 'neutral']
+    if job.dataset_id == 2:
+        labels = ['positive', 'negative']
+    if not rows:
+        return
+
+    def run_pipeline(prompts):
+        bert_pipeline = models.get(job.model_name)
+        start_time = time.time()
+        if bert_length_buckets:
+            responses = classify_by_length(bert_pipeline, prompts, labels, bert_batch_size)
+        else:
+            responses = bert_pipeline(prompts, labels, batch_size=bert_batch_size)
+        duration = (time.time() - start_time) / len(prompts)
+        # A single sequence comes back as a bare result
+        if isinstance(responses, dict):
+            responses = [responses]
+        return [(parse_sentiment(resp['labels'][0]), duration) for resp in responses]
+
+    prompts = [job.prompt_text.format(content=content) for _, content in rows]
+    results = cache.classify(job.model_name, labels, prompts, run_pipeline)
+    for (row_id, content), (prediction, duration) in zip(rows, results):
+        yield row_id, prediction, duration, content
 
 def main():
     parser = argparse.ArgumentParser(description="Run BERT sentiment classification workflow")
@@ -28,50 +63,9 @@ def main():
     )
     args = parser.parse_args()
 
-    exclude_prompt_ids = []
-    while True:
-        # Acquire next model-prompt-dataset for BERT
-        model_info = get_least_used_model_prompt_dataset('bert', exclude_prompt_ids)
-        if model_info is None:
-            print("No available model-prompt-dataset combination found.")
-            break
-
-        model_id, prompt_id, dataset_id, model_name, prompt_text, dataset_name, _ = model_info
-        print(f"Using model: {model_name} with prompt: {prompt_text} on dataset: {dataset_name}")
-
-        # Fetch and process one batch
-        rows = fetch_batch(model_id, prompt_id, dataset_id)
-        if not rows:
-            decrement_count(model_id, prompt_id, dataset_id)
-            if args.once:
-                break
-            continue
-
-        try:
-            for row_id, content in rows:
-                start_time = time.time()
-                labels = ['positive', 'negative', 'neutral']
-                if dataset_id == 2:
-                    labels = ['positive', 'negative']
-                # Run BERT zero-shot classification
-                resp = bert_pipeline(prompt_text.format(content=content), labels)
-                sentiment = parse_sentiment(resp['labels'][0])
-                duration = time.time() - start_time
-                update_prediction(row_id, model_id, prompt_id, dataset_id, sentiment, duration, content)
-                logging.info(f"Processed row {row_id} with model {model_name}")
-                if args.once:
-                    return
-        except Exception as e:
-            logging.error(f"Error occurred: {e}. Reverting batch status.")
-            revert_batch_status(rows, model_id, prompt_id, dataset_id)
-            if args.once:
-                return
-
-        # After batch, decrement count and exclude this prompt
-        decrement_count(model_id, prompt_id, dataset_id)
-        exclude_prompt_ids.append(prompt_id)
-        if args.once:
-            break
+    run_worker('bert', classify, once=args.once)
+    logging.info(f"Model registry stats: {models.stats()}")
+    logging.info(f"Inference cache stats: {cache.stats()}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
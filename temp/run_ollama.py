@@ -3,22 +3,25 @@ Ollama sentiment classification runner using shared sentiment_core library.
 """
 import argparse
 import time
-import logging
 import subprocess
 import requests
 
-import psycopg2
 from ollama import chat
 
-from sentiment_core.config import db_params, batch_size
 from sentiment_core.parsers import parse_sentiment
-from sentiment_core.db_helpers import (
-    get_least_used_model_prompt_dataset,
-    fetch_batch,
-    update_prediction,
-    revert_batch_status,
-    decrement_count,
-)
+from sentiment_core.worker import run_worker
+
+def classify(job, rows):
+    """
+    Ask the local Ollama service for the sentiment of each claimed row.
+    """
+    for row_id, content in rows:
+        start_time = time.time()
+        formatted = job.prompt_text.format(content=content)
+        resp = chat(job.model_name, [{'role': 'user', 'content': formatted}])
+        sentiment = parse_sentiment(resp['message']['content'])
+        duration = time.time() - start_time
+        yield row_id, sentiment, duration, formatted
 
 def main():
     parser = argparse.ArgumentParser(description="Run Ollama sentiment classification workflow")
@@ -42,44 +45,7 @@ def main():
     else:
         raise RuntimeError("Ollama service did not start in time")
 
-    exclude_prompt_ids = []
-    while True:
-        model_info = get_least_used_model_prompt_dataset('ollama', exclude_prompt_ids)
-        if model_info is None:
-            print('No available model-prompt-dataset combination found.')
-            break
-
-        model_id, prompt_id, dataset_id, model_name, prompt_text, dataset_name, _ = model_info
-        print(f"Using model: {model_name} with prompt: {prompt_text} on dataset: {dataset_name}")
-
-        rows = fetch_batch(model_id, prompt_id, dataset_id)
-        if not rows:
-            decrement_count(model_id, prompt_id, dataset_id)
-            if args.once:
-                break
-            continue
-
-        try:
-            for row_id, content in rows:
-                start_time = time.time()
-                formatted = prompt_text.format(content=content)
-                resp = chat(model_name, [{'role': 'user', 'content': formatted}])
-                sentiment = parse_sentiment(resp['message']['content'])
-                duration = time.time() - start_time
-                update_prediction(row_id, model_id, prompt_id, dataset_id, sentiment, duration, formatted)
-                logging.info(f"Processed row {row_id} with model {model_name}")
-                if args.once:
-                    return
-        except Exception as e:
-            logging.error(f"Error occurred: {e}. Reverting batch status.")
-            revert_batch_status(rows, model_id, prompt_id, dataset_id)
-            if args.once:
-                return
-
-        decrement_count(model_id, prompt_id, dataset_id)
-        exclude_prompt_ids.append(prompt_id)
-        if args.once:
-            break
+    run_worker('ollama', classify, once=args.once)
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,6 +1,16 @@
 import os
+import re
+import sys
 import pytest
 
+# Ensure project root is on PYTHONPATH for db_setup import
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+try:
+    from testcontainers.postgres import PostgresContainer
+except ImportError:
+    PostgresContainer = None
+
 def pytest_configure(config):
     # Ensure DB env vars exist early for config import
     os.environ.setdefault('DB_NAME', 'testdb')
@@ -17,4 +27,74 @@ def set_env_db_vars(monkeypatch):
     monkeypatch.setenv('DB_PASSWORD', os.environ['DB_PASSWORD'])
     monkeypatch.setenv('DB_HOST', os.environ['DB_HOST'])
     monkeypatch.setenv('DB_PORT', os.environ['DB_PORT'])
-    yield
\ No newline at end of file
+    yield
+
+@pytest.fixture(scope="session")
+def pg_engine():
+    if PostgresContainer is None:
+        pytest.skip("testcontainers not available")
+    from sqlalchemy import create_engine
+    from db_setup import create_schema
+    with PostgresContainer("postgres:15-alpine") as pg:
+        engine = create_engine(pg.get_connection_url())
+        with engine.begin() as conn:
+            create_schema(conn)
+        yield engine
+        engine.dispose()
+
+@pytest.fixture
+def pg_pool(pg_engine):
+    """
+    Point the process-wide sentiment_core pool at the test database.
+    """
+    from sentiment_core import pool
+    url = pg_engine.url
+    params = url.translate_connect_args(database='dbname', username='user')
+    params.update(url.query)
+    pool.close_pool()
+    pool._pool = pool.ConnectionPool(params, min_size=1, max_size=16)
+    yield pool._pool
+    pool.close_pool()
+
+@pytest.fixture
+def seeded_job(pg_engine):
+    """
+    Seed one job with 200 pending rows on empty operational tables.
+    """
+    from sqlalchemy import text
+    truncate = text(
+        "TRUNCATE TABLE predictionstatus, workunits, predictions, modelpromptstatus, jobprogress, jobsummary, rows, status_update_log RESTART IDENTITY CASCADE"
+    )
+    with pg_engine.begin() as conn:
+        conn.execute(truncate)
+        conn.execute(text(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT g, 5, 'review ' || g, 'positive' FROM generate_series(1, 200) g"
+        ))
+        conn.execute(text(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status)"
+            " VALUES (1, 2, 5, 'available')"
+        ))
+    yield (1, 2, 5)
+    with pg_engine.begin() as conn:
+        conn.execute(truncate)
+
+@pytest.fixture
+def plan_indexes():
+    """
+    Return a function giving the indexes an EXPLAIN plan uses.
+
+    Indexes of partitions are reported as the partitioned index they belong to.
+    """
+    from sqlalchemy import text
+    scan = re.compile(r'(?:using|Bitmap Index Scan on) (\S+)')
+    def resolve(conn, plan):
+        names = {m.group(1) for line in plan for m in scan.finditer(line)}
+        return {
+            conn.execute(
+                text("SELECT COALESCE(pg_partition_root(CAST(:name AS regclass)), CAST(:name AS regclass))::text"),
+                {'name': name},
+            ).scalar_one()
+            for name in names
+        }
+    return resolve
@@ -0,0 +1,77 @@
+import psycopg2
+import pytest
+from sqlalchemy import text
+
+from sentiment_core.archiving import archive_jobs
+from sentiment_core.db_helpers import (
+    archive_job_chunk,
+    claim_batch,
+    get_archivable_jobs,
+    get_job_metrics,
+    get_job_progress,
+    write_predictions,
+)
+
+TRUNCATE = text(
+    "TRUNCATE TABLE predictionstatus, workunits, predictions, modelpromptstatus, jobprogress, jobsummary, rows, status_update_log RESTART IDENTITY CASCADE"
+)
+FINISHED, RUNNING, UNITS = (1, 2, 12), (3, 2, 12), (4, 2, 12)
+
+@pytest.fixture
+def jobs(pg_engine, pg_pool):
+    """
+    Three jobs on one 30-row dataset: one predicted completely, one with ten rows to go, and one in work units.
+    """
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+        conn.execute(text(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT g, 12, 'review ' || g, 'positive' FROM generate_series(1, 30) g"
+        ))
+        conn.execute(text(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status, unit_size)"
+            " VALUES (1, 2, 12, 'available', NULL), (3, 2, 12, 'available', NULL), (4, 2, 12, 'available', 10)"
+        ))
+    for job, n_rows in ((FINISHED, 30), (RUNNING, 20), (UNITS, 30)):
+        rows = claim_batch(*job, limit=n_rows)
+        write_predictions([(row_id, *job, 'positive', 0.1, content) for row_id, content in rows])
+    yield
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+
+def status_rows(pg_engine, job):
+    with pg_engine.connect() as conn:
+        return conn.execute(text(
+            "SELECT COUNT(*) FROM predictionstatus WHERE model_id = :m AND prompt_id = :p AND dataset_id = :d"
+        ), dict(zip('mpd', job))).scalar_one()
+
+def test_only_finished_jobs_are_archivable(jobs):
+    assert get_archivable_jobs() == [FINISHED, UNITS]
+
+def test_archiving_runs_in_chunks_and_keeps_predictions(pg_engine, jobs):
+    assert [archive_job_chunk(*FINISHED, chunk_size=12) for _ in range(4)] == [12, 12, 6, 0]
+    assert status_rows(pg_engine, FINISHED) == 0
+    assert status_rows(pg_engine, RUNNING) == 30
+    assert get_job_progress(*FINISHED) == (30, 30, 0)
+    assert get_job_metrics(*FINISHED)['predictions'] == 30
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM predictions WHERE model_id = 1")).scalar_one() == 30
+        assert conn.execute(text("SELECT archived FROM jobprogress WHERE model_id = 1")).scalar_one()
+    assert get_archivable_jobs() == [UNITS]
+
+def test_work_unit_jobs_drop_their_units(pg_engine, jobs):
+    assert archive_jobs(chunk_size=12) == 30
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM workunits")).scalar_one() == 0
+    assert get_archivable_jobs() == []
+
+def test_unfinished_job_is_refused(pg_engine, jobs):
+    with pytest.raises(psycopg2.errors.ObjectNotInPrerequisiteState):
+        archive_job_chunk(*RUNNING)
+    assert status_rows(pg_engine, RUNNING) == 30
+    # Workers carry on with the job and it becomes archivable once done
+    rows = claim_batch(*RUNNING, limit=30)
+    assert len(rows) == 10
+    write_predictions([(row_id, *RUNNING, 'negative', 0.1, content) for row_id, content in rows])
+    assert archive_jobs(jobs=[RUNNING]) == 30
+    assert status_rows(pg_engine, RUNNING) == 0
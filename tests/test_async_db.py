@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from sqlalchemy import text
+
+pytest.importorskip('psycopg')
+
+import sentiment_core.db_helpers as dbh
+from sentiment_core import async_db
+
+def run(pg_engine, test):
+    """
+    Run the coroutine function test on a fresh event loop, with the async pool on the test database.
+    """
+    url = pg_engine.url
+    params = url.translate_connect_args(database='dbname', username='user')
+    params.update(url.query)
+
+    async def main():
+        async_db._pool = async_db.AsyncConnectionPool(params, max_size=4)
+        try:
+            return await test()
+        finally:
+            await async_db.close_async_pool()
+    return asyncio.run(main())
+
+@pytest.fixture
+def catalog(pg_engine, monkeypatch):
+    monkeypatch.setattr(dbh, '_catalogs', {})
+    with pg_engine.begin() as conn:
+        conn.execute(text("INSERT INTO models (model_id, name, source, library) VALUES (1, 'bart', 'hf', 'bert')"))
+        conn.execute(text("INSERT INTO prompts (prompt_id, text) VALUES (2, 'b {content}')"))
+        conn.execute(text("INSERT INTO datasets (dataset_id, name) VALUES (5, 'reviews')"))
+    yield
+    with pg_engine.begin() as conn:
+        conn.execute(text("TRUNCATE TABLE models, prompts, datasets RESTART IDENTITY CASCADE"))
+
+def test_queue_calls_match_db_helpers(pg_engine, pg_pool, seeded_job, catalog):
+    async def test():
+        job = await async_db.get_least_used_model_prompt_dataset('bert', exclude_prompt_ids=[7])
+        assert job == (1, 2, 5, 'bart', 'b {content}', 'reviews', 0)
+        first, second = await asyncio.gather(
+            async_db.claim_batch(*seeded_job, limit=25), async_db.claim_batch(*seeded_job, limit=25),
+        )
+        assert len(first) == len(second) == 25
+        assert not {row_id for row_id, _ in first} & {row_id for row_id, _ in second}
+        await async_db.write_predictions([
+            (row_id, *seeded_job, 'Positive', 0.1, f'Prompt {content}') for row_id, content in first
+        ])
+        await async_db.revert_batch_status(second, *seeded_job)
+        await async_db.decrement_count(*seeded_job)
+        return await async_db.get_job_progress(*seeded_job), await async_db.get_job_status(*seeded_job)
+    assert run(pg_engine, test) == ((200, 25, 0), 'in_use')
+    assert dbh.get_job_progress(*seeded_job) == (200, 25, 0)
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT count FROM modelpromptstatus")).scalar_one() == 0
+        assert conn.execute(text(
+            "SELECT COUNT(*) FROM predictionstatus WHERE status = 'pending'"
+        )).scalar_one() == 175
+
+def test_write_and_claim_runs_the_worker_step(pg_engine, pg_pool, seeded_job):
+    async def test():
+        rows = await async_db.claim_batch(*seeded_job, limit=150)
+        written = [(row_id, *seeded_job, 'positive', 0.1, content) for row_id, content in rows]
+        status, rows = await async_db.write_and_claim(written, *seeded_job, limit=100)
+        assert (status, len(rows)) == ('available', 50)
+        # The last write completes the job, so nothing is claimed after it
+        written = [(row_id, *seeded_job, 'negative', 0.1, content) for row_id, content in rows]
+        return await async_db.write_and_claim(written, *seeded_job, limit=100)
+    assert run(pg_engine, test) == ('stop', [])
+    assert dbh.get_job_progress(*seeded_job) == (200, 200, 0)
+
+def test_write_and_claim_releases_rows_of_a_stopped_job(pg_engine, pg_pool, seeded_job):
+    with pg_engine.begin() as conn:
+        conn.execute(text("UPDATE modelpromptstatus SET status = 'stop'"))
+
+    async def test():
+        return await async_db.write_and_claim([], *seeded_job, limit=100)
+    assert run(pg_engine, test) == ('stop', [])
+    with pg_engine.connect() as conn:
+        assert conn.execute(text(
+            "SELECT COUNT(*) FROM predictionstatus WHERE status = 'pending'"
+        )).scalar_one() == 200
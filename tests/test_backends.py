@@ -0,0 +1,204 @@
+import sqlite3
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from sentiment_core import backends, worker
+from sentiment_core.inference_cache import InferenceCache, cache_key
+import sentiment_core.db_helpers as dbh
+
+TRUNCATE = text(
+    "TRUNCATE TABLE models, prompts, datasets, predictionstatus, workunits, predictions, modelpromptstatus,"
+    " jobprogress, jobsummary, rows, status_update_log, inference_cache RESTART IDENTITY CASCADE"
+)
+
+@pytest.fixture(params=['postgres', 'sqlite'])
+def store(request, tmp_path, monkeypatch):
+    """
+    A backend plus sql(statement, params) on the database behind it; the
+    same statements run on both, with :name parameters.
+    """
+    if request.param == 'postgres':
+        pg_engine = request.getfixturevalue('pg_engine')
+        request.getfixturevalue('pg_pool')
+        monkeypatch.setattr(dbh, '_catalogs', {})
+        with pg_engine.begin() as conn:
+            conn.execute(TRUNCATE)
+
+        def sql(statement, params=None):
+            with pg_engine.begin() as conn:
+                result = conn.execute(text(statement), params or {})
+                return result.fetchall() if result.returns_rows else None
+        backend = backends.PostgresBackend()
+    else:
+        backend = backends.SQLiteBackend(str(tmp_path / 'queue.sqlite3'))
+
+        def sql(statement, params=None):
+            conn = backend.connect()
+            if isinstance(params, list):
+                conn.executemany(statement, params)
+                return None
+            return conn.execute(statement, params or {}).fetchall()
+    previous = backends.set_backend(backend)
+    yield backend, sql
+    backends.set_backend(previous)
+    backend.close()
+    if request.param == 'postgres':
+        with pg_engine.begin() as conn:
+            conn.execute(TRUNCATE)
+
+def add_job(store, n_rows, model_id=1, prompt_id=2, dataset_id=9):
+    backend, sql = store
+    if n_rows:
+        sql(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " VALUES (:row_id, :dataset_id, :content, 'positive')",
+            [{"row_id": g, "dataset_id": dataset_id, "content": f'review {g}'} for g in range(1, n_rows + 1)],
+        )
+    backend.register_job(model_id, prompt_id, dataset_id)
+    return model_id, prompt_id, dataset_id
+
+def test_claims_are_not_shared_between_threads(store):
+    backend, _ = store
+    job = add_job(store, 300)
+    claimed = []
+
+    def claimer():
+        while rows := backend.claim_batch(*job, limit=7):
+            claimed.extend(rows)
+    threads = [threading.Thread(target=claimer) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(claimed) == [(g, f'review {g}') for g in range(1, 301)]
+
+def test_writes_count_progress_and_stop_the_finished_job(store):
+    backend, sql = store
+    job = add_job(store, 50)
+    rows = backend.claim_batch(*job, limit=50)
+    backend.write_predictions([
+        (row_id, *job, ' Unknown' if row_id % 10 == 0 else 'POSITIVE', 0.1, f'Prompt: {content}')
+        for row_id, content in rows
+    ])
+    assert backend.get_job_progress(*job) == (50, 45, 5)
+    assert backend.get_job_status(*job) == 'stop'
+    assert sql("SELECT COUNT(*) FROM status_update_log")[0][0] == 1
+    assert sql("SELECT prediction, formatted_prompt FROM predictions WHERE row_id = 3") == [
+        ('positive', 'prompt: review 3'),
+    ]
+    assert sql("SELECT COUNT(*) FROM predictionstatus WHERE status = 'done'")[0][0] == 50
+
+def test_reverted_and_expired_rows_are_claimable_again(store):
+    backend, _ = store
+    job = add_job(store, 20)
+    backend.claim_batch(*job, limit=10, lease_seconds=-1)
+    reverted = backend.claim_batch(*job, limit=5)
+    assert backend.claim_batch(*job, limit=10) == [(g, f'review {g}') for g in range(16, 21)]
+    backend.revert_batch_status(reverted, *job)
+    assert backend.reclaim_expired_leases() == 10
+    assert len(backend.claim_batch(*job, limit=20)) == 15
+
+def test_stale_writes_after_a_reclaim_are_skipped(store):
+    backend, sql = store
+    job = add_job(store, 20)
+    stale = sorted(backend.claim_batch(*job, limit=20, lease_seconds=-1))[:5]
+    assert backend.reclaim_expired_leases() == 20
+    fresh = [row for row in backend.claim_batch(*job, limit=20) if row in stale]
+    assert backend.write_predictions([(row_id, *job, 'positive', 0.1, content) for row_id, content in fresh]) == 5
+    assert backend.write_predictions([(row_id, *job, 'negative', 0.1, content) for row_id, content in stale]) == 0
+    assert sql("SELECT prediction, COUNT(*) FROM predictions GROUP BY prediction") == [('positive', 5)]
+    assert backend.get_job_progress(*job) == (20, 5, 0)
+
+def test_acquisition_respects_library_and_exclusions(store):
+    backend, sql = store
+    sql("INSERT INTO models (model_id, name, source, library) VALUES (1, 'bart', 'hf', 'bert')")
+    sql("INSERT INTO models (model_id, name, source, library) VALUES (3, 'gpt', 'openai', 'openai')")
+    sql("INSERT INTO prompts (prompt_id, text) VALUES (1, 'a {content}')")
+    sql("INSERT INTO prompts (prompt_id, text) VALUES (2, 'b {content}')")
+    sql("INSERT INTO datasets (dataset_id, name) VALUES (9, 'reviews')")
+    for model_id, prompt_id in ((1, 1), (1, 2), (3, 1)):
+        add_job(store, 0, model_id, prompt_id)
+
+    assert backend.get_least_used_model_prompt_dataset('bert', [1]) == (1, 2, 9, 'bart', 'b {content}', 'reviews', 0)
+    assert backend.get_least_used_model_prompt_dataset('bert', [1])[-1] == 1
+    assert backend.get_least_used_model_prompt_dataset('bert')[:2] == (1, 1)
+    assert backend.get_least_used_model_prompt_dataset('ollama') is None
+    backend.decrement_count(1, 2, 9)
+    assert sql("SELECT status, count FROM modelpromptstatus WHERE model_id = 1 AND prompt_id = 2") == [('in_use', 1)]
+    assert backend.get_job_status(1, 2, 9) == 'in_use'
+    assert backend.get_job_status(5, 5, 5) is None
+
+def test_large_jobs_are_seeded_in_chunks(store):
+    backend, _ = store
+    job = add_job(store, 2500)
+    assert backend.get_job_progress(*job) == (1000, 0, 0)
+    assert backend.seed_job_chunk(*job, chunk_size=1000) == 1000
+    assert backend.seed_job_chunk(*job, chunk_size=1000) == 500
+    assert backend.seed_job_chunk(*job, chunk_size=1000) == 0
+    assert backend.get_job_progress(*job) == (2500, 0, 0)
+    assert len(backend.claim_batch(*job, limit=3000)) == 2500
+
+def test_worker_runs_a_job_to_completion(store, monkeypatch):
+    backend, sql = store
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    sql("INSERT INTO models (model_id, name, source, library) VALUES (1, 'bart', 'hf', 'bert')")
+    sql("INSERT INTO prompts (prompt_id, text) VALUES (2, 'b {content}')")
+    sql("INSERT INTO datasets (dataset_id, name) VALUES (9, 'reviews')")
+    job = add_job(store, 120)
+
+    def classify(job, rows):
+        for row_id, content in rows:
+            yield row_id, 'positive', 0.01, job.prompt_text.format(content=content)
+    worker.run_worker('bert', classify)
+    assert backend.get_job_progress(*job) == (120, 120, 0)
+    assert backend.get_job_status(*job) == 'stop'
+    assert sql("SELECT COUNT(*) FROM predictions")[0][0] == 120
+
+def test_inference_cache_is_shared_through_the_backend(store):
+    backend, sql = store
+    labels = ['positive', 'negative']
+    keys = [cache_key('bart', labels, text) for text in ('good', 'bad')]
+    assert backend.get_cached_predictions(keys) == {}
+    backend.cache_predictions([(keys[0], 'bart', 'positive', 0.25)])
+    # An existing entry is kept
+    backend.cache_predictions([(keys[0], 'bart', 'negative', 0.5), (keys[1], 'bart', 'negative', 0.5)])
+    assert backend.get_cached_predictions(keys) == {keys[0]: ('positive', 0.25), keys[1]: ('negative', 0.5)}
+
+    # A second worker's cache finds what the first computed
+    computed = []
+    def compute(texts):
+        computed.extend(texts)
+        return [('neutral', 0.75) for _ in texts]
+    results = InferenceCache(enabled=True).classify('bart', labels, ['bad', 'meh', 'good'], compute)
+    assert [prediction for prediction, _ in results] == ['negative', 'neutral', 'positive']
+    assert results[1] == ('neutral', 0.75)
+    assert computed == ['meh']
+    assert sql("SELECT COUNT(*) FROM inference_cache")[0][0] == 3
+
+def test_failed_writes_return_rows_to_pending(tmp_path):
+    backend = backends.SQLiteBackend(str(tmp_path / 'queue.sqlite3'))
+    previous = backends.set_backend(backend)
+    try:
+        job = add_job((backend, backend.connect().executemany), 5)
+        rows = backend.claim_batch(*job, limit=5)
+
+        def failing_write(batch):
+            raise sqlite3.OperationalError('disk I/O error')
+        # A failed flush reverts through the selected backend, not PostgreSQL
+        with worker.PredictionWriter(failing_write, worker.revert_batch_status, flush_interval=60) as writer:
+            for row_id, content in rows:
+                writer.submit((row_id, *job, 'positive', 0.1, content))
+        assert writer.stats()['failed'] == 5
+        assert backend.claim_batch(*job, limit=5) == rows
+    finally:
+        backends.set_backend(previous)
+        backend.close()
+
+def test_incomplete_backends_cannot_be_instantiated():
+    class ClaimOnly(backends.StorageBackend):
+        def claim_batch(self, model_id, prompt_id, dataset_id, limit=None, lease_seconds=None):
+            return []
+    with pytest.raises(TypeError):
+        ClaimOnly()
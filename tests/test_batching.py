@@ -0,0 +1,36 @@
+from sentiment_core.batching import BatchSizeController
+
+
+def test_grows_when_claims_dominate_fast_inference():
+    sizer = BatchSizeController(5, min_size=1, max_size=64, lease_seconds=300)
+    sizes = [sizer.observe(sizer.size, 0.001 * sizer.size, 0.01) for _ in range(10)]
+    # Doubles at most per batch until the upper bound
+    assert sizes[:3] == [10, 20, 40]
+    assert sizes[-1] == 64
+
+def test_shrinks_to_finish_within_lease():
+    sizer = BatchSizeController(50, min_size=1, max_size=100, lease_seconds=60)
+    for _ in range(10):
+        sizer.observe(sizer.size, 5.0 * sizer.size, 10.0)
+    # A slow claim wants 20 rows, but at 5s per row half of a 60s lease fits six
+    assert sizer.size == 6
+
+def test_slow_inference_needs_no_amortisation():
+    sizer = BatchSizeController(16, min_size=1, max_size=100, lease_seconds=600)
+    for _ in range(10):
+        sizer.observe(sizer.size, 2.0 * sizer.size, 0.01)
+    assert sizer.size == 1
+
+def test_respects_lower_bound_and_fixed_mode():
+    sizer = BatchSizeController(4, min_size=2, max_size=8, lease_seconds=1)
+    for _ in range(5):
+        sizer.observe(sizer.size, 10.0 * sizer.size, 0.01)
+    assert sizer.size == 2
+    fixed = BatchSizeController(5, min_size=5, max_size=5)
+    assert fixed.observe(5, 0.001, 1.0) == 5
+    assert fixed.stats()['adjustments'] == 0
+
+def test_ignores_empty_batches():
+    sizer = BatchSizeController(5)
+    assert sizer.observe(0, 0.0, 0.5) == 5
+    assert sizer.stats()['row_seconds'] is None
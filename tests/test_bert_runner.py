@@ -1,3 +1,4 @@
+import importlib.util
 import sys
 import os
 import types
@@ -13,33 +14,149 @@ root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 # Ensure project root is on path for sentiment_core import
 sys.path.insert(0, root_dir)
 # Add temp directory to path to import runner module
-sys.path.insert(1, os.path.abspath(os.path.join(root_dir, 'temp')))
+sys.path.insert(0, os.path.abspath(os.path.join(root_dir, 'temp')))
 import bert_classifier
+from sentiment_core import worker
+from sentiment_core.inference_cache import InferenceCache
+from sentiment_core.model_registry import ModelRegistry
+
+def memory_cache():
+    """An InferenceCache kept in a dict instead of the database."""
+    cached = {}
+    return InferenceCache(
+        lookup=lambda keys: {key: cached[key] for key in keys if key in cached},
+        store=lambda entries: cached.update((key, (prediction, t)) for key, _, prediction, t in entries),
+        enabled=True,
+    )
 
 def test_bert_runner_once(monkeypatch):
     # Stub BERT pipeline to always return 'positive'
     class FakePipeline:
-        def __call__(self, prompt, labels):
-            return {'labels': ['positive']}
-    monkeypatch.setattr(bert_classifier, 'bert_pipeline', FakePipeline())
+        def __call__(self, prompts, labels, batch_size=None):
+            return [{'labels': ['positive']} for _ in prompts]
+    loaded = []
+    def load(name):
+        loaded.append(name)
+        return FakePipeline()
+    monkeypatch.setattr(bert_classifier, 'models', ModelRegistry(load))
+    monkeypatch.setattr(bert_classifier, 'cache', memory_cache())
 
-    # Stub DB helpers in runner module
+    # Stub DB helpers used by the shared worker loop
     monkeypatch.setattr(
-        bert_classifier,
+        worker,
         'get_least_used_model_prompt_dataset',
         lambda library, exclude: (1, 2, 3, 'bert_model', 'prompt {content}', 'dataset', 0)
     )
-    monkeypatch.setattr(bert_classifier, 'fetch_batch', lambda mid, pid, did: [(10, 'hello')])
-    # Capture update_prediction calls
+    monkeypatch.setattr(worker, 'claim_batch', lambda mid, pid, did, **kwargs: [(10, 'hello')])
+    # Capture rows passed to write_predictions
     calls = []
-    def fake_update(row_id, mid, pid, did, prediction, pred_time, formatted):
-        calls.append((row_id, mid, pid, did, prediction, formatted))
-    monkeypatch.setattr(bert_classifier, 'update_prediction', fake_update)
-    monkeypatch.setattr(bert_classifier, 'decrement_count', lambda *args, **kwargs: None)
-    monkeypatch.setattr(bert_classifier, 'revert_batch_status', lambda rows, *args, **kwargs: None)
+    def fake_write(batch):
+        for row_id, mid, pid, did, prediction, pred_time, formatted in batch:
+            calls.append((row_id, mid, pid, did, prediction, formatted))
+    monkeypatch.setattr(worker, 'write_predictions', fake_write)
+    monkeypatch.setattr(worker, 'decrement_count', lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, 'reclaim_expired_leases', lambda *args: 0)
+    monkeypatch.setattr(worker, 'seed_job_chunk', lambda *args: 0)
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    monkeypatch.setattr(worker, 'revert_batch_status', lambda rows, *args, **kwargs: None)
 
     # Run runner once
     sys.argv = ['bert_classifier.py', '--once']
     bert_classifier.main()
-    # Verify that update_prediction was called with expected values
-    assert calls == [(10, 1, 2, 3, 'positive', 'hello')]
\ No newline at end of file
+    # Verify that write_predictions received the expected values
+    assert calls == [(10, 1, 2, 3, 'positive', 'hello')]
+    # The pipeline is built for the job's model
+    assert loaded == ['bert_model']
+
+def test_classify_runs_one_pipeline_call_per_batch(monkeypatch):
+    calls = []
+    def fake_pipeline(prompts, labels, batch_size=None):
+        calls.append((prompts, labels, batch_size))
+        return [{'labels': [label]} for label in ('negative', 'positive', 'neutral')]
+    monkeypatch.setattr(bert_classifier, 'models', ModelRegistry(lambda name: fake_pipeline))
+    monkeypatch.setattr(bert_classifier, 'bert_batch_size', 8)
+    monkeypatch.setattr(bert_classifier, 'cache', memory_cache())
+    job = worker.Job(1, 2, 3, 'bert_model', 'review: {content}', 'dataset', 0)
+
+    results = list(bert_classifier.classify(job, [(1, 'bad'), (2, 'good'), (3, 'fine')]))
+    assert calls == [(['review: bad', 'review: good', 'review: fine'], ['positive', 'negative', 'neutral'], 8)]
+    assert [(row_id, prediction, content) for row_id, prediction, _, content in results] == [
+        (1, 'negative', 'bad'), (2, 'positive', 'good'), (3, 'neutral', 'fine'),
+    ]
+    # Rows share the batch's time equally
+    assert len({duration for _, _, duration, _ in results}) == 1
+
+def test_classify_skips_cached_prompts(monkeypatch):
+    calls = []
+    def fake_pipeline(prompts, labels, batch_size=None):
+        calls.append(prompts)
+        return [{'labels': ['negative' if 'bad' in prompt else 'positive']} for prompt in prompts]
+    monkeypatch.setattr(bert_classifier, 'models', ModelRegistry(lambda name: fake_pipeline))
+    monkeypatch.setattr(bert_classifier, 'cache', memory_cache())
+    job = worker.Job(1, 2, 3, 'bert_model', 'review: {content}', 'dataset', 0)
+    other_dataset = worker.Job(1, 2, 4, 'bert_model', 'review: {content}', 'dataset', 0)
+
+    list(bert_classifier.classify(job, [(1, 'bad'), (2, 'good')]))
+    results = list(bert_classifier.classify(other_dataset, [(7, 'good'), (8, 'good'), (9, 'new')]))
+    # Only the unseen prompt reaches the pipeline, once
+    assert calls == [['review: bad', 'review: good'], ['review: new']]
+    assert [prediction for _, prediction, _, _ in results] == ['positive', 'positive', 'positive']
+    stats = bert_classifier.cache.stats()
+    assert (stats['hits'], stats['misses'], stats['computed']) == (2, 3, 3)
+
+def test_classify_buckets_rows_by_length(monkeypatch):
+    calls = []
+    class FakeLengthPipeline:
+        def tokenizer(self, prompts, add_special_tokens=True):
+            return {'input_ids': [prompt.split() for prompt in prompts]}
+        def __call__(self, prompts, labels, batch_size=None):
+            calls.append(prompts)
+            return [{'labels': ['negative' if 'bad' in prompt else 'positive']} for prompt in prompts]
+    monkeypatch.setattr(bert_classifier, 'models', ModelRegistry(lambda name: FakeLengthPipeline()))
+    monkeypatch.setattr(bert_classifier, 'cache', memory_cache())
+    monkeypatch.setattr(bert_classifier, 'bert_length_buckets', True)
+    job = worker.Job(1, 2, 3, 'bert_model', 'review: {content}', 'dataset', 0)
+
+    rows = [(1, 'good but the strap is bad'), (2, 'bad'), (3, 'good value')]
+    results = list(bert_classifier.classify(job, rows))
+    assert calls == [['review: bad', 'review: good value', 'review: good but the strap is bad']]
+    # Predictions stay with their rows
+    assert [(row_id, prediction) for row_id, prediction, _, _ in results] == [(1, 'negative'), (2, 'negative'), (3, 'positive')]
+
+
+def test_root_runner_claims_through_the_shared_worker(monkeypatch):
+    # The bert_classifier.py the dockerfile runs, under its own module name
+    spec = importlib.util.spec_from_file_location('root_bert_classifier', os.path.join(root_dir, 'bert_classifier.py'))
+    root_bert = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(root_bert)
+    pipelines = []
+    def fake_pipeline(prompts, labels, batch_size=None):
+        pipelines.append(prompts)
+        return [{'labels': ['negative' if 'bad' in prompt else 'positive']} for prompt in prompts]
+    monkeypatch.setattr(root_bert, 'load_zero_shot', lambda name: fake_pipeline)
+    monkeypatch.setattr(root_bert, 'bert_length_buckets', False)
+    monkeypatch.setattr(root_bert, 'models', ModelRegistry(root_bert.Model))
+    monkeypatch.setattr(root_bert, 'cache', memory_cache())
+    jobs = iter([(1, 2, 3, 'bert_model', 'prompt {content}', 'dataset', 0)])
+    monkeypatch.setattr(worker, 'get_least_used_model_prompt_dataset', lambda library, exclude: next(jobs, None))
+    claims = []
+    batches = iter([[(10, 'good'), (11, 'bad')]])
+    def claim(mid, pid, did, **kwargs):
+        claims.append(kwargs)
+        return next(batches, [])
+    monkeypatch.setattr(worker, 'claim_batch', claim)
+    written = []
+    monkeypatch.setattr(worker, 'write_predictions', lambda batch: written.extend(batch) or len(batch))
+    monkeypatch.setattr(worker, 'decrement_count', lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, 'reclaim_expired_leases', lambda *args: 0)
+    monkeypatch.setattr(worker, 'seed_job_chunk', lambda *args: 0)
+    monkeypatch.setattr(worker, 'get_job_status', lambda *args: 'in_use')
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    root_bert.main()
+    # Claims carry a lease, so a crashed runner's rows are reclaimed
+    assert claims and all(claim['lease_seconds'] > 0 for claim in claims)
+    # The root runner classifies the review text alone
+    assert pipelines == [['good', 'bad']]
+    assert [(row_id, prediction, text) for row_id, _, _, _, prediction, _, text in written] == [
+        (10, 'positive', 'good'), (11, 'negative', 'bad'),
+    ]
@@ -0,0 +1,59 @@
+import threading
+
+from sqlalchemy import text
+
+from sentiment_core.db_helpers import claim_batch, reclaim_expired_leases
+
+
+def test_claim_batch_returns_content_and_marks_in_progress(pg_engine, pg_pool, seeded_job):
+    rows = claim_batch(*seeded_job, limit=7)
+    assert len(rows) == 7
+    assert all(content == f'review {row_id}' for row_id, content in rows)
+    with pg_engine.connect() as conn:
+        statuses = conn.execute(text(
+            "SELECT status, COUNT(*) FROM predictionstatus GROUP BY status"
+        )).fetchall()
+    assert dict(statuses) == {'in_progress': 7, 'pending': 193}
+
+def test_concurrent_claimers_never_share_rows(pg_pool, seeded_job):
+    claimed = []
+    lock = threading.Lock()
+
+    def claimer():
+        while True:
+            rows = claim_batch(*seeded_job, limit=5)
+            if not rows:
+                return
+            with lock:
+                claimed.extend(row_id for row_id, _ in rows)
+
+    threads = [threading.Thread(target=claimer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(claimed) == 200
+    assert sorted(claimed) == list(range(1, 201))
+
+def test_expired_leases_return_to_pending(pg_engine, pg_pool, seeded_job):
+    expired = claim_batch(*seeded_job, limit=3, lease_seconds=0)
+    live = claim_batch(*seeded_job, limit=2, lease_seconds=600)
+    assert reclaim_expired_leases() == 3
+    with pg_engine.connect() as conn:
+        in_progress = conn.execute(text(
+            "SELECT row_id FROM predictionstatus WHERE status = 'in_progress' ORDER BY row_id"
+        )).scalars().all()
+    assert in_progress == sorted(row_id for row_id, _ in live)
+    # Reclaimed rows can be claimed again
+    reclaimed_ids = {row_id for row_id, _ in expired}
+    again = {row_id for row_id, _ in claim_batch(*seeded_job, limit=200)}
+    assert reclaimed_ids <= again
+
+def test_lease_sweep_uses_partial_index(pg_engine, seeded_job, plan_indexes):
+    with pg_engine.connect() as conn:
+        conn.execute(text("SET enable_seqscan = off"))
+        plan = conn.execute(text(
+            "EXPLAIN SELECT 1 FROM predictionstatus"
+            " WHERE status = 'in_progress' AND lease_expires_at < CURRENT_TIMESTAMP"
+        )).scalars().all()
+        assert 'predictionstatus_lease_idx' in plan_indexes(conn, plan)
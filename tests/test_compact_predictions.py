@@ -0,0 +1,108 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from db_setup import compact_predictions, create_schema
+from sentiment_core import db_helpers, pool
+from sentiment_core.db_helpers import claim_batch, get_job_progress, write_predictions
+
+PROMPT = 'classify the sentiment of this review: {content}'
+
+@pytest.fixture
+def compact_engine(pg_engine):
+    """
+    A database of its own, since the conversion changes column types for good.
+    """
+    admin = pg_engine.execution_options(isolation_level='AUTOCOMMIT')
+    with admin.connect() as conn:
+        conn.execute(text("DROP DATABASE IF EXISTS compact_test"))
+        conn.execute(text("CREATE DATABASE compact_test"))
+    engine = create_engine(pg_engine.url.set(database='compact_test'))
+    with engine.begin() as conn:
+        create_schema(conn)
+        conn.execute(text(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT g, 3, 'review ' || g, 'positive' FROM generate_series(1, 40) g"
+        ))
+        conn.execute(text(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status)"
+            " VALUES (1, 2, 3, 'available'), (4, 2, 3, 'available')"
+        ))
+    yield engine
+    engine.dispose()
+    with admin.connect() as conn:
+        conn.execute(text("DROP DATABASE compact_test"))
+
+@pytest.fixture
+def compact_pool(compact_engine, monkeypatch):
+    url = compact_engine.url
+    params = url.translate_connect_args(database='dbname', username='user')
+    params.update(url.query)
+    pool.close_pool()
+    pool._pool = pool.ConnectionPool(params, min_size=1, max_size=4)
+    monkeypatch.setattr(db_helpers, 'compact_predictions', True)
+    yield pool._pool
+    pool.close_pool()
+
+def insert_legacy(conn, model_id, predictions):
+    """Insert predictions the way the legacy update_prediction does."""
+    for row_id, prediction in predictions:
+        conn.execute(text(
+            "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status, formatted_prompt)"
+            " VALUES (:row_id, :model_id, 2, 3, :prediction, 0.1, 'done', :prompt)"
+        ), {
+            "row_id": row_id, "model_id": model_id, "prediction": prediction,
+            "prompt": PROMPT.format(content=f'review {row_id}'),
+        })
+
+def expanded(conn):
+    return conn.execute(text(
+        "SELECT row_id, model_id, prediction::text, status::text, formatted_prompt"
+        " FROM predictions_expanded ORDER BY model_id, row_id"
+    )).fetchall()
+
+def test_conversion_keeps_predictions_and_prompts(compact_engine):
+    with compact_engine.begin() as conn:
+        insert_legacy(conn, 1, [(1, 'positive'), (2, 'negative'), (3, 'unknown')])
+        insert_legacy(conn, 4, [(1, 'neutral'), (2, 'positive')])
+        before = expanded(conn)
+        compact_predictions(conn)
+    with compact_engine.connect() as conn:
+        assert expanded(conn) == before
+        assert conn.execute(text("SELECT COUNT(*) FROM formatted_prompts")).scalar_one() == 3
+        assert conn.execute(text(
+            "SELECT COUNT(*) FROM predictions WHERE formatted_prompt IS NOT NULL"
+        )).scalar_one() == 0
+        types = dict(conn.execute(text(
+            "SELECT column_name, udt_name FROM information_schema.columns"
+            " WHERE table_name = 'predictions' AND column_name IN ('prediction', 'status')"
+        )).fetchall())
+    assert types == {'prediction': 'prediction_label', 'status': 'prediction_status'}
+
+def test_raw_model_output_needs_normalize(compact_engine):
+    with compact_engine.begin() as conn:
+        insert_legacy(conn, 1, [(1, 'positive'), (2, 'the review is negative.'), (3, 'no idea')])
+    with pytest.raises(ValueError, match='normalize'):
+        with compact_engine.begin() as conn:
+            compact_predictions(conn)
+    with compact_engine.begin() as conn:
+        compact_predictions(conn, normalize=True)
+    with compact_engine.connect() as conn:
+        labels = conn.execute(text("SELECT prediction::text FROM predictions ORDER BY row_id")).scalars().all()
+    assert labels == ['positive', 'negative', 'unknown']
+
+def test_compact_writes_store_each_prompt_once(compact_engine, compact_pool):
+    with compact_engine.begin() as conn:
+        compact_predictions(conn)
+    for model_id in (1, 4):
+        rows = claim_batch(model_id, 2, 3, limit=40)
+        write_predictions([
+            (row_id, model_id, 2, 3, 'unknown' if row_id == 1 else 'positive', 0.1, PROMPT.format(content=content))
+            for row_id, content in rows
+        ])
+    assert get_job_progress(1, 2, 3) == (40, 39, 1)
+    with compact_engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM formatted_prompts")).scalar_one() == 40
+        assert conn.execute(text(
+            "SELECT formatted_prompt FROM predictions_expanded WHERE model_id = 4 AND row_id = 7"
+        )).scalar_one() == PROMPT.format(content='review 7')
+        assert conn.execute(text("SELECT status FROM modelpromptstatus WHERE model_id = 1")).scalar_one() == 'stop'
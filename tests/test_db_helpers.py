@@ -1,6 +1,7 @@
 import pytest
 
 import sentiment_core.db_helpers as dbh
+from sentiment_core import pool
 
 class FakeCursor:
     def __init__(self, fetchone_result=None, fetchall_result=None):
@@ -18,47 +19,69 @@ class FakeCursor:
         pass
 
 class FakeConnection:
+    closed = 0
+    status = 1  # psycopg2.extensions.STATUS_READY
     def __init__(self, cursor):
         self._cursor = cursor
+        cursor.connection = self
         self.committed = False
     def cursor(self):
         return self._cursor
     def commit(self):
         self.committed = True
+    def rollback(self):
+        pass
     def close(self):
         pass
 
-def test_get_least_used_none(monkeypatch):
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    # Each test patches psycopg2.connect, so never reuse a pooled connection
+    pool.close_pool()
+    yield
+    pool.close_pool()
+
+@pytest.fixture
+def catalog(monkeypatch):
+    # Serve model/prompt/dataset names without touching the database
+    monkeypatch.setattr(
+        dbh, '_load_catalog',
+        lambda library, refresh=False: ({10: 'model'}, {20: 'text {content}'}, {30: 'dataset'}),
+    )
+
+def test_get_least_used_none(monkeypatch, catalog):
     # Simulate no available record
     fake_cursor = FakeCursor(fetchone_result=None)
     conn = FakeConnection(fake_cursor)
-    monkeypatch.setattr(dbh.psycopg2, 'connect', lambda **kwargs: conn)
+    monkeypatch.setattr(pool.psycopg2, 'connect', lambda **kwargs: conn)
     result = dbh.get_least_used_model_prompt_dataset('bert', exclude_prompt_ids=[1, 2])
     assert result is None
-    # Ensure we attempted to select one row
-    assert any('LIMIT 1' in sql for sql, _ in fake_cursor.executed)
+    # Ensure we attempted to claim one row without waiting on other workers
+    assert any('LIMIT 1' in sql and 'SKIP LOCKED' in sql for sql, _ in fake_cursor.executed)
 
-def test_get_least_used_success(monkeypatch):
-    # Simulate a returned record tuple including library
-    record = (10, 20, 30, 'model', 'text {content}', 'dataset', 5, 'bert')
-    fake_cursor = FakeCursor(fetchone_result=record)
+def test_get_least_used_success(monkeypatch, catalog):
+    # Simulate the acquired job ids and its count before the increment
+    fake_cursor = FakeCursor(fetchone_result=(10, 20, 30, 5))
     conn = FakeConnection(fake_cursor)
-    monkeypatch.setattr(dbh.psycopg2, 'connect', lambda **kwargs: conn)
+    monkeypatch.setattr(pool.psycopg2, 'connect', lambda **kwargs: conn)
     out = dbh.get_least_used_model_prompt_dataset('bert', exclude_prompt_ids=[2, 3])
-    # Should return all except the library field
-    assert out == record[:-1]
-    # Check lock, update, and unlock were executed
+    # Names come from the cached catalog
+    assert out == (10, 20, 30, 'model', 'text {content}', 'dataset', 5)
+    # Choose and increment in a single prepared statement, no advisory locks
     sqls = [sql for sql, _ in fake_cursor.executed]
-    assert any('pg_advisory_lock' in sql for sql in sqls)
-    assert any('UPDATE ModelPromptStatus' in sql for sql in sqls)
-    assert any('pg_advisory_unlock' in sql for sql in sqls)
+    assert len(sqls) == 2
+    assert sqls[0].startswith('PREPARE sc_acquire_least_used_skip_locked')
+    assert 'UPDATE ModelPromptStatus' in sqls[0]
+    assert sqls[1].startswith('EXECUTE sc_acquire_least_used_skip_locked')
+    assert not any('pg_advisory_lock' in sql for sql in sqls)
+    assert fake_cursor.executed[1][1] == ([10], [2, 3])
     assert conn.committed
 
 @pytest.mark.parametrize('rows', [[], [(1, 'a'), (2, 'b')]])
 def test_fetch_batch(monkeypatch, rows):
     fake_cursor = FakeCursor(fetchall_result=rows)
     conn = FakeConnection(fake_cursor)
-    monkeypatch.setattr(dbh.psycopg2, 'connect', lambda **kwargs: conn)
+    monkeypatch.setattr(pool.psycopg2, 'connect', lambda **kwargs: conn)
     out = dbh.fetch_batch(1, 2, 3)
     assert out == rows
     if rows:
@@ -68,7 +91,7 @@ def test_fetch_batch(monkeypatch, rows):
 def test_update_prediction(monkeypatch):
     fake_cursor = FakeCursor()
     conn = FakeConnection(fake_cursor)
-    monkeypatch.setattr(dbh.psycopg2, 'connect', lambda **kwargs: conn)
+    monkeypatch.setattr(pool.psycopg2, 'connect', lambda **kwargs: conn)
     # Call with sample data
     dbh.update_prediction(5, 6, 7, 8, 'PRED', 0.123, 'fmt')
     # Should INSERT into Predictions and UPDATE PredictionStatus
@@ -81,7 +104,7 @@ def test_revert_batch_status(monkeypatch):
     rows = [(9, 'x'), (10, 'y')]
     fake_cursor = FakeCursor()
     conn = FakeConnection(fake_cursor)
-    monkeypatch.setattr(dbh.psycopg2, 'connect', lambda **kwargs: conn)
+    monkeypatch.setattr(pool.psycopg2, 'connect', lambda **kwargs: conn)
     dbh.revert_batch_status(rows, 1, 2, 3)
     # Should set statuses back to pending
     assert any('UPDATE PredictionStatus' in sql for sql, _ in fake_cursor.executed)
@@ -90,11 +113,63 @@ def test_revert_batch_status(monkeypatch):
 def test_decrement_count(monkeypatch):
     fake_cursor = FakeCursor()
     conn = FakeConnection(fake_cursor)
-    monkeypatch.setattr(dbh.psycopg2, 'connect', lambda **kwargs: conn)
+    monkeypatch.setattr(pool.psycopg2, 'connect', lambda **kwargs: conn)
     dbh.decrement_count(11, 12, 13)
-    # Lock, update, and unlock
+    # A single row-locked update, no advisory lock
     sqls = [sql for sql, _ in fake_cursor.executed]
-    assert any('pg_advisory_lock' in sql for sql in sqls)
-    assert any('UPDATE ModelPromptStatus' in sql for sql in sqls)
-    assert any('pg_advisory_unlock' in sql for sql in sqls)
-    assert conn.committed
\ No newline at end of file
+    assert len(sqls) == 2
+    assert 'UPDATE ModelPromptStatus' in sqls[0]
+    assert sqls[1].startswith('EXECUTE sc_decrement_count')
+    assert conn.committed
+
+@pytest.mark.parametrize('record,expected', [(('stop',), 'stop'), (None, None)])
+def test_get_job_status(monkeypatch, record, expected):
+    fake_cursor = FakeCursor(fetchone_result=record)
+    conn = FakeConnection(fake_cursor)
+    monkeypatch.setattr(pool.psycopg2, 'connect', lambda **kwargs: conn)
+    assert dbh.get_job_status(1, 2, 3) == expected
+    assert any('SELECT status' in sql for sql, _ in fake_cursor.executed)
+
+def test_helpers_reuse_pooled_connection(monkeypatch):
+    opened = []
+    def fake_connect(**kwargs):
+        conn = FakeConnection(FakeCursor(fetchall_result=[]))
+        opened.append(conn)
+        return conn
+    monkeypatch.setattr(pool.psycopg2, 'connect', fake_connect)
+    for _ in range(3):
+        dbh.fetch_batch(1, 2, 3)
+        dbh.decrement_count(1, 2, 3)
+    # Six helper calls share one long-lived connection
+    assert len(opened) == 1
+    assert pool.pool_stats()['checkouts'] == 6
+
+def test_statements_are_prepared_once_per_connection(monkeypatch):
+    opened = []
+    def fake_connect(**kwargs):
+        conn = FakeConnection(FakeCursor(fetchall_result=[]))
+        opened.append(conn)
+        return conn
+    monkeypatch.setattr(pool.psycopg2, 'connect', fake_connect)
+    for _ in range(3):
+        dbh.fetch_batch(1, 2, 3)
+    sqls = [sql for sql, _ in opened[0]._cursor.executed]
+    assert sum(sql.startswith('PREPARE sc_claim_batch') for sql in sqls) == 1
+    assert sum(sql.startswith('EXECUTE sc_claim_batch') for sql in sqls) == 3
+
+    # A connection replaced after a reconnect prepares its statements again
+    pool.close_pool()
+    dbh.fetch_batch(1, 2, 3)
+    sqls = [sql for sql, _ in opened[1]._cursor.executed]
+    assert any(sql.startswith('PREPARE sc_claim_batch') for sql in sqls)
+
+def test_text_statements_when_preparing_is_disabled(monkeypatch):
+    from sentiment_core import prepared
+    monkeypatch.setattr(prepared, 'prepared_statements', False)
+    fake_cursor = FakeCursor()
+    conn = FakeConnection(fake_cursor)
+    monkeypatch.setattr(pool.psycopg2, 'connect', lambda **kwargs: conn)
+    dbh.decrement_count(11, 12, 13)
+    [(sql, params)] = fake_cursor.executed
+    assert 'WHERE model_id = %(p1)s AND prompt_id = %(p2)s' in sql
+    assert params == {'p1': 11, 'p2': 12, 'p3': 13}
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import text
+
+from sentiment_core.db_helpers import CLAIM
+
+# (statement, parameters, index the plan must use)
+ACCESS_PATHS = [
+    (
+        CLAIM.text_sql,
+        {'p1': 1, 'p2': 2, 'p3': 5, 'p4': 10, 'p5': 300.0},
+        'predictionstatus_pending_idx',
+    ),
+    (
+        "SELECT row_id FROM predictionstatus"
+        " WHERE model_id = 1 AND prompt_id = 2 AND dataset_id = 5 AND status = 'in_progress'",
+        {},
+        'predictionstatus_in_progress_idx',
+    ),
+    (
+        "SELECT COUNT(*) FILTER (WHERE prediction <> 'unknown') FROM predictions"
+        " WHERE model_id = 1 AND prompt_id = 2 AND dataset_id = 5",
+        {},
+        'predictions_job_row_key',
+    ),
+    (
+        "SELECT model_id, prompt_id, prediction FROM predictions WHERE dataset_id = 5 AND row_id = 7",
+        {},
+        'predictions_dataset_idx',
+    ),
+    (
+        "SELECT COUNT(*) FROM rows WHERE dataset_id = 5",
+        {},
+        'rows_dataset_idx',
+    ),
+]
+
+@pytest.fixture
+def predicted_job(pg_engine, seeded_job):
+    """
+    The seeded job half done, next to predictions of other prompts and datasets.
+    """
+    with pg_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status)"
+            " SELECT g % 200 + 1, 1, p, 5, 'positive', 0.1, 'done'"
+            " FROM generate_series(0, 99) g, generate_series(2, 11) p"
+        ))
+        conn.execute(text(
+            "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status)"
+            " SELECT 1000 + g, 1, 2, d, 'negative', 0.1, 'done'"
+            " FROM generate_series(1, 200) g, generate_series(6, 15) d"
+        ))
+        conn.execute(text(
+            "UPDATE predictionstatus SET status = 'done' WHERE row_id <= 100"
+        ))
+        conn.execute(text("ANALYZE"))
+    return seeded_job
+
+@pytest.mark.parametrize('sql,params,index', ACCESS_PATHS, ids=[p[2] for p in ACCESS_PATHS])
+def test_worker_access_paths_use_indexes(pg_engine, predicted_job, plan_indexes, sql, params, index):
+    with pg_engine.connect() as conn:
+        # The seeded tables are tiny; rule out sequential scans so the
+        # planner has to pick between the indexes
+        conn.execute(text("SET enable_seqscan = off"))
+        plan = [r[0] for r in conn.exec_driver_sql(f"EXPLAIN {sql}", params or None)]
+        used = plan_indexes(conn, plan)
+        conn.rollback()
+    assert index in used, '\n'.join(plan)
@@ -0,0 +1,78 @@
+from sqlalchemy import text
+
+from db_setup import upgrade_schema
+from sentiment_core.inference_cache import InferenceCache, cache_key
+
+def memory_cache(enabled=True):
+    cached = {}
+    lookups = []
+    def lookup(keys):
+        lookups.append(keys)
+        return {key: cached[key] for key in keys if key in cached}
+    def store(entries):
+        for key, _, prediction, prediction_time in entries:
+            cached.setdefault(key, (prediction, prediction_time))
+    return InferenceCache(lookup=lookup, store=store, enabled=enabled), cached, lookups
+
+def counting(prediction='positive'):
+    calls = []
+    def compute(texts):
+        calls.append(list(texts))
+        return [(prediction, 0.5) for _ in texts]
+    return compute, calls
+
+def test_keys_depend_on_model_labels_and_exact_text():
+    key = cache_key('bart', ['positive', 'negative'], 'Great phone')
+    assert key == cache_key('bart', ('positive', 'negative'), 'Great phone')
+    assert key != cache_key('bart', ['positive', 'negative'], 'great phone')
+    assert key != cache_key('bart', ['positive', 'negative', 'neutral'], 'Great phone')
+    assert key != cache_key('roberta', ['positive', 'negative'], 'Great phone')
+
+def test_each_input_is_computed_once():
+    cache, cached, lookups = memory_cache()
+    compute, calls = counting()
+    labels = ['positive', 'negative']
+    assert cache.classify('bart', labels, ['a', 'b', 'a'], compute) == [('positive', 0.5)] * 3
+    assert [prediction for prediction, _ in cache.classify('bart', labels, ['b', 'c'], compute)] == ['positive'] * 2
+    # Duplicates within a batch are computed and looked up once
+    assert calls == [['a', 'b'], ['c']]
+    assert len(lookups[0]) == 2
+    assert len(cached) == 3
+    assert cache.stats() == {'hits': 1, 'misses': 4, 'computed': 3, 'hit_rate': 0.2}
+
+def test_fully_cached_batches_skip_the_model():
+    cache, _, _ = memory_cache()
+    compute, calls = counting('negative')
+    cache.classify('bart', ['positive', 'negative'], ['x', 'y'], compute)
+    results = cache.classify('bart', ['positive', 'negative'], ['y', 'x'], compute)
+    assert [prediction for prediction, _ in results] == ['negative'] * 2
+    assert calls == [['x', 'y']]
+    assert cache.stats()['hit_rate'] == 0.5
+
+def test_hits_report_the_lookup_time():
+    cache, cached, _ = memory_cache()
+    compute, _ = counting()
+    cache.classify('bart', ['positive'], ['a'], compute)
+    # A hit costs this run the lookup, not the model time stored with it
+    (prediction, prediction_time), fresh = cache.classify('bart', ['positive'], ['a', 'b'], compute)
+    assert prediction == 'positive'
+    assert 0 <= prediction_time < 0.5
+    assert fresh == ('positive', 0.5)
+    assert cached[cache_key('bart', ['positive'], 'a')] == ('positive', 0.5)
+
+def test_disabled_cache_always_computes():
+    cache, cached, lookups = memory_cache(enabled=False)
+    compute, calls = counting()
+    cache.classify('bart', ['positive'], ['a'], compute)
+    cache.classify('bart', ['positive'], ['a'], compute)
+    assert calls == [['a'], ['a']]
+    assert not cached and not lookups
+
+def test_upgrade_adds_the_table_to_older_databases(pg_engine):
+    with pg_engine.connect() as conn:
+        transaction = conn.begin()
+        conn.execute(text("DROP TABLE inference_cache"))
+        upgrade_schema(conn)
+        upgrade_schema(conn)
+        assert conn.execute(text("SELECT COUNT(*) FROM inference_cache")).scalar_one() == 0
+        transaction.rollback()
@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+from sqlalchemy import text
+
+import sentiment_core.db_helpers as dbh
+
+
+@pytest.fixture
+def jobs(pg_engine, monkeypatch):
+    """
+    Seed two BERT models, one OpenAI model and a job per model/prompt pair.
+    """
+    monkeypatch.setattr(dbh, '_catalogs', {})
+    truncate = text(
+        "TRUNCATE TABLE models, prompts, datasets, predictionstatus, workunits, predictions,"
+        " modelpromptstatus, jobprogress, jobsummary, rows, status_update_log RESTART IDENTITY CASCADE"
+    )
+    with pg_engine.begin() as conn:
+        conn.execute(truncate)
+        conn.execute(text(
+            "INSERT INTO models (model_id, name, source, library) VALUES"
+            " (1, 'bart', 'hf', 'bert'), (2, 'deberta', 'hf', 'bert'), (3, 'gpt', 'openai', 'openai')"
+        ))
+        conn.execute(text("INSERT INTO prompts (prompt_id, text) VALUES (1, 'a {content}'), (2, 'b {content}')"))
+        conn.execute(text("INSERT INTO datasets (dataset_id, name) VALUES (1, 'reviews')"))
+        conn.execute(text(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status, count)"
+            " SELECT m, p, 1, 'available', 0 FROM generate_series(1, 3) m, generate_series(1, 2) p"
+        ))
+    yield
+    with pg_engine.begin() as conn:
+        conn.execute(truncate)
+
+def counts(pg_engine):
+    with pg_engine.connect() as conn:
+        return dict(conn.execute(text(
+            "SELECT (model_id, prompt_id), count FROM modelpromptstatus WHERE model_id < 3"
+        )).fetchall())
+
+def test_acquires_least_used_job_with_names(pg_engine, pg_pool, jobs):
+    first = dbh.get_least_used_model_prompt_dataset('bert')
+    second = dbh.get_least_used_model_prompt_dataset('bert', exclude_prompt_ids=[])
+    assert first[:3] != second[:3]
+    model_id, prompt_id, dataset_id, model_name, prompt_text, dataset_name, count = first
+    assert model_id in (1, 2) and dataset_id == 1
+    assert model_name == {1: 'bart', 2: 'deberta'}[model_id]
+    assert prompt_text == {1: 'a {content}', 2: 'b {content}'}[prompt_id]
+    assert dataset_name == 'reviews' and count == 0
+
+def test_exclusions_and_library_filter(pg_engine, pg_pool, jobs):
+    for _ in range(4):
+        job = dbh.get_least_used_model_prompt_dataset('bert', exclude_prompt_ids=[1])
+        assert job[1] == 2 and job[0] in (1, 2)
+    assert dbh.get_least_used_model_prompt_dataset('ollama') is None
+
+def test_concurrent_acquisitions_are_not_lost(pg_engine, pg_pool, jobs):
+    def acquire_and_release():
+        for _ in range(10):
+            job = dbh.get_least_used_model_prompt_dataset('bert')
+            assert job is not None
+    threads = [threading.Thread(target=acquire_and_release) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # Every acquisition incremented exactly one job and load stays balanced
+    after = counts(pg_engine)
+    assert sum(after.values()) == 80
+    assert max(after.values()) - min(after.values()) <= 8
+    job = dbh.get_least_used_model_prompt_dataset('bert')
+    dbh.decrement_count(*job[:3])
+    assert sum(counts(pg_engine).values()) == 80
@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import text
+
+from sentiment_core.db_helpers import claim_batch, get_job_metrics, write_predictions
+
+TRUNCATE = text(
+    "TRUNCATE TABLE predictionstatus, workunits, predictions, modelpromptstatus, jobprogress, jobsummary, rows, status_update_log RESTART IDENTITY CASCADE"
+)
+JOB = (2, 5, 11)
+# expected label per row: 1-4 positive, 5-7 negative, 8-10 neutral
+EXPECTED = ['positive'] * 4 + ['negative'] * 3 + ['neutral'] * 3
+PREDICTED = ['positive', 'positive', 'negative', 'unknown',
+             'negative', 'negative', 'positive',
+             'neutral', 'negative', 'neutral']
+
+@pytest.fixture
+def labelled_job(pg_engine, pg_pool):
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+        for row_id, label in enumerate(EXPECTED, start=1):
+            conn.execute(text(
+                "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+                " VALUES (:row_id, 11, 'review', :label)"
+            ), {"row_id": row_id, "label": label.upper()})
+        conn.execute(text(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status) VALUES (2, 5, 11, 'available')"
+        ))
+    yield JOB
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+
+def predict(rows):
+    write_predictions([(row_id, *JOB, PREDICTED[row_id - 1], 0.5, 'prompt') for row_id, _ in rows])
+
+def cells(pg_engine):
+    with pg_engine.connect() as conn:
+        return {
+            (expected, predicted): n for expected, predicted, n in conn.execute(text(
+                "SELECT expected, predicted, n FROM jobsummary WHERE model_id = 2 AND prompt_id = 5 AND dataset_id = 11"
+            ))
+        }
+
+def test_batches_add_up_to_the_confusion_matrix(pg_engine, labelled_job):
+    predict(claim_batch(*JOB, limit=4))
+    predict(claim_batch(*JOB, limit=6))
+    assert cells(pg_engine) == {
+        ('positive', 'positive'): 2, ('positive', 'negative'): 1, ('positive', 'unknown'): 1,
+        ('negative', 'negative'): 2, ('negative', 'positive'): 1,
+        ('neutral', 'neutral'): 2, ('neutral', 'negative'): 1,
+    }
+
+def test_metrics_from_the_summary(labelled_job):
+    predict(claim_batch(*JOB, limit=10))
+    metrics = get_job_metrics(*JOB)
+    assert metrics['predictions'] == 10
+    assert metrics['unknown'] == 1
+    assert metrics['accuracy'] == pytest.approx(0.6)
+    assert metrics['mean_latency'] == pytest.approx(0.5)
+    precision, recall, support = metrics['labels']['negative']
+    assert (precision, recall, support) == (pytest.approx(0.5), pytest.approx(2 / 3), 3)
+    assert metrics['macro_recall'] == pytest.approx((0.5 + 2 / 3 + 2 / 3) / 3)
+    assert metrics['macro_precision'] == pytest.approx((2 / 3 + 0.5 + 1.0) / 3)
+    assert get_job_metrics(9, 9, 9) is None
+
+def test_registration_recounts_existing_predictions(pg_engine, labelled_job):
+    predict(claim_batch(*JOB, limit=10))
+    before = cells(pg_engine)
+    with pg_engine.begin() as conn:
+        conn.execute(text("DELETE FROM modelpromptstatus"))
+        assert conn.execute(text("SELECT COUNT(*) FROM jobsummary")).scalar_one() == 0
+        conn.execute(text(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status) VALUES (2, 5, 11, 'available')"
+        ))
+    assert cells(pg_engine) == before
@@ -0,0 +1,55 @@
+import types
+
+from sentiment_core.model_registry import ModelRegistry, model_bytes
+
+SIZES = {'small': 100, 'medium': 300, 'other': 300, 'large': 600, 'huge': 2000}
+
+def registry(max_bytes):
+    loads = []
+    def load(name):
+        loads.append(name)
+        return types.SimpleNamespace(name=name)
+    return ModelRegistry(load, max_bytes=max_bytes, size_of=lambda model: SIZES[model.name]), loads
+
+def test_loaded_models_are_reused():
+    models, loads = registry(1000)
+    first = models.get('small')
+    assert models.get('small') is first
+    assert loads == ['small']
+    assert models.stats()['hits'] == 1 and models.stats()['loads'] == 1
+
+def test_least_recently_used_model_is_evicted():
+    models, loads = registry(1000)
+    for name in ('small', 'medium', 'large'):
+        models.get(name)
+    # Touching small makes medium the least recently used
+    models.get('small')
+    models.get('other')
+    assert models.names() == ['large', 'small', 'other']
+    assert loads == ['small', 'medium', 'large', 'other']
+    # A model over the budget on its own still loads, alone
+    models.get('huge')
+    assert models.names() == ['huge']
+    assert models.stats()['evictions'] == 4
+
+def test_budget_is_kept_while_reloading():
+    models, loads = registry(700)
+    models.get('large')
+    models.get('medium')
+    assert models.names() == ['medium']
+    models.get('small')
+    # large is known to need 600 bytes, so medium goes before it loads
+    resident = []
+    models._load = lambda name: resident.append(models.resident_bytes()) or types.SimpleNamespace(name=name)
+    models.get('large')
+    assert resident == [100]
+    assert models.names() == ['small', 'large']
+
+def test_model_bytes_unwraps_runner_adapters():
+    tensor = types.SimpleNamespace(numel=lambda: 10, element_size=lambda: 4)
+    module = types.SimpleNamespace(parameters=lambda: [tensor, tensor], buffers=lambda: [tensor])
+    adapter = types.SimpleNamespace(model=types.SimpleNamespace(model=module))
+    assert model_bytes(adapter) == 120
+    assert model_bytes(object()) == 0
+    # Classifiers without torch parameters report their own size
+    assert model_bytes(types.SimpleNamespace(model=types.SimpleNamespace(model=None, nbytes=500))) == 500
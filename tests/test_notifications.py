@@ -0,0 +1,60 @@
+import time
+
+import pytest
+from sqlalchemy import text
+
+from sentiment_core.notifications import JobStatusListener
+
+
+@pytest.fixture
+def listener(pg_engine):
+    url = pg_engine.url
+    params = url.translate_connect_args(database='dbname', username='user')
+    params.update(url.query)
+    listener = JobStatusListener(params, poll_interval=0.05).start()
+    assert listener.wait_connected(timeout=10)
+    yield listener
+    listener.close()
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+def test_stop_is_pushed_to_listener(pg_engine, seeded_job, listener):
+    listener.watch(*seeded_job)
+    assert not listener.is_stopped(*seeded_job)
+    with pg_engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE modelpromptstatus SET status = 'stop'"
+            " WHERE model_id = 1 AND prompt_id = 2 AND dataset_id = 5"
+        ))
+    assert wait_for(lambda: listener.is_stopped(*seeded_job), timeout=1.0)
+
+    with pg_engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE modelpromptstatus SET status = 'available'"
+            " WHERE model_id = 1 AND prompt_id = 2 AND dataset_id = 5"
+        ))
+    assert wait_for(lambda: not listener.is_stopped(*seeded_job), timeout=1.0)
+
+def test_resync_picks_up_stop_sent_while_disconnected(pg_engine, seeded_job):
+    with pg_engine.begin() as conn:
+        conn.execute(text(
+            "UPDATE modelpromptstatus SET status = 'stop'"
+            " WHERE model_id = 1 AND prompt_id = 2 AND dataset_id = 5"
+        ))
+    url = pg_engine.url
+    params = url.translate_connect_args(database='dbname', username='user')
+    params.update(url.query)
+    listener = JobStatusListener(params, poll_interval=0.05)
+    listener.watch(*seeded_job)
+    listener.start()
+    try:
+        assert listener.wait_connected(timeout=10)
+        assert listener.is_stopped(*seeded_job)
+    finally:
+        listener.close()
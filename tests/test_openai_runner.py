@@ -1,3 +1,4 @@
+import importlib.util
 import sys
 import os
 import pytest
@@ -22,29 +23,110 @@ sys.modules['openai'] = fake_openai
 root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, root_dir)
 # Add temp directory to path to import runner module
-sys.path.insert(1, os.path.join(root_dir, 'temp'))
+sys.path.insert(0, os.path.join(root_dir, 'temp'))
 import open_ai
+from sentiment_core import worker
 
 def test_openai_runner_once(monkeypatch):
     # Set fake API key
     monkeypatch.setenv('OPENAI_API_KEY', 'fake-key')
-    # Stub DB helpers
+    # Stub DB helpers used by the shared worker loop
     monkeypatch.setattr(
-        open_ai,
+        worker,
         'get_least_used_model_prompt_dataset',
         lambda library, exclude: (4, 5, 6, 'openai_model', 'prompt:{content}', 'dataset', 0)
     )
-    monkeypatch.setattr(open_ai, 'fetch_batch', lambda mid, pid, did: [(20, 'world')])
-    # Capture update_prediction calls
+    monkeypatch.setattr(worker, 'claim_batch', lambda mid, pid, did, **kwargs: [(20, 'world')])
+    # Capture rows passed to write_predictions
     calls = []
-    def fake_update(row_id, mid, pid, did, prediction, pred_time, formatted):
-        calls.append((row_id, prediction, formatted))
-    monkeypatch.setattr(open_ai, 'update_prediction', fake_update)
-    monkeypatch.setattr(open_ai, 'decrement_count', lambda *args, **kwargs: None)
-    monkeypatch.setattr(open_ai, 'revert_batch_status', lambda rows, *args, **kwargs: None)
+    def fake_write(batch):
+        for row_id, mid, pid, did, prediction, pred_time, formatted in batch:
+            calls.append((row_id, prediction, formatted))
+    monkeypatch.setattr(worker, 'write_predictions', fake_write)
+    monkeypatch.setattr(worker, 'decrement_count', lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, 'reclaim_expired_leases', lambda *args: 0)
+    monkeypatch.setattr(worker, 'seed_job_chunk', lambda *args: 0)
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    monkeypatch.setattr(worker, 'revert_batch_status', lambda rows, *args, **kwargs: None)
 
     # Run runner once with model flag
     sys.argv = ['open_ai.py', '--once', '--model', 'test-model']
     open_ai.main()
-    # Verify that update_prediction was called with expected values
-    assert calls == [(20, 'negative', 'prompt:world')]
\ No newline at end of file
+    # Verify that write_predictions received the expected values
+    assert calls == [(20, 'negative', 'prompt:world')]
+
+def load_root_runner():
+    """The open_ai.py the dockerfile runs, under its own module name."""
+    spec = importlib.util.spec_from_file_location('root_open_ai', os.path.join(root_dir, 'open_ai.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_root_runner_writes_through_the_shared_worker(monkeypatch):
+    root_open_ai = load_root_runner()
+    class Client:
+        def __init__(self, api_key=None):
+            self.chat = self
+            self.completions = self
+        def create(self, model, messages, **kwargs):
+            choice = types.SimpleNamespace(message=types.SimpleNamespace(content='Positive!'))
+            return types.SimpleNamespace(choices=[choice])
+    monkeypatch.setattr(root_open_ai, 'OpenAI', Client)
+    jobs = iter([(4, 5, 6, 'gpt', 'review: {content}', 'dataset', 0)])
+    monkeypatch.setattr(worker, 'get_least_used_model_prompt_dataset', lambda library, exclude: next(jobs, None))
+    batches = iter([[(20, 'world'), (21, 'again')]])
+    monkeypatch.setattr(worker, 'claim_batch', lambda mid, pid, did, **kwargs: next(batches, []))
+    written = []
+    monkeypatch.setattr(worker, 'write_predictions', lambda batch: written.extend(batch) or len(batch))
+    monkeypatch.setattr(worker, 'decrement_count', lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, 'reclaim_expired_leases', lambda *args: 0)
+    monkeypatch.setattr(worker, 'seed_job_chunk', lambda *args: 0)
+    monkeypatch.setattr(worker, 'get_job_status', lambda *args: 'in_use')
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    root_open_ai.main()
+    assert [(row_id, prediction, formatted) for row_id, _, _, _, prediction, _, formatted in written] == [
+        (20, 'positive', 'review: world'), (21, 'positive', 'review: again'),
+    ]
+
+def test_root_runner_stops_on_a_pushed_stop_without_polling(monkeypatch):
+    root_open_ai = load_root_runner()
+    class Client:
+        def __init__(self, api_key=None):
+            self.chat = self
+            self.completions = self
+        def create(self, model, messages, **kwargs):
+            choice = types.SimpleNamespace(message=types.SimpleNamespace(content='negative'))
+            return types.SimpleNamespace(choices=[choice])
+    monkeypatch.setattr(root_open_ai, 'OpenAI', Client)
+    written, reverted = [], []
+    class Listener:
+        """Reports the job stopped once its first row is written."""
+        connected = True
+        def start(self):
+            return self
+        def watch(self, *job):
+            pass
+        def unwatch(self, *job):
+            pass
+        def close(self):
+            pass
+        def is_stopped(self, *job):
+            return True
+    monkeypatch.setattr(worker, 'JobStatusListener', Listener)
+    monkeypatch.setattr(worker, 'job_notifications', True)
+    monkeypatch.setattr(worker, 'storage_backend', 'postgres')
+    def poll(*job):
+        raise AssertionError('job status polled despite the listener')
+    monkeypatch.setattr(worker, 'get_job_status', poll)
+    jobs = iter([(4, 5, 6, 'gpt', '{content}', 'dataset', 0)])
+    monkeypatch.setattr(worker, 'get_least_used_model_prompt_dataset', lambda library, exclude: next(jobs, None))
+    monkeypatch.setattr(worker, 'claim_batch', lambda mid, pid, did, **kwargs: [(20, 'a'), (21, 'b'), (22, 'c')])
+    monkeypatch.setattr(worker, 'write_predictions', lambda batch: written.extend(batch) or len(batch))
+    monkeypatch.setattr(worker, 'revert_batch_status', lambda rows, *args: reverted.extend(rows))
+    monkeypatch.setattr(worker, 'decrement_count', lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, 'reclaim_expired_leases', lambda *args: 0)
+    monkeypatch.setattr(worker, 'seed_job_chunk', lambda *args: 0)
+    root_open_ai.main()
+    # The stop interrupts the batch after the row in flight
+    assert [record[0] for record in written] == [20]
+    assert reverted == [(21, 'b'), (22, 'c')]
@@ -0,0 +1,115 @@
+import pytest
+from sqlalchemy import text
+
+from db_setup import detach_dataset_partitions, drop_dataset_partitions
+from sentiment_core.db_helpers import claim_batch, get_job_progress, write_predictions
+
+TRUNCATE = text(
+    "TRUNCATE TABLE predictionstatus, workunits, predictions, modelpromptstatus, jobprogress, jobsummary, rows, status_update_log RESTART IDENTITY CASCADE"
+)
+
+def add_rows(conn, dataset_id, n_rows):
+    conn.execute(text(
+        "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+        " SELECT :d * 1000 + g, :d, 'review ' || g, 'positive' FROM generate_series(1, :n) g"
+    ), {"d": dataset_id, "n": n_rows})
+
+def register(conn, dataset_id):
+    conn.execute(text(
+        "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status) VALUES (1, 2, :d, 'available')"
+    ), {"d": dataset_id})
+
+def count(conn, table):
+    return conn.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar_one()
+
+@pytest.fixture
+def clean(pg_engine):
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+    yield
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+
+def test_registering_a_job_creates_dataset_partitions(pg_engine, pg_pool, clean):
+    with pg_engine.begin() as conn:
+        add_rows(conn, 41, 30)
+        register(conn, 41)
+    rows = claim_batch(1, 2, 41, limit=10)
+    write_predictions([(row_id, 1, 2, 41, 'positive', 0.0, content) for row_id, content in rows])
+    with pg_engine.connect() as conn:
+        assert count(conn, 'predictionstatus_d41') == 30
+        assert count(conn, 'predictions_d41') == 10
+        assert count(conn, 'predictionstatus_default') == 0
+        assert count(conn, 'predictions_default') == 0
+
+def test_earlier_predictions_move_out_of_the_default_partition(pg_engine, pg_pool, clean):
+    with pg_engine.begin() as conn:
+        add_rows(conn, 42, 30)
+        conn.execute(text(
+            "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status)"
+            " SELECT 42000 + g, 1, 2, 42, 'positive', 0.1, 'done' FROM generate_series(1, 5) g"
+        ))
+        assert count(conn, 'predictions_default') == 5
+        register(conn, 42)
+    with pg_engine.connect() as conn:
+        assert count(conn, 'predictions_default') == 0
+        assert count(conn, 'predictions_d42') == 5
+    assert get_job_progress(1, 2, 42) == (30, 5, 0)
+
+def test_job_queries_only_touch_their_partition(pg_engine, clean):
+    with pg_engine.begin() as conn:
+        for dataset_id in (43, 44):
+            add_rows(conn, dataset_id, 10)
+            register(conn, dataset_id)
+    with pg_engine.connect() as conn:
+        plan = '\n'.join(conn.execute(text(
+            "EXPLAIN SELECT row_id FROM predictionstatus"
+            " WHERE model_id = 1 AND prompt_id = 2 AND dataset_id = 43 AND status = 'pending'"
+        )).scalars().all())
+    assert 'predictionstatus_d43' in plan
+    assert 'predictionstatus_d44' not in plan
+    assert 'predictionstatus_default' not in plan
+
+def test_detach_and_drop_a_finished_dataset(pg_engine, clean):
+    with pg_engine.begin() as conn:
+        for dataset_id in (45, 46):
+            add_rows(conn, dataset_id, 10)
+            register(conn, dataset_id)
+    with pg_engine.begin() as conn:
+        detached = detach_dataset_partitions(conn, 45)
+        drop_dataset_partitions(conn, 46)
+    predictions, statuses = detached
+    assert statuses.startswith('predictionstatus_d45_detached_')
+    with pg_engine.connect() as conn:
+        assert count(conn, 'predictionstatus') == 0
+        # The detached partition lives on as a standalone table
+        assert count(conn, statuses) == 10
+        assert conn.execute(text("SELECT to_regclass('predictionstatus_d45')")).scalar_one() is None
+        assert conn.execute(text("SELECT to_regclass('predictionstatus_d46')")).scalar_one() is None
+        assert conn.execute(text("SELECT dataset_id FROM modelpromptstatus")).scalars().all() == [45]
+    with pg_engine.begin() as conn:
+        drop_dataset_partitions(conn, 45)
+        for table in detached:
+            conn.execute(text(f"DROP TABLE {table}"))
+
+def test_a_detached_dataset_can_be_registered_again(pg_engine, pg_pool, clean):
+    with pg_engine.begin() as conn:
+        add_rows(conn, 47, 10)
+        register(conn, 47)
+    rows = claim_batch(1, 2, 47, limit=10)
+    write_predictions([(row_id, 1, 2, 47, 'positive', 0.0, content) for row_id, content in rows])
+    with pg_engine.begin() as conn:
+        detached = detach_dataset_partitions(conn, 47)
+        conn.execute(text("DELETE FROM modelpromptstatus WHERE dataset_id = 47"))
+    try:
+        with pg_engine.begin() as conn:
+            register(conn, 47)
+        assert get_job_progress(1, 2, 47) == (10, 0, 0)
+        with pg_engine.connect() as conn:
+            assert count(conn, 'predictionstatus_d47') == 10
+            assert [count(conn, table) for table in detached] == [10, 10]
+    finally:
+        with pg_engine.begin() as conn:
+            drop_dataset_partitions(conn, 47)
+            for table in detached:
+                conn.execute(text(f"DROP TABLE {table}"))
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import psycopg2
+import pytest
+
+from sentiment_core.pool import ConnectionPool, PoolTimeout
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+    def execute(self, sql, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError('server closed the connection')
+        self.conn.executed.append(sql)
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    status = 1  # psycopg2.extensions.STATUS_READY
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.executed = []
+    def cursor(self):
+        return FakeCursor(self)
+    def rollback(self):
+        if self.broken:
+            raise psycopg2.InterfaceError('connection already closed')
+    def close(self):
+        self.closed = 1
+
+
+@pytest.fixture
+def connect(monkeypatch):
+    opened = []
+    def fake_connect(**kwargs):
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+    monkeypatch.setattr(psycopg2, 'connect', fake_connect)
+    return opened
+
+
+def test_min_size_opened_eagerly_and_reused(connect):
+    pool = ConnectionPool({}, min_size=2, max_size=4)
+    assert len(connect) == 2
+    for _ in range(5):
+        with pool.connection():
+            pass
+    stats = pool.stats()
+    assert len(connect) == 2
+    assert stats['checkouts'] == 5
+    assert stats['idle'] == 2 and stats['in_use'] == 0
+
+
+def test_grows_up_to_max_then_times_out(connect):
+    pool = ConnectionPool({}, min_size=0, max_size=2, timeout=0.05)
+    a = pool.getconn()
+    b = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+    pool.putconn(a)
+    pool.putconn(b)
+    assert len(connect) == 2
+
+
+def test_waiter_is_woken_when_connection_returned(connect):
+    pool = ConnectionPool({}, min_size=1, max_size=1, timeout=5)
+    held = pool.getconn()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.getconn()))
+    waiter.start()
+    time.sleep(0.05)
+    pool.putconn(held)
+    waiter.join(1)
+    assert got == [held]
+    assert pool.stats()['wait_time_max'] >= 0.04
+
+
+def test_stale_connection_is_replaced(connect):
+    pool = ConnectionPool({}, min_size=1, max_size=1, health_check_interval=0)
+    connect[0].broken = True
+    with pool.connection() as conn:
+        assert conn is connect[1]
+    assert connect[0].closed
+    assert pool.stats()['reconnects'] == 1
+
+
+def test_operational_error_discards_connection(connect):
+    pool = ConnectionPool({}, min_size=1, max_size=1)
+    with pytest.raises(psycopg2.OperationalError):
+        with pool.connection():
+            raise psycopg2.OperationalError('connection lost')
+    assert connect[0].closed
+    with pool.connection() as conn:
+        assert conn is connect[1]
+    assert pool.stats()['discarded'] == 1
+
+
+def test_failed_rollback_discards_connection_and_keeps_the_error(connect):
+    pool = ConnectionPool({}, min_size=1, max_size=1)
+    with pytest.raises(ValueError, match='bad row'):
+        with pool.connection() as conn:
+            conn.broken = True
+            raise ValueError('bad row')
+    assert connect[0].closed
+    with pool.connection() as conn:
+        assert conn is connect[1]
+    assert pool.stats()['discarded'] == 1
@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+from sentiment_core.prefetch import BatchPrefetcher
+
+
+def claims(*batches):
+    batches = list(batches)
+    return lambda: (batches.pop(0), 0.01)
+
+def test_batches_arrive_in_claim_order():
+    prefetcher = BatchPrefetcher(claims([(1, 'a')], [(2, 'b')], []), lookahead=2).start()
+    assert prefetcher.get() == ([(1, 'a')], 0.01)
+    assert prefetcher.get() == ([(2, 'b')], 0.01)
+    assert prefetcher.get() == ([], 0.01)
+    assert prefetcher.close() == []
+
+def test_close_returns_claimed_rows_not_handed_out():
+    claimed = threading.Event()
+    batches = [[(1, 'a')], [(2, 'b')], [(3, 'c')], [(4, 'd')]]
+    def claim():
+        if len(batches) == 2:
+            claimed.set()
+        return batches.pop(0), 0.01
+    prefetcher = BatchPrefetcher(claim, lookahead=1, put_timeout=0.01).start()
+    assert prefetcher.get()[0] == [(1, 'a')]
+    # Lookahead 1: batch 2 is queued and batch 3 waits for a free slot
+    assert claimed.wait(timeout=2)
+    assert sorted(prefetcher.close()) == [(2, 'b'), (3, 'c')]
+    assert batches == [[(4, 'd')]]
+
+def test_claim_errors_are_raised_by_get():
+    def claim():
+        raise RuntimeError('connection lost')
+    prefetcher = BatchPrefetcher(claim).start()
+    with pytest.raises(RuntimeError, match='connection lost'):
+        prefetcher.get()
+    assert prefetcher.close() == []
@@ -0,0 +1,35 @@
+from sqlalchemy import text
+
+from sentiment_core import prepared
+from sentiment_core.db_helpers import claim_batch, get_job_status, revert_batch_status, write_predictions
+
+
+def test_statements_survive_deallocate(pg_engine, pg_pool, seeded_job):
+    assert len(claim_batch(*seeded_job, limit=5)) == 5
+    conn = pg_pool.getconn()
+    try:
+        assert 'sc_claim_batch' in prepared.prepared_names(conn)
+        # What a proxy resetting the session would do behind our back
+        cursor = conn.cursor()
+        cursor.execute("DEALLOCATE ALL")
+        cursor.close()
+        conn.commit()
+    finally:
+        pg_pool.putconn(conn)
+    assert len(claim_batch(*seeded_job, limit=5)) == 5
+    assert get_job_status(*seeded_job) == 'available'
+
+def test_text_statements_match_prepared(pg_engine, pg_pool, seeded_job, monkeypatch):
+    monkeypatch.setattr(prepared, 'prepared_statements', False)
+    model_id, prompt_id, dataset_id = seeded_job
+    rows = claim_batch(*seeded_job, limit=4)
+    write_predictions([
+        (row_id, model_id, prompt_id, dataset_id, 'positive', 0.5, content)
+        for row_id, content in rows[:2]
+    ])
+    revert_batch_status(rows[2:], *seeded_job)
+    with pg_engine.connect() as conn:
+        statuses = dict(conn.execute(text(
+            "SELECT status, COUNT(*) FROM predictionstatus GROUP BY status"
+        )).fetchall())
+    assert statuses == {'done': 2, 'pending': 198}
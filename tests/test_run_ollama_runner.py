@@ -1,3 +1,4 @@
+import importlib.util
 import sys
 import os
 import pytest
@@ -12,8 +13,9 @@ sys.modules['ollama'] = fake_ollama
 root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, root_dir)
 # Add temp directory to path to import runner module
-sys.path.insert(1, os.path.join(root_dir, 'temp'))
+sys.path.insert(0, os.path.join(root_dir, 'temp'))
 import run_ollama
+from sentiment_core import worker
 
 def test_run_ollama_runner_once(monkeypatch):
     # Stub subprocess.Popen and requests.post
@@ -23,23 +25,59 @@ def test_run_ollama_runner_once(monkeypatch):
         'requests',
         types.SimpleNamespace(post=lambda url, json, timeout: types.SimpleNamespace(status_code=200))
     )
-    # Stub DB helpers in runner module
+    # Stub DB helpers used by the shared worker loop
     monkeypatch.setattr(
-        run_ollama,
+        worker,
         'get_least_used_model_prompt_dataset',
         lambda library, exclude: (7, 8, 9, 'ollama_model', 'prompt {content}', 'dataset', 0)
     )
-    monkeypatch.setattr(run_ollama, 'fetch_batch', lambda mid, pid, did: [(30, 'abc')])
-    # Capture update_prediction calls
+    monkeypatch.setattr(worker, 'claim_batch', lambda mid, pid, did, **kwargs: [(30, 'abc')])
+    # Capture rows passed to write_predictions
     calls = []
-    def fake_update(row_id, mid, pid, did, prediction, pred_time, formatted):
-        calls.append((row_id, prediction, formatted))
-    monkeypatch.setattr(run_ollama, 'update_prediction', fake_update)
-    monkeypatch.setattr(run_ollama, 'decrement_count', lambda *args, **kwargs: None)
-    monkeypatch.setattr(run_ollama, 'revert_batch_status', lambda rows, *args, **kwargs: None)
+    def fake_write(batch):
+        for row_id, mid, pid, did, prediction, pred_time, formatted in batch:
+            calls.append((row_id, prediction, formatted))
+    monkeypatch.setattr(worker, 'write_predictions', fake_write)
+    monkeypatch.setattr(worker, 'decrement_count', lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, 'reclaim_expired_leases', lambda *args: 0)
+    monkeypatch.setattr(worker, 'seed_job_chunk', lambda *args: 0)
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    monkeypatch.setattr(worker, 'revert_batch_status', lambda rows, *args, **kwargs: None)
 
     # Run runner once with model flag
     sys.argv = ['run_ollama.py', '--once', '--model', 'test-model']
     run_ollama.main()
-    # Verify that update_prediction was called with expected values
-    assert calls == [(30, 'neutral', 'prompt abc')]
\ No newline at end of file
+    # Verify that write_predictions received the expected values
+    assert calls == [(30, 'neutral', 'prompt abc')]
+
+def load_root_runner():
+    """The run_ollama.py at the repository root, under its own module name."""
+    spec = importlib.util.spec_from_file_location('root_run_ollama', os.path.join(root_dir, 'run_ollama.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def test_root_runner_leaves_unanswered_rows_claimed(monkeypatch):
+    root_run_ollama = load_root_runner()
+    started = []
+    monkeypatch.setattr(root_run_ollama.subprocess, 'Popen', lambda args, **kwargs: started.append(args))
+    monkeypatch.setattr(root_run_ollama, 'is_service_running', lambda url, model: True)
+    answers = iter([{'message': {'content': 'Negative'}}, {}])
+    monkeypatch.setattr(root_run_ollama.ollama, 'chat', lambda model, messages: next(answers))
+    jobs = iter([(7, 8, 9, 'llama', 'prompt {content}', 'dataset', 0)])
+    monkeypatch.setattr(worker, 'get_least_used_model_prompt_dataset', lambda library, exclude: next(jobs, None))
+    batches = iter([[(30, 'abc'), (31, 'def')]])
+    monkeypatch.setattr(worker, 'claim_batch', lambda mid, pid, did, **kwargs: next(batches, []))
+    written, reverted = [], []
+    monkeypatch.setattr(worker, 'write_predictions', lambda batch: written.extend(batch) or len(batch))
+    monkeypatch.setattr(worker, 'revert_batch_status', lambda rows, *args: reverted.extend(rows))
+    monkeypatch.setattr(worker, 'decrement_count', lambda *args, **kwargs: None)
+    monkeypatch.setattr(worker, 'reclaim_expired_leases', lambda *args: 0)
+    monkeypatch.setattr(worker, 'seed_job_chunk', lambda *args: 0)
+    monkeypatch.setattr(worker, 'get_job_status', lambda *args: 'in_use')
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    root_run_ollama.main()
+    assert started == [['ollama', 'run', 'llama']]
+    assert [(row_id, prediction) for row_id, _, _, _, prediction, _, _ in written] == [(30, 'negative')]
+    # Row 31 got no answer; its lease expires and another claim retries it
+    assert reverted == []
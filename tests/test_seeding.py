@@ -0,0 +1,99 @@
+import importlib.util
+import os
+
+import pytest
+from sqlalchemy import text
+
+import sentiment_core.db_helpers as dbh
+from sentiment_core import worker
+from sentiment_core.inference_cache import InferenceCache
+from sentiment_core.db_helpers import claim_batch, get_job_progress, write_predictions
+from sentiment_core.seeding import seed_jobs
+
+TRUNCATE = text(
+    "TRUNCATE TABLE predictionstatus, workunits, predictions, modelpromptstatus, jobprogress, jobsummary, rows, status_update_log RESTART IDENTITY CASCADE"
+)
+
+def register(pg_engine, n_rows):
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+        conn.execute(text(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT g, 7, 'review ' || g, 'positive' FROM generate_series(1, :n) g"
+        ), {"n": n_rows})
+        conn.execute(text(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status) VALUES (1, 2, 7, 'available')"
+        ))
+
+def seeding_state(pg_engine):
+    with pg_engine.connect() as conn:
+        seeded = conn.execute(text("SELECT COUNT(*) FROM predictionstatus")).scalar_one()
+        done = conn.execute(text("SELECT seeding_done FROM jobprogress")).scalar_one()
+        status = conn.execute(text("SELECT status FROM modelpromptstatus")).scalar_one()
+    return seeded, done, status
+
+@pytest.fixture
+def cleanup(pg_engine):
+    yield
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+
+def test_registration_seeds_only_the_first_chunk(pg_engine, pg_pool, cleanup):
+    register(pg_engine, 2500)
+    assert seeding_state(pg_engine) == (1000, False, 'available')
+    # Seeded rows are claimable straight away
+    assert len(claim_batch(1, 2, 7, limit=10)) == 10
+
+    assert seed_jobs(chunk_size=700) == 1500
+    assert seeding_state(pg_engine) == (2500, True, 'available')
+    assert get_job_progress(1, 2, 7) == (2500, 0, 0)
+    # Resuming a finished job is a no-op
+    assert seed_jobs(chunk_size=700) == 0
+
+def test_workers_seed_and_finish_a_large_job(pg_engine, pg_pool, cleanup):
+    register(pg_engine, 2500)
+    def classify(job, rows):
+        for row_id, content in rows:
+            yield row_id, 'positive', 0.0, content
+    job = worker.Job(1, 2, 7, 'model', '{content}', 'dataset', 0)
+    with worker.PredictionWriter(write_predictions) as writer:
+        worker.process_job(job, classify, writer, sizer=worker.BatchSizeController(100, 100, 100))
+    assert seeding_state(pg_engine) == (2500, True, 'stop')
+    assert get_job_progress(1, 2, 7) == (2500, 2500, 0)
+
+def test_root_runner_finishes_a_job_larger_than_the_first_chunk(pg_engine, pg_pool, cleanup, monkeypatch):
+    register(pg_engine, 2500)
+    with pg_engine.begin() as conn:
+        conn.execute(text("INSERT INTO models (model_id, name, source, library) VALUES (1, 'nli', 'hf', 'bert')"))
+        conn.execute(text("INSERT INTO prompts (prompt_id, text) VALUES (2, '{content}')"))
+        conn.execute(text("INSERT INTO datasets (dataset_id, name) VALUES (7, 'reviews')"))
+    monkeypatch.setattr(dbh, '_catalogs', {})
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    # The bert_classifier.py the dockerfile runs, with a stand-in pipeline
+    path = os.path.join(os.path.dirname(__file__), '..', 'bert_classifier.py')
+    spec = importlib.util.spec_from_file_location('root_bert_classifier', path)
+    runner = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(runner)
+    monkeypatch.setattr(runner, 'load_zero_shot', lambda name: lambda texts, labels, batch_size=None: [
+        {'labels': ['positive']} for _ in texts
+    ])
+    monkeypatch.setattr(runner, 'bert_length_buckets', False)
+    monkeypatch.setattr(runner, 'cache', InferenceCache(enabled=False))
+    try:
+        runner.main()
+        # The runner seeds past the registration chunk, so the job completes and stops
+        assert seeding_state(pg_engine) == (2500, True, 'stop')
+        assert get_job_progress(1, 2, 7) == (2500, 2500, 0)
+    finally:
+        with pg_engine.begin() as conn:
+            conn.execute(text("TRUNCATE TABLE models, prompts, datasets RESTART IDENTITY CASCADE"))
+
+def test_job_finished_before_seeding_completes_is_stopped(pg_engine, pg_pool, cleanup):
+    # Exactly one registration chunk: seeding only learns it is complete
+    # when the next, empty chunk is requested
+    register(pg_engine, 1000)
+    rows = claim_batch(1, 2, 7, limit=1000)
+    write_predictions([(row_id, 1, 2, 7, 'positive', 0.0, content) for row_id, content in rows])
+    assert seeding_state(pg_engine) == (1000, False, 'available')
+    assert seed_jobs() == 0
+    assert seeding_state(pg_engine) == (1000, True, 'stop')
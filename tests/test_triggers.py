@@ -1,10 +1,5 @@
 import pytest
-from sqlalchemy import create_engine, text, inspect
-import os
-import sys
-# Ensure project root is on PYTHONPATH for db_setup import
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from db_setup import create_schema
+from sqlalchemy import text, inspect
 
 # Clean up data between tests to ensure isolation
 @pytest.fixture(autouse=True)
@@ -14,35 +9,22 @@ def cleanup_db(pg_engine):
     """
     with pg_engine.begin() as conn:
         conn.execute(text(
-            "TRUNCATE TABLE predictionstatus, predictions, modelpromptstatus, rows, status_update_log RESTART IDENTITY CASCADE"
+            "TRUNCATE TABLE predictionstatus, workunits, predictions, modelpromptstatus, jobprogress, jobsummary, rows, status_update_log RESTART IDENTITY CASCADE"
         ))
     yield
 
-try:
-    from testcontainers.postgres import PostgresContainer
-except ImportError:
-    PostgresContainer = None
-
-
-@pytest.fixture(scope="session")
-def pg_engine():
-    if PostgresContainer is None:
-        pytest.skip("testcontainers not available")
-    with PostgresContainer("postgres:15-alpine") as pg:
-        engine = create_engine(pg.get_connection_url())
-        with engine.begin() as conn:
-            create_schema(conn)
-        yield engine
-        engine.dispose()
-
 def test_schema_presence(pg_engine):
     insp = inspect(pg_engine)
     expected_tables = {
         "modelpromptstatus",
+        "jobprogress",
+        "jobsummary",
         "predictionstatus",
+        "workunits",
         "predictions",
         "rows",
         "status_update_log",
+        "inference_cache",
     }
     assert expected_tables.issubset(set(insp.get_table_names()))
 
@@ -55,6 +37,7 @@ def test_schema_presence(pg_engine):
             "dataset_id",
             "status",
             "in_progress_time",
+            "lease_expires_at",
         },
     }
     for table, cols in columns.items():
@@ -67,6 +50,11 @@ def test_schema_presence(pg_engine):
             "remove_prediction_status_for_model_prompt_dataset",
             "update_in_progress_time",
             "update_modelpromptstatus",
+            "reclaim_expired_leases",
+            "notify_job_status",
+            "seed_prediction_status",
+            "claim_work_units",
+            "archive_job_status",
         }
         for f in funcs:
             res = conn.execute(text("""SELECT COUNT(*) FROM pg_proc WHERE proname=:f"""), {"f": f}).scalar_one()
@@ -74,11 +62,15 @@ def test_schema_presence(pg_engine):
         triggers = {
             "after_insert_model_prompt_status",
             "after_delete_model_prompt_status",
+            "after_update_model_prompt_status",
             "before_update_prediction_status",
             "predictions_after_insert",
         }
         for t in triggers:
-            res = conn.execute(text("""SELECT COUNT(*) FROM pg_trigger WHERE tgname=:t"""), {"t": t}).scalar_one()
+            # Row triggers on partitioned tables are cloned onto each partition
+            res = conn.execute(
+                text("""SELECT COUNT(*) FROM pg_trigger WHERE tgname=:t AND tgparentid = 0"""), {"t": t}
+            ).scalar_one()
             assert res == 1
         # Ensure no existing predictionstatus rows before workflow tests
         initial = conn.execute(text("SELECT COUNT(*) FROM predictionstatus")).scalar_one()
@@ -136,11 +128,49 @@ def test_trigger_workflow(pg_engine):
         ts = conn.execute(text("SELECT in_progress_time FROM predictionstatus WHERE row_id=1 AND model_id=99 AND prompt_id=7 AND dataset_id=42")).scalar_one()
         assert ts is not None
 
+        # Repeated writes of a row are dropped by predictions_job_row_key, as in the writers
         for i in range(50):
             rid = 1 if i % 2 == 0 else 2
-            conn.execute(text("INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status) VALUES (:rid, 99, 7, 42, 'ok', 0.1, 'success')"), {"rid": rid})
+            conn.execute(text("INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status) VALUES (:rid, 99, 7, 42, 'ok', 0.1, 'success') ON CONFLICT (model_id, prompt_id, dataset_id, row_id) DO NOTHING"), {"rid": rid})
 
         status = conn.execute(text("SELECT status FROM modelpromptstatus WHERE model_id=99 AND prompt_id=7 AND dataset_id=42")).scalar_one()
         assert status == 'stop'
         log_count = conn.execute(text("SELECT COUNT(*) FROM status_update_log WHERE model_id=99 AND prompt_id=7 AND dataset_id=42")).scalar_one()
         assert log_count == 1
+
+
+def test_job_progress_counts_predictions_per_statement(pg_engine):
+    with pg_engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT g, 8, 'r' || g, 'positive' FROM generate_series(1, 4) g"
+        ))
+        conn.execute(text("INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status) VALUES (3, 4, 8, 'in_use')"))
+        progress = conn.execute(text("SELECT total, done, failed FROM jobprogress WHERE model_id=3 AND prompt_id=4 AND dataset_id=8")).one()
+        assert tuple(progress) == (4, 0, 0)
+
+        conn.execute(text(
+            "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status)"
+            " VALUES (1, 3, 4, 8, 'positive', 0.1, 'done'), (2, 3, 4, 8, 'unknown', 0.1, 'done')"
+        ))
+        progress = conn.execute(text("SELECT total, done, failed FROM jobprogress WHERE model_id=3 AND prompt_id=4 AND dataset_id=8")).one()
+        assert tuple(progress) == (4, 1, 1)
+        status = conn.execute(text("SELECT status FROM modelpromptstatus WHERE model_id=3 AND prompt_id=4 AND dataset_id=8")).scalar_one()
+        assert status == 'in_use'
+
+        # The batch that completes the dataset stops the job exactly once
+        for row_id in (3, 4):
+            conn.execute(text(
+                "INSERT INTO predictions (row_id, model_id, prompt_id, dataset_id, prediction, prediction_time, status)"
+                " VALUES (:rid, 3, 4, 8, 'negative', 0.1, 'done')"
+            ), {"rid": row_id})
+        status = conn.execute(text("SELECT status FROM modelpromptstatus WHERE model_id=3 AND prompt_id=4 AND dataset_id=8")).scalar_one()
+        assert status == 'stop'
+        log_count = conn.execute(text("SELECT COUNT(*) FROM status_update_log WHERE model_id=3 AND prompt_id=4 AND dataset_id=8")).scalar_one()
+        assert log_count == 1
+
+        # Re-registering the job recounts what it already predicted
+        conn.execute(text("DELETE FROM modelpromptstatus WHERE model_id=3 AND prompt_id=4 AND dataset_id=8"))
+        conn.execute(text("INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status) VALUES (3, 4, 8, 'available')"))
+        progress = conn.execute(text("SELECT total, done, failed FROM jobprogress WHERE model_id=3 AND prompt_id=4 AND dataset_id=8")).one()
+        assert tuple(progress) == (4, 3, 1)
@@ -0,0 +1,185 @@
+import threading
+
+import pytest
+from sqlalchemy import text
+
+from sentiment_core import db_helpers, prepared, worker
+from sentiment_core.db_helpers import (
+    claim_batch,
+    get_job_progress,
+    reclaim_expired_leases,
+    revert_batch_status,
+    write_predictions,
+)
+from sentiment_core.pool import get_pool
+
+TRUNCATE = text(
+    "TRUNCATE TABLE predictionstatus, workunits, predictions, modelpromptstatus, jobprogress, jobsummary, rows, status_update_log RESTART IDENTITY CASCADE"
+)
+JOB = (1, 3, 6)
+
+@pytest.fixture
+def unit_job(pg_engine, pg_pool, monkeypatch):
+    """
+    Register one job over 250 rows tracked in work units of 50 rows.
+    """
+    monkeypatch.setattr(db_helpers, '_unit_sizes', {})
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+        # Every other row_id, so units span gaps left by other datasets
+        conn.execute(text(
+            "INSERT INTO rows (row_id, dataset_id, content, expected_prediction)"
+            " SELECT g, CASE WHEN g % 2 = 0 THEN 6 ELSE 9 END, 'review ' || g, 'positive'"
+            " FROM generate_series(1, 500) g"
+        ))
+        conn.execute(text(
+            "INSERT INTO modelpromptstatus (model_id, prompt_id, dataset_id, status, unit_size)"
+            " VALUES (1, 3, 6, 'available', 50)"
+        ))
+    yield JOB
+    with pg_engine.begin() as conn:
+        conn.execute(TRUNCATE)
+
+def unit_statuses(pg_engine):
+    with pg_engine.connect() as conn:
+        return dict(conn.execute(text("SELECT status, COUNT(*) FROM workunits GROUP BY status")).fetchall())
+
+def predict(rows):
+    write_predictions([(row_id, *JOB, 'positive', 0.0, content) for row_id, content in rows])
+
+def test_registration_seeds_units_instead_of_rows(pg_engine, unit_job):
+    with pg_engine.connect() as conn:
+        per_row = conn.execute(text("SELECT COUNT(*) FROM predictionstatus")).scalar_one()
+        units = conn.execute(text(
+            "SELECT first_row_id, last_row_id, row_count FROM workunits ORDER BY first_row_id"
+        )).fetchall()
+    assert per_row == 0
+    assert units == [(100 * i + 2, 100 * i + 100, 50) for i in range(5)]
+    assert get_job_progress(*JOB) == (250, 0, 0)
+
+def test_concurrent_claimers_never_share_units(pg_engine, unit_job):
+    claimed = []
+    lock = threading.Lock()
+
+    def claimer():
+        while True:
+            rows = claim_batch(*JOB, limit=30)
+            if not rows:
+                return
+            with lock:
+                claimed.extend(row_id for row_id, _ in rows)
+
+    threads = [threading.Thread(target=claimer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(claimed) == list(range(2, 501, 2))
+    assert unit_statuses(pg_engine) == {'in_progress': 5}
+
+def test_written_units_are_done_and_finish_the_job(pg_engine, unit_job):
+    rows = claim_batch(*JOB, limit=100)
+    assert len(rows) == 100
+    assert all(content == f'review {row_id}' for row_id, content in rows)
+    predict(rows)
+    assert unit_statuses(pg_engine) == {'done': 2, 'pending': 3}
+
+    def classify(job, rows):
+        for row_id, content in rows:
+            yield row_id, 'positive', 0.0, content
+    job = worker.Job(*JOB, 'model', '{content}', 'dataset', 0)
+    with worker.PredictionWriter(write_predictions) as writer:
+        worker.process_job(job, classify, writer, sizer=worker.BatchSizeController(50, 50, 50))
+    assert unit_statuses(pg_engine) == {'done': 5}
+    assert get_job_progress(*JOB) == (250, 250, 0)
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT status FROM modelpromptstatus")).scalar_one() == 'stop'
+
+def test_released_unit_skips_predicted_rows(pg_engine, unit_job):
+    rows = claim_batch(*JOB, limit=50)
+    predict(rows[:20])
+    revert_batch_status(rows[20:], *JOB)
+    assert unit_statuses(pg_engine) == {'pending': 5}
+    again = claim_batch(*JOB, limit=50)
+    assert again == rows[20:]
+
+def test_fully_predicted_unit_is_not_handed_out(pg_engine, unit_job):
+    rows = claim_batch(*JOB, limit=50)
+    predict(rows)
+    # A stale release after the unit completed must not reopen it for good
+    with pg_engine.begin() as conn:
+        conn.execute(text("UPDATE workunits SET status = 'pending' WHERE first_row_id = 2"))
+    again = claim_batch(*JOB, limit=50)
+    assert [row_id for row_id, _ in again] == list(range(102, 201, 2))
+    assert unit_statuses(pg_engine) == {'done': 1, 'in_progress': 1, 'pending': 3}
+
+def test_expired_unit_leases_return_to_pending(pg_engine, unit_job):
+    expired = claim_batch(*JOB, limit=50, lease_seconds=0)
+    claim_batch(*JOB, limit=50, lease_seconds=600)
+    assert reclaim_expired_leases() == 1
+    assert unit_statuses(pg_engine) == {'in_progress': 1, 'pending': 4}
+    assert claim_batch(*JOB, limit=50) == expired
+
+def test_stale_unit_writer_does_not_predict_rows_twice(pg_engine, unit_job):
+    stale = claim_batch(*JOB, limit=50, lease_seconds=0)
+    assert reclaim_expired_leases() == 1
+    fresh = claim_batch(*JOB, limit=50)
+    assert fresh == stale
+    predict(fresh[:30])
+    # The first worker's late write only adds the rows nobody predicted yet
+    predict(stale)
+    predict(fresh[30:])
+    with pg_engine.connect() as conn:
+        written = conn.execute(text("SELECT COUNT(*), COUNT(DISTINCT row_id) FROM predictions")).fetchone()
+        done_count = conn.execute(text("SELECT done_count FROM workunits WHERE first_row_id = 2")).scalar_one()
+    assert tuple(written) == (50, 50)
+    assert done_count == 50
+    assert get_job_progress(*JOB) == (250, 50, 0)
+    assert unit_statuses(pg_engine) == {'done': 1, 'pending': 4}
+
+def test_unit_lease_covers_the_whole_unit(pg_engine, unit_job):
+    # One 50-row unit against a claim sized for 10 rows
+    claim_batch(*JOB, limit=10, lease_seconds=60)
+    with pg_engine.connect() as conn:
+        remaining = conn.execute(text(
+            "SELECT EXTRACT(EPOCH FROM lease_expires_at - CURRENT_TIMESTAMP)"
+            " FROM workunits WHERE status = 'in_progress'"
+        )).scalar_one()
+    assert 295 < remaining <= 300
+
+def test_concurrent_unit_writers_insert_each_row_once(pg_engine, unit_job):
+    rows = claim_batch(*JOB, limit=50)
+    columns = [list(column) for column in zip(*[
+        (row_id, *JOB, 'positive', 0.0, content) for row_id, content in rows
+    ])]
+    pool = get_pool()
+    first, second = pool.getconn(), pool.getconn()
+    try:
+        # Both writers pass the NOT EXISTS check before either commits
+        cursor = first.cursor()
+        prepared.execute(cursor, db_helpers.WRITE, columns)
+        assert cursor.fetchone()[0] == 50
+        counts = []
+
+        def write_second():
+            other = second.cursor()
+            prepared.execute(other, db_helpers.WRITE, columns)
+            counts.append(other.fetchone()[0])
+            second.commit()
+
+        thread = threading.Thread(target=write_second)
+        thread.start()
+        # The second insert waits on the first's uncommitted index entries
+        thread.join(0.5)
+        assert thread.is_alive()
+        first.commit()
+        thread.join()
+    finally:
+        pool.putconn(first)
+        pool.putconn(second)
+    assert counts == [0]
+    with pg_engine.connect() as conn:
+        written = conn.execute(text("SELECT COUNT(*), COUNT(DISTINCT row_id) FROM predictions")).fetchone()
+        done_count = conn.execute(text("SELECT done_count FROM workunits WHERE first_row_id = 2")).scalar_one()
+    assert tuple(written) == (50, 50)
+    assert done_count == 50
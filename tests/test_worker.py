@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+
+from sentiment_core import worker
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    calls = {'written': [], 'reverted': [], 'decremented': []}
+    jobs = [(1, 2, 3, 'model', 'prompt {content}', 'dataset', 0)]
+    batches = [[(10, 'a'), (11, 'b'), (12, 'c')], [(13, 'd')], []]
+    monkeypatch.setattr(
+        worker, 'get_least_used_model_prompt_dataset',
+        lambda library, exclude: jobs.pop(0) if jobs else None,
+    )
+    monkeypatch.setattr(worker, 'claim_batch', lambda mid, pid, did, **kwargs: batches.pop(0))
+    monkeypatch.setattr(worker, 'write_predictions', lambda batch: calls['written'].extend(batch))
+    monkeypatch.setattr(
+        worker, 'revert_batch_status',
+        lambda rows, mid, pid, did: calls['reverted'].extend(r[0] for r in rows),
+    )
+    monkeypatch.setattr(worker, 'decrement_count', lambda *ids: calls['decremented'].append(ids))
+    monkeypatch.setattr(worker, 'reclaim_expired_leases', lambda *args: 0)
+    monkeypatch.setattr(worker, 'seed_job_chunk', lambda *args: 0)
+    monkeypatch.setattr(worker, 'get_job_status', lambda *ids: 'in_use')
+    monkeypatch.setattr(worker, 'job_notifications', False)
+    return calls
+
+def test_run_worker_drains_job(fake_db):
+    def classify(job, rows):
+        for row_id, content in rows:
+            yield row_id, 'positive', 0.1, job.prompt_text.format(content=content)
+    worker.run_worker('bert', classify)
+    assert [r[0] for r in fake_db['written']] == [10, 11, 12, 13]
+    assert fake_db['written'][0] == (10, 1, 2, 3, 'positive', 0.1, 'prompt a')
+    assert fake_db['decremented'] == [(1, 2, 3)]
+
+def test_failed_inference_reverts_unfinished_rows(fake_db):
+    def classify(job, rows):
+        yield rows[0][0], 'positive', 0.1, 'fmt'
+        raise RuntimeError('model crashed')
+    worker.run_worker('bert', classify)
+    assert [r[0] for r in fake_db['written']] == [10]
+    assert fake_db['reverted'] == [11, 12]
+
+class FakeListener:
+    connected = True
+
+    def __init__(self):
+        self.stopped = False
+
+    def is_stopped(self, *ids):
+        return self.stopped
+
+def test_pushed_stop_interrupts_batch(fake_db):
+    listener = FakeListener()
+    def classify(job, rows):
+        for row_id, content in rows:
+            # The stop arrives while the first row is being classified
+            listener.stopped = True
+            yield row_id, 'positive', 0.1, content
+    job = worker.Job(1, 2, 3, 'model', 'prompt {content}', 'dataset', 0)
+    with worker.PredictionWriter(worker.write_predictions) as writer:
+        worker.process_job(job, classify, writer, listener=listener)
+    assert [r[0] for r in fake_db['written']] == [10]
+    assert fake_db['reverted'] == [11, 12]
+
+def test_disconnected_listener_falls_back_to_polling(fake_db):
+    listener = FakeListener()
+    listener.connected = False
+    listener.stopped = True
+    job = worker.Job(1, 2, 3, 'model', 'prompt {content}', 'dataset', 0)
+    assert not worker.job_stopped(job, listener)
+
+def test_stop_releases_prefetched_rows(fake_db, monkeypatch):
+    monkeypatch.setattr(worker, 'get_job_status', lambda *ids: 'stop')
+    batches = [[(10, 'a'), (11, 'b'), (12, 'c')], [(13, 'd')], []]
+    prefetched = threading.Event()
+    def claim_batch(mid, pid, did, **kwargs):
+        if len(batches) == 2:
+            prefetched.set()
+        return batches.pop(0)
+    monkeypatch.setattr(worker, 'claim_batch', claim_batch)
+    def classify(job, rows):
+        assert prefetched.wait(timeout=2)
+        for row_id, content in rows:
+            yield row_id, 'positive', 0.1, content
+    job = worker.Job(1, 2, 3, 'model', 'prompt {content}', 'dataset', 0)
+    with worker.PredictionWriter(worker.write_predictions) as writer:
+        worker.process_job(job, classify, writer, prefetch=1)
+    assert [r[0] for r in fake_db['written']] == [10, 11, 12]
+    assert fake_db['reverted'] == [13]
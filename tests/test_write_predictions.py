@@ -0,0 +1,66 @@
+from sqlalchemy import text
+
+from sentiment_core.db_helpers import (
+    claim_batch,
+    get_job_progress,
+    reclaim_expired_leases,
+    update_prediction,
+    write_predictions,
+)
+
+
+def test_write_predictions_writes_batch_and_marks_done(pg_engine, pg_pool, seeded_job):
+    model_id, prompt_id, dataset_id = seeded_job
+    rows = claim_batch(*seeded_job, limit=10)
+    write_predictions([
+        (row_id, model_id, prompt_id, dataset_id, ' Positive ', 0.5, f'Prompt {content}')
+        for row_id, content in rows
+    ])
+    with pg_engine.connect() as conn:
+        written = conn.execute(text(
+            "SELECT row_id, prediction, status, formatted_prompt FROM predictions ORDER BY row_id"
+        )).fetchall()
+        statuses = dict(conn.execute(text(
+            "SELECT status, COUNT(*) FROM predictionstatus GROUP BY status"
+        )).fetchall())
+    assert [r[0] for r in written] == sorted(row_id for row_id, _ in rows)
+    assert {(r[1], r[2]) for r in written} == {('positive', 'done')}
+    assert all(r[3] == f'prompt review {r[0]}' for r in written)
+    assert statuses == {'done': 10, 'pending': 190}
+    assert get_job_progress(*seeded_job) == (200, 10, 0)
+
+def test_write_predictions_empty_batch_is_noop(pg_engine, pg_pool, seeded_job):
+    write_predictions([])
+    with pg_engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM predictions")).scalar_one() == 0
+
+def test_update_prediction_still_writes_single_row(pg_engine, pg_pool, seeded_job):
+    model_id, prompt_id, dataset_id = seeded_job
+    update_prediction(3, model_id, prompt_id, dataset_id, 'negative', 0.1, 'fmt')
+    with pg_engine.connect() as conn:
+        status = conn.execute(text(
+            "SELECT status FROM predictionstatus WHERE row_id = 3"
+        )).scalar_one()
+    assert status == 'done'
+
+def test_stale_writer_does_not_predict_a_reclaimed_row_twice(pg_engine, pg_pool, seeded_job):
+    # The first worker's lease runs out and the rows go to a second worker
+    stale = claim_batch(*seeded_job, limit=200, lease_seconds=0)[:5]
+    assert reclaim_expired_leases() == 200
+    fresh = [row for row in claim_batch(*seeded_job, limit=200) if row in stale]
+    assert write_predictions([(row_id, *seeded_job, 'positive', 0.1, content) for row_id, content in fresh]) == 5
+    # The slow first worker finishes anyway
+    assert write_predictions([(row_id, *seeded_job, 'negative', 0.9, content) for row_id, content in stale]) == 0
+    with pg_engine.connect() as conn:
+        predictions = conn.execute(text("SELECT prediction, COUNT(*) FROM predictions GROUP BY prediction")).fetchall()
+        summary = conn.execute(text("SELECT predicted, n FROM jobsummary")).fetchall()
+    assert predictions == [('positive', 5)]
+    assert summary == [('positive', 5)]
+    assert get_job_progress(*seeded_job) == (200, 5, 0)
+
+def test_rows_not_claimed_are_not_written(pg_engine, pg_pool, seeded_job):
+    claim_batch(*seeded_job, limit=5, lease_seconds=0)
+    reclaim_expired_leases()
+    # Back to pending, nobody holds them
+    assert write_predictions([(row_id, *seeded_job, 'positive', 0.1, 'p') for row_id in range(1, 6)]) == 0
+    assert get_job_progress(*seeded_job) == (200, 0, 0)
@@ -0,0 +1,70 @@
+import threading
+import time
+
+from sentiment_core.writer import PredictionWriter
+
+
+def record(row_id, job=(1, 2, 3)):
+    return (row_id, *job, 'positive', 0.1, 'fmt')
+
+def test_flushes_on_size_threshold():
+    flushed = []
+    with PredictionWriter(flushed.append, flush_size=3, flush_interval=60) as w:
+        for i in range(7):
+            w.submit(record(i))
+    # Two full groups by size, the remainder on close
+    assert [len(batch) for batch in flushed] == [3, 3, 1]
+    stats = w.stats()
+    assert stats['written'] == 7 and stats['flushes'] == 3
+    assert stats['queue_depth'] == 0
+
+def test_flushes_on_time_threshold():
+    flushed = []
+    w = PredictionWriter(flushed.append, flush_size=100, flush_interval=0.05).start()
+    w.submit(record(1))
+    time.sleep(0.3)
+    assert flushed == [[record(1)]]
+    w.close()
+
+def test_submit_blocks_when_queue_full():
+    release = threading.Event()
+    def slow_write(batch):
+        release.wait(5)
+    w = PredictionWriter(slow_write, max_queue=2, flush_size=1, flush_interval=60).start()
+    w.submit(record(1))  # picked up by the writer, which then blocks
+    time.sleep(0.05)
+    w.submit(record(2))
+    w.submit(record(3))
+    blocked = threading.Thread(target=w.submit, args=(record(4),))
+    blocked.start()
+    blocked.join(0.1)
+    assert blocked.is_alive()
+    release.set()
+    blocked.join(1)
+    w.close()
+    stats = w.stats()
+    assert stats['backpressure_waits'] >= 1
+    assert stats['written'] == 4
+
+def test_failed_flush_reverts_rows():
+    reverted = []
+    def revert(rows, mid, pid, did):
+        reverted.append(([r[0] for r in rows], mid, pid, did))
+    def failing_write(batch):
+        raise RuntimeError('database down')
+    with PredictionWriter(failing_write, revert, flush_size=10, flush_interval=60) as w:
+        w.submit(record(1))
+        w.submit(record(2))
+        w.submit(record(3, job=(4, 5, 6)))
+    assert sorted(reverted) == [([1, 2], 1, 2, 3), ([3], 4, 5, 6)]
+    assert w.stats()['failed'] == 3
+
+def test_rows_the_write_skipped_are_not_counted_as_written():
+    # The write only takes rows still claimed; here every other one
+    def write(batch):
+        return len(batch) // 2
+    with PredictionWriter(write, flush_size=4, flush_interval=60) as w:
+        for i in range(8):
+            w.submit(record(i))
+    stats = w.stats()
+    assert stats['written'] == 4 and stats['skipped'] == 4
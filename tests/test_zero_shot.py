@@ -0,0 +1,124 @@
+import weakref
+
+import numpy as np
+import pytest
+
+from sentiment_core import zero_shot
+from sentiment_core.zero_shot import ZeroShotClassifier
+
+# Entailment logits of each (review, label) pair; contradiction, neutral, entailment
+ENTAIL = {
+    ('great', 'positive'): 3.0, ('great', 'negative'): -2.0, ('great', 'neutral'): 0.5,
+    ('awful', 'positive'): -1.0, ('awful', 'negative'): 2.5, ('awful', 'neutral'): 0.0,
+    ('fine', 'positive'): 0.2, ('fine', 'negative'): 0.1, ('fine', 'neutral'): 1.0,
+}
+
+class FakeTokenizer:
+    """Encodes each pair as its index in .pairs."""
+    def __init__(self):
+        self.pairs = []
+        self.calls = []
+
+    def __call__(self, premises, hypotheses, padding, truncation, return_tensors):
+        assert (padding, truncation, return_tensors) == (True, 'only_first', 'np')
+        self.calls.append(len(premises))
+        self.pairs.extend(zip(premises, hypotheses))
+        start = len(self.pairs) - len(premises)
+        ids = np.array([[start + i] for i in range(len(premises))])
+        return {'input_ids': ids, 'attention_mask': np.ones_like(ids)}
+
+def classifier():
+    tokenizer = FakeTokenizer()
+    def forward(input_ids, attention_mask):
+        assert input_ids.dtype == np.int64 and attention_mask.dtype == np.int64
+        logits = []
+        for (index,) in input_ids:
+            review, hypothesis = tokenizer.pairs[index]
+            label = hypothesis[len('This example is '):-1]
+            logits.append([-ENTAIL[review, label], 0.0, ENTAIL[review, label]])
+        return np.array(logits)
+    return ZeroShotClassifier(tokenizer, forward, entailment_id=2), tokenizer
+
+def test_labels_follow_the_entailment_logits():
+    classify, _ = classifier()
+    results = classify(['great', 'awful', 'fine'], ['positive', 'negative', 'neutral'], batch_size=16)
+    assert [result['labels'] for result in results] == [
+        ['positive', 'neutral', 'negative'],
+        ['negative', 'neutral', 'positive'],
+        ['neutral', 'positive', 'negative'],
+    ]
+    # Scores are softmaxed across a review's labels
+    entail = np.array([3.0, 0.5, -2.0])
+    assert results[0]['scores'] == pytest.approx(list(np.exp(entail) / np.exp(entail).sum()))
+    assert results[2]['sequence'] == 'fine'
+
+def test_forward_passes_hold_batch_size_pairs():
+    classify, tokenizer = classifier()
+    batched = classify(['great', 'awful', 'fine'], ['positive', 'negative', 'neutral'], batch_size=4)
+    assert tokenizer.calls == [4, 4, 1]
+    whole, _ = classifier()
+    assert batched == whole(['great', 'awful', 'fine'], ['positive', 'negative', 'neutral'], batch_size=9)
+
+def test_single_sequence_and_single_label():
+    classify, _ = classifier()
+    result = classify('awful', ['negative', 'positive'])
+    assert result['labels'] == ['negative', 'positive']
+    # One label is scored as entailment against contradiction
+    only = classify('awful', ['negative'])
+    assert only['scores'] == pytest.approx([1 / (1 + np.exp(-5.0))])
+
+def test_entailment_id_is_read_from_the_config():
+    config = type('Config', (), {'label2id': {'CONTRADICTION': 0, 'NEUTRAL': 1, 'ENTAILMENT': 2}})
+    assert zero_shot.entailment_id(config) == 2
+    config.label2id = {'LABEL_0': 0}
+    assert zero_shot.entailment_id(config) == -1
+
+def test_backends_that_disagree_fall_back_to_the_pipeline(monkeypatch):
+    quantized, _ = classifier()
+    def pipeline(sequences, labels, batch_size=1):
+        return [{'labels': ['neutral', 'positive', 'negative']} for _ in sequences]
+    monkeypatch.setattr(zero_shot, 'load_torch', lambda name: pipeline)
+    monkeypatch.setattr(zero_shot, 'load_int8', lambda name: quantized)
+    monkeypatch.setattr(zero_shot, 'SAMPLE_REVIEWS', ['great', 'fine'])
+    monkeypatch.setattr(zero_shot, 'bert_min_agreement', 1.0)
+    assert zero_shot.agreement(pipeline, quantized, ['great', 'fine']) == 0.5
+    assert zero_shot.load_zero_shot('bart', 'int8') is pipeline
+    monkeypatch.setattr(zero_shot, 'bert_min_agreement', 0.5)
+    assert zero_shot.load_zero_shot('bart', 'int8') is quantized
+    with pytest.raises(ValueError):
+        zero_shot.load_zero_shot('bart', 'tensorrt')
+
+def test_the_reference_pipeline_is_freed_once_the_backend_agrees(monkeypatch):
+    quantized, _ = classifier()
+    loaded = []
+    def load_torch(name):
+        def pipeline(sequences, labels, batch_size=1):
+            return quantized(sequences, labels, batch_size=batch_size)
+        # Pipelines hold reference cycles, which only the collector frees
+        pipeline.cycle = pipeline
+        loaded.append(weakref.ref(pipeline))
+        return pipeline
+    monkeypatch.setattr(zero_shot, 'load_torch', load_torch)
+    monkeypatch.setattr(zero_shot, 'load_int8', lambda name: quantized)
+    monkeypatch.setattr(zero_shot, 'SAMPLE_REVIEWS', ['great', 'fine'])
+    monkeypatch.setattr(zero_shot, 'bert_min_agreement', 1.0)
+    assert zero_shot.load_zero_shot('bart', 'int8') is quantized
+    assert len(loaded) == 1 and loaded[0]() is None
+
+def test_classify_by_length_sends_short_reviews_together():
+    calls = []
+    class Classifier:
+        def tokenizer(self, sequences, add_special_tokens=True):
+            assert not add_special_tokens
+            return {'input_ids': [text.split() for text in sequences]}
+        def __call__(self, sequences, labels, batch_size=1):
+            calls.append((sequences, batch_size))
+            return [{'labels': [f'{len(text.split())} words']} for text in sequences]
+    reviews = ['a b c d e f', 'a', 'a b c', 'a b', 'a b c d e f g h']
+    results = zero_shot.classify_by_length(Classifier(), reviews, ['positive'], 4)
+    assert calls == [(['a', 'a b', 'a b c', 'a b c d e f', 'a b c d e f g h'], 4)]
+    # Results come back in the order of the claimed rows
+    assert [result['labels'][0] for result in results] == ['6 words', '1 words', '3 words', '2 words', '8 words']
+    # Classifiers without a tokenizer are called as they are
+    plain = lambda sequences, labels, batch_size=1: {'labels': ['positive']}
+    assert zero_shot.classify_by_length(plain, ['only'], ['positive'], 4) == [{'labels': ['positive']}]